@@ -0,0 +1 @@
+"""Benchmarks for the ExpressPigeon client. Run a module directly, e.g. ``python -m benchmarks.pool_bench``."""
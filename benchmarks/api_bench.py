@@ -0,0 +1,210 @@
+"""Throughput, latency percentiles and peak memory of the main client workloads against the fake API.
+
+The fake server runs in a child process so that only the client is measured; peak memory is the largest Python heap
+tracemalloc saw during the scenario::
+
+    python -m benchmarks.api_bench --scale 1 --threads 4 --latency 0.001
+    python -m benchmarks.api_bench --only send,paging
+    python -m benchmarks.api_bench --in-process
+
+With ``--in-process`` the fake API is called through an InProcessTransport instead, so no sockets are involved; the numbers
+are CPU cost only, the fake API's included.
+
+Scenarios: upsert (contacts.upsert in batches of 100), send (messages.send_message), batched (the same sends through
+messages.batching_sender), bulk (send_message_bulk of a zipped file), stream (send_message_bulk of the same
+messages zipped from a generator while uploading), upload (lists.upload of a CSV), export (lists.export_csv) and
+paging (messages.iter_reports).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+
+from expresspigeon import ExpressPigeon
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.transport import InProcessTransport
+
+SCENARIOS = ("upsert", "send", "batched", "bulk", "stream", "upload", "export", "paging")
+
+
+class Result(object):
+    def __init__(self, name, ops, elapsed, latencies, peak, note=""):
+        self.name = name
+        self.ops = ops
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.peak = peak
+        self.note = note
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(len(self.latencies) - 1, max(0, int(round(p / 100.0 * len(self.latencies))) - 1))]
+
+    def row(self):
+        return "{0:<8} {1:>7} {2:>10.1f} {3:>9.2f} {4:>9.2f} {5:>10.1f}  {6}".format(
+            self.name, self.ops, self.ops / self.elapsed if self.elapsed else 0.0, self.percentile(50) * 1000,
+            self.percentile(99) * 1000, self.peak / 1024.0, self.note)
+
+
+def timed(fn, count, threads):
+    """ Calls ``fn(i)`` for i in range(count) from ``threads`` threads; returns (elapsed, latencies). """
+    latencies = []
+    lock = threading.Lock()
+    cursor = iter(range(count))
+
+    def worker():
+        own = []
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                break
+            started = time.time()
+            fn(i)
+            own.append(time.time() - started)
+        with lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.time() - started, latencies
+
+
+def measured(name, fn, count, threads, note=""):
+    tracemalloc.start()
+    try:
+        elapsed, latencies = timed(fn, count, threads)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return Result(name, count, elapsed, latencies, peak, note)
+
+
+def start_server(latency, seed_messages):
+    process = subprocess.Popen([sys.executable, "-m", "expresspigeon.fakeserver", "--latency", str(latency),
+                                "--seed-messages", str(seed_messages)], stdout=subprocess.PIPE)
+    url = process.stdout.readline().decode("ascii").strip()
+    return process, url
+
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("email,first_name,last_name\n")
+        for i in range(rows):
+            f.write("user{0}@example.net,First{0},Last{0}\n".format(i))
+
+
+def bulk_messages(count):
+    for i in range(count):
+        yield {"template_id": 1, "reply_to": "shop@example.net", "from": "Shop", "to": "user{0}@example.net".format(i),
+               "subject": "Hi", "merge_fields": {"n": i}}
+
+
+def write_bulk(path, messages):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bulk.txt", "\r\n".join(json.dumps(message) for message in bulk_messages(messages)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the work done by every scenario")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake server adds to each response")
+    parser.add_argument("--only", default=",".join(SCENARIOS))
+    parser.add_argument("--in-process", action="store_true", help="call the fake API without sockets")
+    args = parser.parse_args()
+
+    def n(base):
+        return max(1, int(base * args.scale))
+
+    only = args.only.split(",")
+    directory = tempfile.mkdtemp()
+    seed_messages = n(20000) if "paging" in only else 0
+    process = None
+    if args.in_process:
+        fake = FakeApi(latency=args.latency)
+        fake.seed_messages(seed_messages)
+        api = ExpressPigeon("bench", transport=InProcessTransport(fake))
+    else:
+        process, url = start_server(args.latency, seed_messages)
+        api = ExpressPigeon("bench", pool_size=args.threads)
+        api.ROOT = url
+    try:
+        list_id = api.lists.create("Bench", "Bench", "bench@example.net").list.id
+        results = []
+
+        if "upsert" in only:
+            def upsert(i):
+                api.contacts.upsert(list_id, [{"email": "u{0}-{1}@example.net".format(i, j), "first_name": "F"}
+                                              for j in range(100)])
+            results.append(measured("upsert", upsert, n(200), args.threads, "100 contacts per call"))
+
+        if "send" in only:
+            def send(i):
+                api.messages.send_message(1, "user{0}@example.net".format(i), "shop@example.net", "Shop", "Hi",
+                                          merge_fields={"n": i})
+            results.append(measured("send", send, n(2000), args.threads))
+
+        if "batched" in only:
+            sender = api.messages.batching_sender()
+
+            def batched(i):
+                sender.send_message(1, "user{0}@example.net".format(i), "shop@example.net", "Shop", "Hi",
+                                    merge_fields={"n": i}).result()
+            results.append(measured("batched", batched, n(2000), args.threads * 25,
+                                    "{0} callers".format(args.threads * 25)))
+            sender.close()
+
+        if "bulk" in only:
+            bulk = os.path.join(directory, "bulk.zip")
+            write_bulk(bulk, n(10000))
+            results.append(measured("bulk", lambda i: api.messages.send_message_bulk(bulk), 5, 1,
+                                    "{0} messages per call".format(n(10000))))
+
+        if "stream" in only:
+            def stream(i):
+                api.messages.send_message_bulk(api.messages.bulk_archive(bulk_messages(n(10000))))
+            results.append(measured("stream", stream, 5, 1, "{0} messages per call".format(n(10000))))
+
+        if "upload" in only:
+            path = os.path.join(directory, "contacts.csv")
+            write_csv(path, n(100000))
+            size = os.path.getsize(path)
+            results.append(measured("upload", lambda i: api.lists.upload(list_id, path), 3, 1,
+                                    "{0:.1f} MiB per call".format(size / 1048576.0)))
+
+        if "export" in only:
+            target = os.path.join(directory, "export.csv")
+            results.append(measured("export", lambda i: api.lists.export_csv(list_id, target), 3, 1,
+                                    "{0} contacts".format(api.lists.find_all()[0].contact_count)))
+
+        if "paging" in only:
+            rows = []
+            results.append(measured("paging", lambda i: rows.append(sum(1 for _ in api.messages.iter_reports())),
+                                    1, 1, "{0} rows".format(n(20000))))
+
+        print("{0:<8} {1:>7} {2:>10} {3:>9} {4:>9} {5:>10}".format("scenario", "ops", "ops/s", "p50 ms", "p99 ms",
+                                                                 "peak KiB"))
+        for result in results:
+            print(result.row())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Decode throughput and peak memory for large report payloads across decoding strategies.
+
+Compares per-object namedtuple classes (the old hook), cached records with every installed JSON codec, and lazy
+responses where the caller only filters rows on one field::
+
+    python -m benchmarks.decode_bench --rows 1000 --repeat 20
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from collections import namedtuple
+
+from expresspigeon.codec import AVAILABLE, get_codec
+from expresspigeon.records import lazy_loads
+
+
+def uncached_hook(d):
+    return namedtuple('EpResponse', d.keys())(*d.values())
+
+
+def report_payload(rows):
+    return json.dumps([{
+        "id": i,
+        "email": "user{0}@example.net".format(i),
+        "in_transit": False,
+        "delivered": True,
+        "bounced": False,
+        "opened": i % 3 == 0,
+        "clicked": i % 7 == 0,
+        "urls": ["http://example.net/offer/{0}".format(i % 5)],
+        "spam": False,
+        "created_at": "2013-03-15T11:20:21.770+0000",
+        "updated_at": "2013-03-16T11:22:23.210+0000"
+    } for i in range(rows)]).encode("utf-8")
+
+
+def measure(decode, payload, repeat):
+    started = time.time()
+    for _ in range(repeat):
+        decode(payload)
+    elapsed = time.time() - started
+
+    tracemalloc.start()
+    decoded = decode(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del decoded
+    return repeat / elapsed, peak
+
+
+def strategies():
+    yield "namedtuple per object", lambda payload: json.loads(payload.decode("utf-8"), object_hook=uncached_hook)
+    for name in AVAILABLE:
+        yield "{0} records".format(name), get_codec(name).loads_records
+    for name in AVAILABLE:
+        codec = get_codec(name)
+        yield "{0} lazy + filter".format(name), \
+            lambda payload, codec=codec: [r for r in lazy_loads(payload, codec) if r.clicked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = report_payload(args.rows)
+    print("{0} rows, {1} bytes per payload".format(args.rows, len(payload)))
+    for name, decode in strategies():
+        rate, peak = measure(decode, payload, args.repeat)
+        print("{0:<22} {1:>10.1f} payloads/s {2:>10.0f} rows/s  peak {3:>8.1f} KiB".format(
+            name, rate, rate * args.rows, peak / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
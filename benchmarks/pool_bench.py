@@ -0,0 +1,114 @@
+"""Requests per second with and without the keep-alive connection pool.
+
+Runs against a local HTTPS stand-in with a throwaway self-signed certificate (needs the ``openssl`` binary)::
+
+    python -m benchmarks.pool_bench --requests 500 --threads 4
+"""
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from expresspigeon import ExpressPigeon
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+BODY = b'{"code": 200, "status": "success", "message": "email queued", "id": "7f2a"}'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    do_GET = do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def self_signed_certificate(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.check_call(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                           "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return cert, key
+
+
+def start_server(cert, key):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def run(api, requests, threads):
+    per_thread = requests // threads
+
+    def worker():
+        for i in range(per_thread):
+            api.messages.send_message(template_id=1, to="bob@example.net", reply_to="a@example.net",
+                                      from_name="Bench", subject="Hi", merge_fields={"n": i})
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.time() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        server = start_server(*self_signed_certificate(directory))
+        client_context = ssl.create_default_context()
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+        root = "https://127.0.0.1:{0}/".format(server.server_address[1])
+
+        for keep_alive in (False, True):
+            api = ExpressPigeon("bench", keep_alive=keep_alive, pool_size=args.threads, ssl_context=client_context)
+            api.ROOT = root
+            rps = run(api, args.requests, args.threads)
+            print("{0:<12} {1:>10.1f} req/s".format("pooled" if keep_alive else "no pool", rps))
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""CPU cost per transactional send, with and without a prepared message.
+
+Requests go through an InProcessTransport to a handler answering every call with the same canned response, so nearly
+all the time measured is the client's own.  "build" times only the construction of the request, "send" the whole
+call, response decoding included::
+
+    python -m benchmarks.send_bench --sends 20000 --codec json
+"""
+import argparse
+import time
+
+from expresspigeon import ExpressPigeon
+from expresspigeon.codec import AVAILABLE
+from expresspigeon.transport import InProcessTransport
+
+QUEUED = (200, {"Content-Type": "application/json"},
+          b'{"status": "success", "code": 200, "id": "8ea5b4dc-e5cd-4e93-b3c1-40e6a1a5b0e2", "message": "email queued"}')
+
+SUBJECT = "Your order has shipped"
+
+
+def answer(method, path, headers, body):
+    return QUEUED
+
+
+def recipients(count):
+    for i in range(count):
+        yield "user{0}@example.net".format(i), {"first_name": "User", "order": 100000 + i, "items": i % 7 + 1}
+
+
+def send_message(api):
+    def send(to, merge_fields):
+        return api.messages.send_message(42, to, "shop@example.net", "Example Shop", SUBJECT,
+                                         merge_fields=merge_fields)
+    return send
+
+
+def build_message(api):
+    def build(to, merge_fields):
+        return api.__prepare_request__("messages", "post", idempotent=True, params={
+            'template_id': 42, 'to': to, 'reply_to': "shop@example.net", 'from': "Example Shop", 'subject': SUBJECT,
+            'merge_fields': merge_fields, 'view_online': False, 'click_tracking': True})
+    return build
+
+
+def build_prepared(api):
+    prepared = api.messages.prepare(42, "shop@example.net", "Example Shop", SUBJECT)
+    return lambda to, merge_fields: prepared.request.copy(prepared.body(to, merge_fields))
+
+
+def send_prepared(api):
+    return api.messages.prepare(42, "shop@example.net", "Example Shop", SUBJECT).send
+
+
+def measure(call, sends):
+    work = list(recipients(sends))
+    started = time.process_time()
+    for to, merge_fields in work:
+        call(to, merge_fields)
+    return (time.process_time() - started) / sends
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sends", type=int, default=20000)
+    parser.add_argument("--codec", choices=AVAILABLE, default="json")
+    parser.add_argument("--retry", action="store_true", help="with a retry policy, so sends carry idempotency keys")
+    args = parser.parse_args()
+
+    api = ExpressPigeon("key", transport=InProcessTransport(answer), codec=args.codec, retry=args.retry)
+    print("{0} sends, {1} codec{2}".format(args.sends, args.codec, ", retry" if args.retry else ""))
+    for name, factory in (("build send_message", build_message), ("build prepared", build_prepared),
+                          ("send send_message", send_message), ("send prepared", send_prepared)):
+        print("{0:<20} {1:>8.2f} us CPU per send".format(name, measure(factory(api), args.sends) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
+import copy
 import os
-import json
-from collections import namedtuple
+import sys
+import time
 from expresspigeon.autoresponders import AutoResponders
 from expresspigeon.campaigns import Campaigns
 from expresspigeon.contacts import Contacts
@@ -9,6 +10,16 @@ from expresspigeon.messages import Messages
 from expresspigeon.templates import Templates
 from expresspigeon.dictionaries import Dictionaries
 from expresspigeon.flows import Flows
+from expresspigeon.exceptions import InvalidAuthKey, ExpressPigeonException
+from expresspigeon.transport import PooledTransport, UrllibTransport
+from expresspigeon.codec import get_codec
+from expresspigeon.records import lazy_loads
+from expresspigeon.cache import MISSING, ResponseCache
+from expresspigeon.ratelimit import RateLimited, RateLimiter, is_throttled, retry_after
+from expresspigeon.retry import IDEMPOTENCY_HEADER, NETWORK_ERRORS, RetryPolicy, idempotency_key
+from expresspigeon.pool import monotonic
+from expresspigeon.singleflight import SingleFlight
+from expresspigeon.metrics import Metrics, observation
 
 try:
     from urllib import request as url_lib
@@ -16,16 +27,10 @@ except ImportError:
     import urllib2 as url_lib
 
 
-class InvalidAuthKey(Exception):
-    pass
-
-
-class ExpressPigeonException(Exception):
-    pass
-
-
 class ExpressPigeon(object):
     ROOT = "https://api.expresspigeon.com/"
+    # endpoint methods return coroutines; features that need the responses themselves refuse such clients
+    asynchronous = False
 
     class Request(url_lib.Request):
         METHODS = ["get", "post", "put", "delete"]
@@ -35,6 +40,7 @@ class ExpressPigeon(object):
                 headers = {}
             url_lib.Request.__init__(self, url, data, headers, origin_req_host, unverifiable)
             self.method = method
+            self.timings = {}
 
         def get_method(self):
             if self.method:
@@ -42,13 +48,73 @@ class ExpressPigeon(object):
 
             return url_lib.Request.get_method(self)
 
-    def __init__(self, auth_key=None):
+        def copy(self, data):
+            """ Copy of this request with another body and its own headers, sparing the URL parsing of a new one. """
+            req = copy.copy(self)
+            req.headers = dict(self.headers)
+            req.unredirected_hdrs = dict(self.unredirected_hdrs)
+            req.data = data
+            req.timings = {}
+            return req
+
+    def __init__(self, auth_key=None, keep_alive=True, pool_size=10, pool_idle_timeout=60.0, timeout=None,
+                 ssl_context=None, codec=None, lazy=False, cache=None, rate_limiter=None, retry=None,
+                 coalesce=False, metrics=None, transport=None):
         """ Initialize the ExpressPigeon API client.
 
         :param auth_key: ExpressPigeon API key.  If not provided, the API key will be acquired from
         the EXPRESSPIGEON_AUTH_KEY environment variable.
         :type auth_key: string
 
+        :param keep_alive: Reuse HTTPS connections across calls. When false every call opens a new connection.
+        :type keep_alive: bool
+
+        :param pool_size: Maximum number of connections kept per host, idle and in use together.
+        :type pool_size: int
+
+        :param pool_idle_timeout: Seconds an idle connection may stay in the pool before it is closed.
+        :type pool_idle_timeout: float
+
+        :param timeout: Socket timeout in seconds, None for the global default.
+        :type timeout: float
+
+        :param ssl_context: SSL context used for HTTPS connections.
+        :type ssl_context: ssl.SSLContext
+
+        :param codec: JSON backend: "json", "orjson", "ujson" or a JsonCodec instance. Defaults to the standard
+        library, or to the fastest installed backend when lazy is set.
+        :type codec: str or JsonCodec
+
+        :param lazy: Return JSON responses as LazyRecord/LazyList views that parse the raw body on first access
+        and wrap nested fields only when they are read.
+        :type lazy: bool
+
+        :param cache: Cache GET responses of lists, dictionaries, auto responders and flows: True for a ResponseCache
+        with the default TTLs, or a ResponseCache. Writes through this client invalidate the affected responses.
+        :type cache: bool or ResponseCache
+
+        :param rate_limiter: Pace calls with token buckets per endpoint family and retry throttled calls: True for
+        a RateLimiter with the default limits, or a RateLimiter, which may be shared between clients. Calls that stay
+        throttled raise RateLimited.
+        :type rate_limiter: bool or RateLimiter
+
+        :param retry: Retry calls that failed on the network or with 408/429/5xx: True for a RetryPolicy with the
+        defaults, or a RetryPolicy. Sends are given idempotency keys so that retrying them cannot send twice.
+        :type retry: bool or RetryPolicy
+
+        :param coalesce: Let concurrent identical GETs share one upstream call: True for a SingleFlight, or a
+        SingleFlight, whose counters report the calls collapsed.
+        :type coalesce: bool or SingleFlight
+
+        :param metrics: Record latency histograms, byte counts, statuses and errors per endpoint template: True for a
+        Metrics, or a Metrics, which may be shared between clients.
+        :type metrics: bool or Metrics
+
+        :param transport: Transport requests are sent through, e.g. an InProcessTransport that calls a Python handler
+        without sockets. Defaults to a PooledTransport, or a UrllibTransport when keep_alive is false; the pool and
+        connection parameters only apply to these defaults.
+        :type transport: Transport
+
         :returns: ExpressPigeon object for query API
         :rtype: ExpressPigeon
 
@@ -61,6 +127,24 @@ class ExpressPigeon(object):
                 raise InvalidAuthKey('You must provide a ExpressPigeon API key')
 
         self.auth_key = auth_key
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.codec = get_codec(codec, lazy)
+        self.lazy = lazy
+        self.cache = ResponseCache() if cache is True else cache or None
+        self.rate_limiter = RateLimiter() if rate_limiter is True else rate_limiter or None
+        self.retry = RetryPolicy() if retry is True else retry or None
+        self.single_flight = SingleFlight() if coalesce is True else coalesce or None
+        self.metrics = Metrics() if metrics is True else metrics or None
+        if transport is None:
+            if keep_alive:
+                transport = PooledTransport(maxsize=pool_size, idle_timeout=pool_idle_timeout, timeout=timeout,
+                                            ssl_context=ssl_context)
+            else:
+                transport = UrllibTransport(timeout=timeout, ssl_context=ssl_context)
+        self.transport = transport
+        self.pool = getattr(transport, "pool", None)
+        self.mirror = None
         self.lists = Lists(self)
         self.contacts = Contacts(self)
         self.campaigns = Campaigns(self)
@@ -80,47 +164,204 @@ class ExpressPigeon(object):
             else super(ExpressPigeon, self).__getattribute__(name)
         )
 
-    def __send_request__(self, endpoint, method, **kwargs):
+    def __url__(self, endpoint):
+        return (self.ROOT if self.ROOT.endswith("/") else self.ROOT + "/") + endpoint
+
+    def __open__(self, req, stream=False):
+        """ Sends a prepared request through the transport.
+
+        :param stream: leave the body unread so it can be consumed incrementally; the response must be closed
+
+        :returns: (status, response) where response has info() and read()
+        """
+        return self.transport.open(req, stream)
+
+    def close(self):
+        """ Closes idle connections of the transport. """
+        self.transport.close()
+
+    def __decode__(self, data):
+        if self.lazy:
+            return lazy_loads(data, self.codec)
+        return self.codec.loads_records(data)
+
+    def __prepare_request__(self, endpoint, method, **kwargs):
+        if "request" in kwargs:
+            # built ahead by the caller, e.g. a PreparedMessage
+            req = kwargs["request"]
+            self.request_hook(req)
+            return req
         content_type = kwargs["content_type"] if "content_type" in kwargs else "application/json"
-        body = kwargs["body"] if "body" in kwargs else json.dumps(kwargs["params"] if "params" in kwargs else {})
-        
-        opener = url_lib.build_opener(url_lib.HTTPSHandler)
-        
+        body = kwargs["body"] if "body" in kwargs else self.codec.dumps(kwargs["params"] if "params" in kwargs else {})
+
+        headers = {"X-auth-key": self.auth_key, "Content-type": content_type, "User-Agent": "Mozilla/5.0"}
+        if kwargs.get("idempotency_key") or (kwargs.get("idempotent") and self.retry is not None):
+            headers[IDEMPOTENCY_HEADER] = kwargs.get("idempotency_key") or idempotency_key()
         if isinstance(body, str):
             d = body.encode("utf-8")
         else:
             d = body
-        req = self.Request(url=(self.ROOT if self.ROOT.endswith("/") else self.ROOT + "/") + endpoint,
-                           method=method.upper(),
-                           headers={"X-auth-key": self.auth_key, "Content-type": content_type, "User-Agent": "Mozilla/5.0"},
-                           data=d)
+            if not isinstance(d, bytes) and hasattr(d, "__len__"):
+                headers["Content-length"] = str(len(d))
+        req = self.Request(url=self.__url__(endpoint), method=method.upper(), headers=headers, data=d)
 
         self.request_hook(req)
-        
+        return req
+
+    def __read_response__(self, status, response):
+        return self.__decode_response__(status, response, response.read())
+
+    def __decode_response__(self, status, response, data):
+        if status >= 400:
+            return self.__decode__(data)
+        ct = response.info()['Content-Type'] or ""
+        if 'text/plain' in ct:
+            return data.decode("utf-8")
+        return self.__decode__(data)
+
+    def __cache_lookup__(self, endpoint, method):
+        """ :returns: (cached response or MISSING, generation to store the fresh response under or None) """
+        if self.cache is None:
+            return MISSING, None
+        if method.lower() != "get":
+            self.cache.mutated(endpoint)
+            return MISSING, None
+        if not self.cache.ttl(endpoint):
+            return MISSING, None
+        generation = self.cache.generation(endpoint)
+        return self.cache.get(endpoint), generation
+
+    def __cache_store__(self, endpoint, method, status, result, generation):
+        if self.cache is None:
+            return
+        if generation is not None:
+            if status < 400:
+                self.cache.put(endpoint, result, generation)
+        elif method.lower() != "get":
+            # again after the write, so reads that overlapped it are not served
+            self.cache.mutated(endpoint)
+
+    def __throttled__(self, family, status, response, attempts):
+        """ Handles a throttled response: backs the family off and raises once the retries are used up.
+
+        :returns: seconds to wait before sending the call again
+        """
+        delay = self.rate_limiter.throttled(family, retry_after(response.info()))
+        error = self.__read_response__(status, response)
+        if attempts > self.rate_limiter.max_retries:
+            raise RateLimited(getattr(error, "message", error), family, delay, error)
+        return delay
+
+    def __exchange__(self, endpoint, req):
+        """ Opens a prepared request, retried under the retry policy if there is one. """
+        if self.retry is None:
+            return self.__open_limited__(endpoint, req)
+        started = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            last_started = monotonic()
+            try:
+                status, response = self.__open_limited__(endpoint, req)
+            except NETWORK_ERRORS as e:
+                if not self.retry.should_retry(req, attempt, error=e):
+                    self.retry.finished(attempt, started, last_started, failed=True)
+                    raise
+                delay = self.retry.delay(attempt)
+                self.retry.retrying(attempt, e)
+            else:
+                if not self.retry.should_retry(req, attempt, status=status):
+                    self.retry.finished(attempt, started, last_started, failed=status in self.retry.statuses)
+                    return status, response
+                delay = self.retry.delay(attempt, response)
+                response.read()
+                self.retry.retrying(attempt, status)
+            time.sleep(delay)
+
+    def __open_limited__(self, endpoint, req):
+        """ Opens a prepared request, paced by the rate limiter if there is one. """
+        if self.rate_limiter is None:
+            return self.__open__(req)
+        family = self.rate_limiter.family(endpoint, req.get_method())
+        attempts = 0
+        while True:
+            self.rate_limiter.acquire(family)
+            status, response = self.__open__(req)
+            if not is_throttled(status, response.info()):
+                self.rate_limiter.succeeded(family)
+                return status, response
+            attempts += 1
+            self.__throttled__(family, status, response, attempts)
+
+    def __send_request__(self, endpoint, method, **kwargs):
+        cached, generation = self.__cache_lookup__(endpoint, method)
+        if cached is not MISSING:
+            return cached
+        if self.single_flight is not None and method.lower() == "get":
+            return self.single_flight.do(endpoint, lambda: self.__fetch__(endpoint, method, generation, **kwargs))
+        return self.__fetch__(endpoint, method, generation, **kwargs)
+
+    def __fetch__(self, endpoint, method, generation, **kwargs):
+        req = self.__prepare_request__(endpoint, method, **kwargs)
+        started = monotonic()
         try:
-            response = opener.open(req);
-            ct = response.info()['Content-Type']
-            if ('text/plain' in ct):
-                return response.read().decode("utf-8");
-            return json.loads(response.read().decode("utf-8"), encoding="UTF-8",
-                              object_hook=lambda d: namedtuple('EpResponse', d.keys())(*d.values()))
-        except url_lib.HTTPError as e:
-            return json.loads(e.fp.read().decode("utf-8"), encoding="UTF-8",
-                              object_hook=lambda d: namedtuple('EpResponse', d.keys())(*d.values()))
+            status, response = self.__exchange__(endpoint, req)
+            data = response.read()
+        except Exception as e:
+            self.__observe__(observation(req, endpoint, None, monotonic() - started, None, e))
+            raise
+        self.__observe__(observation(req, endpoint, status, monotonic() - started, len(data)))
+        result = self.__decode_response__(status, response, data)
+        self.__cache_store__(endpoint, method, status, result, generation)
+        return result
 
-    def read_stream(self, endpoint, **kwargs):
-        opener = url_lib.build_opener(url_lib.HTTPSHandler)
+    def __observe__(self, observed):
+        if self.metrics is not None:
+            self.metrics.record(observed)
+        self.response_hook(observed)
 
-        req = self.Request(url=(self.ROOT if self.ROOT.endswith("/") else self.ROOT + "/") + endpoint,
+    def __prepare_stream__(self, endpoint):
+        req = self.Request(url=self.__url__(endpoint),
                            method="GET", headers={"X-auth-key": self.auth_key, "User-Agent": "Mozilla/5.0"})
 
         self.request_hook(req)
+        return req
 
-        try:
-            return opener.open(req).read().decode("utf-8")
-        except url_lib.HTTPError as e:
-            return json.loads(e.fp.read().decode("utf-8"), encoding="UTF-8",
-                              object_hook=lambda d: namedtuple('EpResponse', d.keys())(*d.values()))
+    def __read_stream__(self, status, response):
+        if status >= 400:
+            return self.__decode__(response.read())
+        return response.read().decode("utf-8")
+
+    def read_stream(self, endpoint, **kwargs):
+        req = self.__prepare_stream__(endpoint)
+        status, response = self.__open__(req)
+        return self.__read_stream__(status, response)
+
+    def open_stream(self, endpoint):
+        """ Sends a GET request and returns the response with its body unread, for endpoints such as CSV exports
+        that are too large to hold in memory. The response is a binary file-like object and must be closed.
+
+        :raises: :py:class:`ExpressPigeonException`: if the API answers with an error
+        """
+        req = self.__prepare_stream__(endpoint)
+        status, response = self.__open__(req, stream=True)
+        if status >= 400:
+            try:
+                error = self.__decode__(response.read())
+            finally:
+                response.close()
+            raise ExpressPigeonException(getattr(error, "message", error))
+        return response
+
+    def response_hook(self, observation):
+        """ Called after every call with an Observation of its method, endpoint template, status, timings and
+        payload sizes, or of the exception it raised. Override to export metrics.
+        """
+        pass
 
     def request_hook(self, request):
-        pass
\ No newline at end of file
+        pass
+
+
+if sys.version_info >= (3, 5):
+    from expresspigeon.aio import AsyncExpressPigeon
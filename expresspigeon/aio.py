@@ -0,0 +1,832 @@
+""" asyncio flavour of the ExpressPigeon client.
+
+Endpoint objects are shared with the blocking client: every endpoint method returns whatever ``ep.get``/``ep.post``
+returns, which on :py:class:`AsyncExpressPigeon` is a coroutine, so ``await api.lists.find_all()`` just works.
+Files attached to requests are streamed from disk in the default executor, never on the event loop.
+"""
+import asyncio
+import codecs
+import collections
+import csv
+import http.client as http_client
+import ssl
+
+from expresspigeon import ExpressPigeon
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.cache import MISSING
+from expresspigeon.ratelimit import is_throttled
+from expresspigeon.retry import NETWORK_ERRORS
+from expresspigeon.singleflight import shared
+from expresspigeon.metrics import observation
+from expresspigeon.campaigns import Campaigns
+from expresspigeon.fanout import SendResult, SendStats, recipient_fields, send_result
+from expresspigeon.lists import Lists
+from expresspigeon.messages import Messages
+from expresspigeon.paging import PAGE_SIZE, page_rows
+from expresspigeon.reports import CampaignReport, collect, report_calls
+from expresspigeon.pool import PooledResponse, monotonic, never_received, replayable
+from expresspigeon.streams import CHUNK_SIZE, ProgressMeter
+from expresspigeon.transport import InProcessTransport
+from expresspigeon.uploads import intervals, upload_finished
+from urllib.parse import urlsplit
+
+
+class AsyncConnection(object):
+    def __init__(self, reader, writer, connect_time=0.0):
+        self.reader = reader
+        self.writer = writer
+        self.connect_time = connect_time
+        self.sent = False
+
+    def is_dropped(self):
+        return self.reader.at_eof() or self.writer.transport.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncBody(object):
+    """ Incremental reader for a response body framed by Content-Length, chunked encoding or connection close. """
+
+    def __init__(self, reader, length=None, chunked=False):
+        self.reader = reader
+        self.remaining = length
+        self.chunked = chunked
+        self.done = length == 0
+        self._chunk_left = 0
+
+    async def read(self, amt=65536):
+        """ Returns up to ``amt`` bytes, b"" once the body is exhausted. """
+        if self.done:
+            return b""
+        if self.chunked:
+            if not self._chunk_left:
+                self._chunk_left = int((await self.reader.readline()).split(b";", 1)[0].strip(), 16)
+                if not self._chunk_left:
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    self.done = True
+                    return b""
+            data = await self.reader.read(min(amt, self._chunk_left))
+            if not data:
+                raise asyncio.IncompleteReadError(data, self._chunk_left)
+            self._chunk_left -= len(data)
+            if not self._chunk_left:
+                await self.reader.readexactly(2)
+            return data
+        if self.remaining is None:
+            data = await self.reader.read(amt)
+            self.done = not data
+            return data
+        data = await self.reader.read(min(amt, self.remaining))
+        if not data:
+            raise asyncio.IncompleteReadError(data, self.remaining)
+        self.remaining -= len(data)
+        self.done = not self.remaining
+        return data
+
+    async def read_all(self):
+        chunks = []
+        while True:
+            chunk = await self.read(1024 * 1024)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+async def read_response_head(reader, method):
+    """ Reads the status line and headers of one HTTP/1.1 response.
+
+    :returns: (status, reason, headers, body, keep_alive) with the body left unread
+    """
+    line = await reader.readline()
+    if not line:
+        raise http_client.RemoteDisconnected("connection closed before response")
+    version, status, reason = (line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+    headers = http_client.HTTPMessage()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip()] = value.strip()
+
+    status = int(status)
+    connection = (headers["Connection"] or "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        body = AsyncBody(reader, 0)
+    elif "chunked" in (headers["Transfer-Encoding"] or "").lower():
+        body = AsyncBody(reader, chunked=True)
+    elif headers["Content-Length"] is not None:
+        body = AsyncBody(reader, int(headers["Content-Length"]))
+    else:
+        body = AsyncBody(reader)
+        keep_alive = False
+    return status, reason, headers, body, keep_alive
+
+
+async def read_all(stream):
+    """ Reads a streamed response to the end; a single read may return only part of the body. """
+    chunks = []
+    while True:
+        chunk = await stream.read(1024 * 1024)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+class AsyncStream(object):
+    """ Response whose body is read incrementally with ``await stream.read()``.
+
+    The connection goes back to the pool once the body has been read to the end; closing the stream before that
+    discards the connection.
+    """
+
+    def __init__(self, pool, conn, status, reason, headers, body, keep_alive):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._pool = pool
+        self._conn = conn
+        self._body = body
+        self._keep_alive = keep_alive
+
+    def info(self):
+        return self.headers
+
+    async def read(self, amt=65536):
+        if self._conn is None:
+            return b""
+        try:
+            data = await self._body.read(amt)
+        except BaseException:
+            self._release(False)
+            raise
+        if self._body.done:
+            self._release(self._keep_alive)
+        return data
+
+    def _release(self, reusable):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.put_connection(conn, reusable=reusable)
+
+    def close(self):
+        self._release(self._keep_alive and self._body.done)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class AsyncConnectionPool(object):
+    """ Bounded pool of keep-alive connections to a single host, built on asyncio streams.
+
+    No more than ``maxsize`` requests are in flight against the host at once; further callers wait for a
+    connection to be handed back.  Idle connections older than ``idle_timeout`` seconds are evicted on checkout.
+    """
+
+    def __init__(self, scheme, host, port=None, maxsize=100, idle_timeout=60.0, timeout=None, ssl_context=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port or (443 if scheme == "https" else 80)
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.connections_created = 0
+        self.connections_reused = 0
+        self._idle = collections.deque()
+        self._slots = None
+
+    async def _new_connection(self):
+        kwargs = {}
+        if self.scheme == "https":
+            kwargs["ssl"] = self.ssl_context or ssl.create_default_context()
+            kwargs["server_hostname"] = self.host
+        started = monotonic()
+        reader, writer = await asyncio.open_connection(self.host, self.port, **kwargs)
+        self.connections_created += 1
+        return AsyncConnection(reader, writer, monotonic() - started)
+
+    async def get_connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxsize)
+        await self._slots.acquire()
+        try:
+            now = monotonic()
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                self._idle.popleft()[0].close()
+            while self._idle:
+                conn = self._idle.pop()[0]
+                if conn.is_dropped():
+                    conn.close()
+                    continue
+                self.connections_reused += 1
+                return conn, True
+            return await self._new_connection(), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def put_connection(self, conn, reusable=True):
+        if reusable and not conn.is_dropped():
+            self._idle.append((conn, monotonic()))
+        else:
+            conn.close()
+        self._slots.release()
+
+    async def _exchange(self, conn, method, path, body, headers):
+        head = ["{0} {1} HTTP/1.1".format(method, path)]
+        names = set(name.lower() for name in headers)
+        if "host" not in names:
+            head.append("Host: {0}".format(self.host if self.port in (80, 443) else
+                                           "{0}:{1}".format(self.host, self.port)))
+        # a body without a length, such as a generator, goes out in chunked transfer encoding
+        chunked = not hasattr(body, "__len__")
+        if chunked:
+            head.append("Transfer-Encoding: chunked")
+        elif "content-length" not in names:
+            head.append("Content-Length: {0}".format(len(body)))
+        head.extend("{0}: {1}".format(name, value) for name, value in headers.items())
+        head = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+        if isinstance(body, bytes):
+            conn.writer.write(head + body)
+        else:
+            conn.writer.write(head)
+            chunks = iter(body)
+            loop = asyncio.get_event_loop()
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                if not chunk:
+                    continue
+                if chunked:
+                    conn.writer.write("{0:X}\r\n".format(len(chunk)).encode("latin-1") + chunk + b"\r\n")
+                else:
+                    conn.writer.write(chunk)
+                await conn.writer.drain()
+            if chunked:
+                conn.writer.write(b"0\r\n\r\n")
+        await conn.writer.drain()
+        conn.sent = True
+        return await read_response_head(conn.reader, method)
+
+    async def urlopen(self, method, path, body=None, headers=None, preload=True, timings=None):
+        """ Sends a request on a pooled connection and reads the response fully, or with ``preload=False``
+        returns an :py:class:`AsyncStream` that holds the connection until its body is consumed.
+
+        A request that fails on a reused connection is repeated once on a fresh one when the server cannot have
+        acted on it and its body can be sent again, see :py:class:`ConnectionPool`.
+
+        :param timings: dict that receives "connect" and "ttfb" seconds, see :py:class:`ConnectionPool`
+        """
+        body = body or b""
+        headers = headers or {}
+        started = monotonic()
+        conn, reused = await self.get_connection()
+        while True:
+            try:
+                if timings is not None:
+                    timings["connect"] = 0.0 if reused else conn.connect_time
+                conn.sent = False
+                exchange = self._exchange(conn, method, path, body, headers)
+                if self.timeout is not None:
+                    status, reason, response_headers, response_body, keep_alive = \
+                        await asyncio.wait_for(exchange, self.timeout)
+                else:
+                    status, reason, response_headers, response_body, keep_alive = await exchange
+                if timings is not None:
+                    timings["ttfb"] = monotonic() - started
+                if preload:
+                    if self.timeout is not None:
+                        data = await asyncio.wait_for(response_body.read_all(), self.timeout)
+                    else:
+                        data = await response_body.read_all()
+            except asyncio.TimeoutError:
+                self.put_connection(conn, reusable=False)
+                raise
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                self.put_connection(conn, reusable=False)
+                if not reused or not replayable(body) or not never_received(e, conn.sent):
+                    raise
+                conn, reused = await self.get_connection()
+                continue
+            except BaseException:
+                self.put_connection(conn, reusable=False)
+                raise
+            if not preload:
+                return AsyncStream(self, conn, status, reason, response_headers, response_body, keep_alive)
+            self.put_connection(conn, reusable=keep_alive)
+            return PooledResponse(status, reason, response_headers, data)
+
+    def close(self):
+        while self._idle:
+            self._idle.popleft()[0].close()
+
+
+class AsyncPoolManager(object):
+    """ Keeps one :py:class:`AsyncConnectionPool` per (scheme, host, port). """
+
+    def __init__(self, maxsize=100, idle_timeout=60.0, timeout=None, ssl_context=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.pools = {}
+
+    def connection_pool(self, scheme, host, port=None):
+        key = (scheme, host, port)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = AsyncConnectionPool(scheme, host, port, maxsize=self.maxsize, idle_timeout=self.idle_timeout,
+                                       timeout=self.timeout, ssl_context=self.ssl_context)
+            self.pools[key] = pool
+        return pool
+
+    async def urlopen(self, method, url, body=None, headers=None, preload=True, timings=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError("unsupported URL scheme: {0}".format(parts.scheme))
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self.connection_pool(parts.scheme, parts.hostname, parts.port)
+        return await pool.urlopen(method, path, body=body, headers=headers, preload=preload, timings=timings)
+
+    def clear(self):
+        pools = list(self.pools.values())
+        self.pools.clear()
+        for pool in pools:
+            pool.close()
+
+
+class AsyncTransport(object):
+    """ Interface of a transport of :py:class:`AsyncExpressPigeon`, see :py:class:`expresspigeon.transport.Transport`.
+
+    ``open`` is a coroutine; a streamed response is read with ``await response.read(amt)`` and can be used with
+    ``async with``.
+    """
+
+    async def open(self, req, stream=False):
+        raise NotImplementedError
+
+    def close(self):
+        """ Releases idle connections. """
+        pass
+
+
+class AsyncPooledTransport(AsyncTransport):
+    """ Keep-alive asyncio connections from an :py:class:`AsyncPoolManager`, see its parameters. """
+
+    def __init__(self, maxsize=100, idle_timeout=60.0, timeout=None, ssl_context=None):
+        self.pool = AsyncPoolManager(maxsize=maxsize, idle_timeout=idle_timeout, timeout=timeout,
+                                     ssl_context=ssl_context)
+
+    async def open(self, req, stream=False):
+        response = await self.pool.urlopen(req.get_method(), req.get_full_url(), body=req.data,
+                                           headers=dict(req.header_items()), preload=not stream,
+                                           timings=req.timings)
+        return response.status, response
+
+    def close(self):
+        self.pool.clear()
+
+
+class AsyncInProcessStream(object):
+    """ Streamed response of an :py:class:`AsyncInProcessTransport`, over a body already held in memory. """
+
+    def __init__(self, response):
+        self.status = response.status
+        self.headers = response.headers
+        self._response = response
+
+    def info(self):
+        return self.headers
+
+    async def read(self, amt=65536):
+        return self._response.read(amt)
+
+    def close(self):
+        self._response.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class AsyncInProcessTransport(AsyncTransport):
+    """ Routes requests to a Python handler on the event loop, without sockets, see
+    :py:class:`expresspigeon.transport.InProcessTransport`.
+    """
+
+    def __init__(self, handler):
+        self.transport = InProcessTransport(handler)
+
+    async def open(self, req, stream=False):
+        status, response = self.transport.open(req, stream)
+        return status, AsyncInProcessStream(response) if stream else response
+
+
+class AsyncSingleFlight(object):
+    """ Runs at most one call per key at a time within an event loop, see
+    :py:class:`expresspigeon.singleflight.SingleFlight`.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._flights = {}
+
+    async def do(self, key, fn):
+        """ Awaits ``fn()``, unless a call with the same ``key`` is in flight, in which case its outcome is shared. """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.collapsed += 1
+            return shared(await asyncio.shield(flight))
+        flight = self._flights[key] = asyncio.get_event_loop().create_future()
+        self.calls += 1
+        try:
+            result = await fn()
+        except BaseException as e:
+            del self._flights[key]
+            if isinstance(e, asyncio.CancelledError):
+                flight.cancel()
+            else:
+                flight.set_exception(e)
+                # retrieved here so that a flight without followers does not log an unretrieved exception
+                flight.exception()
+            raise
+        del self._flights[key]
+        flight.set_result(result)
+        return result
+
+    def in_flight(self):
+        return len(self._flights)
+
+    def stats(self):
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": len(self._flights)}
+
+
+class AsyncSendManyRun(object):
+    """ Async iterable over the SendResult of every recipient in completion order, see :py:class:`SendManyRun`. """
+
+    def __init__(self, send, recipients, merge_fields, concurrency):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.stats = SendStats()
+        self._send = send
+        self._recipients = recipients
+        self._merge_fields = merge_fields
+        self._concurrency = concurrency
+
+    async def _send_one(self, recipient):
+        to, merge_fields = recipient_fields(recipient, self._merge_fields)
+        started = monotonic()
+        try:
+            response = await self._send(to, merge_fields)
+        except Exception as e:
+            result = SendResult(to, None, e, None, monotonic() - started)
+        else:
+            result = send_result(to, response, monotonic() - started)
+        self.stats.add(result)
+        return result
+
+    async def __aiter__(self):
+        self.stats.start()
+        pending = set()
+        try:
+            for recipient in self._recipients:
+                pending.add(asyncio.ensure_future(self._send_one(recipient)))
+                if len(pending) >= self._concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            self.stats.finish()
+
+
+async def paginate(fetch, from_id=None, page_size=PAGE_SIZE, prefetch=True):
+    """ Async counterpart of :py:func:`expresspigeon.paging.paginate`; ``fetch`` returns an awaitable page. """
+    rows, next_id = page_rows(await fetch(from_id), from_id, page_size)
+    upcoming = None
+    try:
+        while True:
+            upcoming = asyncio.ensure_future(fetch(next_id)) if prefetch and next_id is not None else None
+            for row in rows:
+                yield row
+            rows = None
+            if next_id is None:
+                return
+            page = await upcoming if upcoming else await fetch(next_id)
+            upcoming = None
+            rows, next_id = page_rows(page, next_id, page_size)
+    finally:
+        if upcoming is not None:
+            upcoming.cancel()
+
+
+class AsyncCampaigns(Campaigns):
+    def iter_all(self, start_date=None, end_date=None, from_id=None, prefetch=True):
+        return paginate(lambda page_from_id: self.get_all(start_date, end_date, page_from_id), from_id,
+                        prefetch=prefetch)
+
+    async def full_report(self, campaign_ids, concurrency=8):
+        reports = dict((campaign_id, CampaignReport(campaign_id)) for campaign_id in campaign_ids)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(campaign_id, call):
+            async with semaphore:
+                response = await getattr(self, call)(campaign_id)
+            collect(reports[campaign_id], call, response)
+
+        tasks = [asyncio.ensure_future(fetch(campaign_id, call)) for campaign_id, call in report_calls(campaign_ids)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return reports
+
+    iter_all.__doc__ = Campaigns.iter_all.__doc__
+    full_report.__doc__ = Campaigns.full_report.__doc__
+
+
+class AsyncLists(Lists):
+    async def iter_csv(self, list_id, progress=None):
+        meter = ProgressMeter(progress)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        pending = ""
+        record = []
+        quotes = 0
+        stream = await self.ep.open_stream("{0}/{1}/csv".format(self.endpoint, list_id))
+        async with stream:
+            while True:
+                chunk = await stream.read(CHUNK_SIZE)
+                meter.update(len(chunk))
+                lines = (pending + decoder.decode(chunk, final=not chunk)).split("\n")
+                pending = lines.pop()
+                lines = [line + "\n" for line in lines]
+                if not chunk and pending:
+                    lines.append(pending)
+                for line in lines:
+                    # a record goes on while a quoted field spans the line break, i.e. its quotes are unbalanced
+                    record.append(line)
+                    quotes += line.count('"')
+                    if quotes % 2 == 0:
+                        for row in csv.reader(["".join(record)], skipinitialspace=True):
+                            yield row
+                        record = []
+                        quotes = 0
+                if not chunk:
+                    break
+        meter.finish()
+
+    async def export_csv(self, list_id, path, progress=None):
+        meter = ProgressMeter(progress)
+        loop = asyncio.get_event_loop()
+        stream = await self.ep.open_stream("{0}/{1}/csv".format(self.endpoint, list_id))
+        async with stream:
+            f = await loop.run_in_executor(None, open, path, "wb")
+            try:
+                while True:
+                    chunk = await stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await loop.run_in_executor(None, f.write, chunk)
+                    meter.update(len(chunk))
+            finally:
+                await loop.run_in_executor(None, f.close)
+        return meter.finish()
+
+    def upload_async(self, list_id, contacts_file, timeout=None):
+        """ Uploads a CSV file like :func:`upload` and returns an asyncio task that resolves to the final
+        :func:`upload_status`, checked quickly at first and then at growing intervals, see :py:class:`UploadPoller`.
+
+        :param timeout: Seconds to wait for the import before the task fails, None to wait as long as it takes
+        :type timeout: float
+
+        :rtype: asyncio.Task
+        """
+        return asyncio.ensure_future(self._wait_for_upload(list_id, contacts_file, timeout))
+
+    async def _wait_for_upload(self, list_id, contacts_file, timeout):
+        response = await self.upload(list_id, contacts_file)
+        upload_id = getattr(response, "upload_id", None)
+        if upload_id is None:
+            raise ExpressPigeonException(getattr(response, "message", response))
+        deadline = monotonic() + timeout if timeout is not None else None
+        for delay in intervals():
+            await asyncio.sleep(delay)
+            status = await self.upload_status(upload_id)
+            if upload_finished(status):
+                return status
+            if deadline is not None and monotonic() >= deadline:
+                raise ExpressPigeonException("upload={0} not finished in time".format(upload_id))
+
+    iter_csv.__doc__ = Lists.iter_csv.__doc__
+    export_csv.__doc__ = Lists.export_csv.__doc__
+
+
+class AsyncMessages(Messages):
+    def send_many(self, template_id, recipients, reply_to, from_name, subject, merge_fields=None,
+                  view_online=False, click_tracking=True, concurrency=100):
+        def send(to, fields):
+            return self.send_message(template_id, to, reply_to, from_name, subject, merge_fields=fields,
+                                     view_online=view_online, click_tracking=click_tracking)
+
+        return AsyncSendManyRun(send, recipients, merge_fields, concurrency)
+
+    def iter_reports(self, start_date=None, end_date=None, from_id=None, prefetch=True):
+        return paginate(lambda page_from_id: self.reports(start_date, end_date,
+                                                          None if page_from_id is None else str(page_from_id)),
+                        from_id, prefetch=prefetch)
+
+    send_many.__doc__ = Messages.send_many.__doc__
+    iter_reports.__doc__ = Messages.iter_reports.__doc__
+
+
+class AsyncExpressPigeon(ExpressPigeon):
+    """ Non-blocking ExpressPigeon API client.
+
+    Exposes the same endpoint objects as :py:class:`ExpressPigeon`, but every endpoint method is awaitable::
+
+        async with AsyncExpressPigeon() as api:
+            res = await api.messages.send_message(...)
+    """
+
+    asynchronous = True
+
+    def __init__(self, auth_key=None, pool_size=100, pool_idle_timeout=60.0, timeout=None, ssl_context=None,
+                 codec=None, lazy=False, cache=None, rate_limiter=None, retry=None, coalesce=False, metrics=None,
+                 transport=None):
+        """ Initialize the asyncio ExpressPigeon API client.
+
+        :param auth_key: ExpressPigeon API key.  If not provided, the API key will be acquired from
+        the EXPRESSPIGEON_AUTH_KEY environment variable.
+        :type auth_key: string
+
+        :param pool_size: Maximum number of requests in flight per host, which is also the number of
+        connections kept open.
+        :type pool_size: int
+
+        :param pool_idle_timeout: Seconds an idle connection may stay in the pool before it is closed.
+        :type pool_idle_timeout: float
+
+        :param timeout: Seconds to wait for a single request/response exchange, None to wait forever.
+        :type timeout: float
+
+        :param ssl_context: SSL context used for HTTPS connections.
+        :type ssl_context: ssl.SSLContext
+
+        :param codec: JSON backend, see :py:class:`ExpressPigeon`.
+        :type codec: str or JsonCodec
+
+        :param lazy: Return JSON responses as lazily parsed views, see :py:class:`ExpressPigeon`.
+        :type lazy: bool
+
+        :param cache: Cache read-mostly GET responses, see :py:class:`ExpressPigeon`.
+        :type cache: bool or ResponseCache
+
+        :param rate_limiter: Pace calls per endpoint family, see :py:class:`ExpressPigeon`.
+        :type rate_limiter: bool or RateLimiter
+
+        :param retry: Retry transient failures, see :py:class:`ExpressPigeon`.
+        :type retry: bool or RetryPolicy
+
+        :param coalesce: Let concurrent identical GETs share one upstream call: True for an AsyncSingleFlight, or an
+        AsyncSingleFlight.
+        :type coalesce: bool or AsyncSingleFlight
+
+        :param metrics: Record per-endpoint latency and traffic, see :py:class:`ExpressPigeon`.
+        :type metrics: bool or Metrics
+
+        :param transport: Transport requests are sent through, e.g. an AsyncInProcessTransport that calls a Python
+        handler without sockets. Defaults to an AsyncPooledTransport; the pool and connection parameters only apply
+        to the default.
+        :type transport: AsyncTransport
+
+        :raises: :py:class:`InvalidAuthKey`: if the ExpressPigeon API key not found
+        """
+        if transport is None:
+            transport = AsyncPooledTransport(maxsize=pool_size, idle_timeout=pool_idle_timeout, timeout=timeout,
+                                             ssl_context=ssl_context)
+        ExpressPigeon.__init__(self, auth_key, timeout=timeout, ssl_context=ssl_context, codec=codec, lazy=lazy,
+                               cache=cache, rate_limiter=rate_limiter, retry=retry, metrics=metrics,
+                               transport=transport)
+        self.single_flight = AsyncSingleFlight() if coalesce is True else coalesce or None
+        self.lists = AsyncLists(self)
+        self.campaigns = AsyncCampaigns(self)
+        self.messages = AsyncMessages(self)
+
+    async def __open__(self, req, stream=False):
+        return await self.transport.open(req, stream)
+
+    async def __exchange__(self, endpoint, req):
+        if self.retry is None:
+            return await self.__open_limited__(endpoint, req)
+        started = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            last_started = monotonic()
+            try:
+                status, response = await self.__open_limited__(endpoint, req)
+            except NETWORK_ERRORS as e:
+                if not self.retry.should_retry(req, attempt, error=e):
+                    self.retry.finished(attempt, started, last_started, failed=True)
+                    raise
+                delay = self.retry.delay(attempt)
+                self.retry.retrying(attempt, e)
+            else:
+                if not self.retry.should_retry(req, attempt, status=status):
+                    self.retry.finished(attempt, started, last_started, failed=status in self.retry.statuses)
+                    return status, response
+                delay = self.retry.delay(attempt, response)
+                self.retry.retrying(attempt, status)
+            await asyncio.sleep(delay)
+
+    async def __open_limited__(self, endpoint, req):
+        if self.rate_limiter is None:
+            return await self.__open__(req)
+        family = self.rate_limiter.family(endpoint, req.get_method())
+        attempts = 0
+        while True:
+            wait = self.rate_limiter.reserve(family)
+            while wait:
+                self.rate_limiter.waited_for(wait)
+                await asyncio.sleep(wait)
+                wait = self.rate_limiter.reserve(family)
+            status, response = await self.__open__(req)
+            if not is_throttled(status, response.info()):
+                self.rate_limiter.succeeded(family)
+                return status, response
+            attempts += 1
+            self.__throttled__(family, status, response, attempts)
+
+    async def __send_request__(self, endpoint, method, **kwargs):
+        cached, generation = self.__cache_lookup__(endpoint, method)
+        if cached is not MISSING:
+            return cached
+        if self.single_flight is not None and method.lower() == "get":
+            return await self.single_flight.do(endpoint, lambda: self.__fetch__(endpoint, method, generation,
+                                                                                 **kwargs))
+        return await self.__fetch__(endpoint, method, generation, **kwargs)
+
+    async def __fetch__(self, endpoint, method, generation, **kwargs):
+        req = self.__prepare_request__(endpoint, method, **kwargs)
+        started = monotonic()
+        try:
+            status, response = await self.__exchange__(endpoint, req)
+        except Exception as e:
+            self.__observe__(observation(req, endpoint, None, monotonic() - started, None, e))
+            raise
+        data = response.read()
+        self.__observe__(observation(req, endpoint, status, monotonic() - started, len(data)))
+        result = self.__decode_response__(status, response, data)
+        self.__cache_store__(endpoint, method, status, result, generation)
+        return result
+
+    async def read_stream(self, endpoint, **kwargs):
+        req = self.__prepare_stream__(endpoint)
+        status, response = await self.__open__(req)
+        return self.__read_stream__(status, response)
+
+    async def open_stream(self, endpoint):
+        """ Sends a GET request and returns an :py:class:`AsyncStream` with its body unread. The stream must be
+        read to the end or closed.
+
+        :raises: :py:class:`ExpressPigeonException`: if the API answers with an error
+        """
+        req = self.__prepare_stream__(endpoint)
+        status, response = await self.__open__(req, stream=True)
+        if status >= 400:
+            try:
+                error = self.__decode__(await read_all(response))
+            finally:
+                response.close()
+            raise ExpressPigeonException(getattr(error, "message", error))
+        return response
+
+    async def close(self):
+        """ Closes idle connections of the transport. """
+        self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
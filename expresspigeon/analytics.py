@@ -0,0 +1,285 @@
+""" NumPy structured arrays of campaign events and message reports, with vectorized rate helpers.
+
+Optional: needs numpy, which the rest of the client does not (``pip install ExpressPigeon[analytics]``).
+
+Responses are converted straight into a :py:class:`Table`: one structured array, timestamps parsed once into
+``datetime64[ms]`` (NaT when missing), and strings such as emails and urls replaced by integer codes into shared
+:py:class:`Categories`, so tables built from many campaigns can be concatenated and compared.  Lists within a row,
+such as the links a message was clicked on, go to a child table of one row per item.  A table converts to pandas with
+``pandas.DataFrame(table.data)``.
+"""
+from expresspigeon.reports import EVENTS, CampaignReport, parse_timestamp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EVENT_CODES = dict((event, code) for code, event in enumerate(EVENTS))
+
+STATUSES = ("in_transit", "delivered", "opened", "clicked", "bounced", "spam", "unknown")
+
+# message status, strongest first; a report with none of these flags set is "unknown"
+_PRECEDENCE = ("spam", "bounced", "clicked", "opened", "delivered", "in_transit")
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("expresspigeon.analytics needs numpy, install it with pip install numpy")
+
+
+def event_dtype():
+    """ One campaign event: ``event`` codes :py:data:`EVENTS`, ``email`` and ``url`` code :py:class:`Categories`,
+    ``url`` is -1 except for clicks. """
+    require_numpy()
+    return np.dtype([("campaign_id", "i8"), ("event", "i1"), ("email", "i4"), ("url", "i4"),
+                     ("timestamp", "datetime64[ms]")])
+
+
+def message_dtype():
+    """ One transactional message report: ``status`` codes :py:data:`STATUSES`, ``email`` codes
+    :py:class:`Categories`. """
+    require_numpy()
+    return np.dtype([("id", "i8"), ("email", "i4"), ("status", "i1"), ("delivered", "?"), ("opened", "?"),
+                     ("clicked", "?"), ("bounced", "?"), ("spam", "?"), ("in_transit", "?"),
+                     ("created_at", "datetime64[ms]"), ("updated_at", "datetime64[ms]")])
+
+
+def message_url_dtype():
+    """ One clicked link of a transactional message: ``id`` of the message, ``url`` code :py:class:`Categories`. """
+    require_numpy()
+    return np.dtype([("id", "i8"), ("url", "i4")])
+
+
+class Categories(object):
+    """ Interning table of labels to dense integer codes, in first-seen order. None codes to -1. """
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self.codes = {}
+        for label in labels:
+            self.code(label)
+
+    def code(self, label):
+        if label is None:
+            return -1
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def decode(self, codes):
+        """ Labels of an array of codes, as an object array; -1 decodes to None. """
+        labels = np.array(self.labels + [None], dtype=object)
+        return labels[np.asarray(codes)]
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class Table(object):
+    """ A structured array and the :py:class:`Categories` its code fields refer to, with its child tables by name. """
+
+    def __init__(self, data, categories, children=None):
+        self.data = data
+        self.categories = categories
+        self.children = children or {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, field):
+        return self.data[field]
+
+    def labels(self, field):
+        """ Decoded values of a code field, e.g. ``table.labels("email")``. """
+        if field == "event":
+            return np.array(EVENTS, dtype=object)[self.data[field]]
+        if field == "status":
+            return np.array(STATUSES, dtype=object)[self.data[field]]
+        return self.categories[field].decode(self.data[field])
+
+
+def datetimes(seconds):
+    """ ``datetime64[ms]`` array of epoch seconds, NaN becoming NaT. """
+    seconds = np.asarray(seconds, dtype="f8")
+    missing = np.isnan(seconds)
+    ms = np.round(np.where(missing, 0.0, seconds) * 1000.0).astype("i8")
+    ms[missing] = np.iinfo(np.int64).min
+    return ms.view("datetime64[ms]")
+
+
+def parse_datetimes(values):
+    """ ``datetime64[ms]`` array of API timestamps such as ``2013-09-20T11:29:57.000+0000``. """
+    return datetimes([parse_timestamp(value) for value in values])
+
+
+def campaign_events(reports, categories=None):
+    """ Table of the events of many campaigns.
+
+    :param reports: {campaign_id: CampaignReport}, as returned by :py:meth:`Campaigns.full_report`, or
+    {campaign_id: {event: rows}} with the responses of e.g. :py:meth:`Campaigns.opened` and
+    :py:meth:`Campaigns.clicked`
+    :type reports: dict
+
+    :param categories: {"email": Categories, "url": Categories} to extend, so codes agree with an earlier table
+    :type categories: dict
+
+    :rtype: Table
+    """
+    require_numpy()
+    categories = categories or {}
+    emails = categories.setdefault("email", Categories())
+    urls = categories.setdefault("url", Categories())
+    parts = []
+    for campaign_id, report in reports.items():
+        if isinstance(report, CampaignReport):
+            codes = np.array([emails.code(email) for email in report.emails], dtype="i4")
+            for event, column in report.events.items():
+                part = np.empty(len(column), dtype=event_dtype())
+                part["campaign_id"] = campaign_id
+                part["event"] = EVENT_CODES[event]
+                part["email"] = codes[np.asarray(column.rows, dtype="i8")] if len(column) else 0
+                part["url"] = [urls.code(url) for url in column.urls] if column.urls is not None else -1
+                part["timestamp"] = datetimes(np.array(column.times, dtype="f8"))
+                parts.append(part)
+        else:
+            for event, rows in report.items():
+                part = np.empty(len(rows), dtype=event_dtype())
+                part["campaign_id"] = campaign_id
+                part["event"] = EVENT_CODES[event]
+                part["email"] = [emails.code(r.email) for r in rows]
+                part["url"] = [urls.code(getattr(r, "url", None)) for r in rows]
+                part["timestamp"] = parse_datetimes([getattr(r, "timestamp", None) for r in rows])
+                parts.append(part)
+    data = np.concatenate(parts) if parts else np.empty(0, dtype=event_dtype())
+    return Table(data, categories)
+
+
+def message_reports(rows, categories=None):
+    """ Table of :py:meth:`Messages.reports` rows, or of any iterable of them such as
+    :py:meth:`Messages.iter_reports`.  The clicked links are in the child table ``children["urls"]``, one row per
+    message and link, e.g. clicks per link are ``np.bincount(table.children["urls"]["url"])``.
+
+    :param categories: {"email": Categories, "url": Categories} to extend
+    :type categories: dict
+
+    :rtype: Table
+    """
+    require_numpy()
+    categories = categories or {}
+    emails = categories.setdefault("email", Categories())
+    urls = categories.setdefault("url", Categories())
+    columns = dict((field, []) for field in message_dtype().names)
+    url_ids, url_codes = [], []
+    for r in rows:
+        columns["id"].append(r.id)
+        columns["email"].append(emails.code(r.email))
+        for url in getattr(r, "urls", None) or ():
+            url_ids.append(r.id)
+            url_codes.append(urls.code(url))
+        status = STATUSES.index("unknown")
+        for flag in _PRECEDENCE:
+            if getattr(r, flag, False):
+                status = STATUSES.index(flag)
+                break
+        columns["status"].append(status)
+        for flag in _PRECEDENCE:
+            columns[flag].append(bool(getattr(r, flag, False)))
+        columns["created_at"].append(parse_timestamp(getattr(r, "created_at", None)))
+        columns["updated_at"].append(parse_timestamp(getattr(r, "updated_at", None)))
+    data = np.empty(len(columns["id"]), dtype=message_dtype())
+    for field, values in columns.items():
+        data[field] = datetimes(values) if field in ("created_at", "updated_at") else values
+    clicked = np.empty(len(url_ids), dtype=message_url_dtype())
+    clicked["id"] = url_ids
+    clicked["url"] = url_codes
+    return Table(data, categories, {"urls": Table(clicked, categories)})
+
+
+def _keys(data):
+    """ One int64 per (campaign_id, email) pair. """
+    return (data["campaign_id"].astype("i8") << 32) | data["email"].astype("i8")
+
+
+def _contacts_per_campaign(table, event, campaign_ids):
+    """ Distinct emails with ``event`` in each of the sorted ``campaign_ids``. """
+    data = table.data[table.data["event"] == EVENT_CODES[event]]
+    counts = np.zeros(len(campaign_ids), dtype="i8")
+    ids = np.unique(_keys(data)) >> 32
+    np.add.at(counts, np.searchsorted(campaign_ids, ids), 1)
+    return counts
+
+
+def _rate(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def open_rate(table):
+    """ Unique opens over delivered contacts of every campaign in an events table.
+
+    :returns: structured array with campaign_id, delivered, opened and open_rate
+    """
+    campaign_ids = np.unique(table.data["campaign_id"])
+    result = np.empty(len(campaign_ids), dtype=[("campaign_id", "i8"), ("delivered", "i8"), ("opened", "i8"),
+                                                ("open_rate", "f8")])
+    result["campaign_id"] = campaign_ids
+    result["delivered"] = _contacts_per_campaign(table, "delivered", campaign_ids)
+    result["opened"] = _contacts_per_campaign(table, "opened", campaign_ids)
+    result["open_rate"] = _rate(result["opened"], result["delivered"])
+    return result
+
+
+def click_through(table):
+    """ Clicks, distinct clickers and click-through rate (clickers over delivered contacts) of every link of every
+    campaign; ``url`` is a code, decode it with ``table.categories["url"].decode(result["url"])``.
+
+    :returns: structured array with campaign_id, url, clicks, clickers and ctr
+    """
+    dtype = [("campaign_id", "i8"), ("url", "i4"), ("clicks", "i8"), ("clickers", "i8"), ("ctr", "f8")]
+    data = table.data[table.data["event"] == EVENT_CODES["clicked"]]
+    if not len(data):
+        return np.empty(0, dtype=dtype)
+    data = data[np.lexsort((data["email"], data["url"], data["campaign_id"]))]
+    group = np.ones(len(data), dtype=bool)
+    group[1:] = (data["campaign_id"][1:] != data["campaign_id"][:-1]) | (data["url"][1:] != data["url"][:-1])
+    clicker = group.copy()
+    clicker[1:] |= data["email"][1:] != data["email"][:-1]
+    starts = np.flatnonzero(group)
+
+    result = np.empty(len(starts), dtype=dtype)
+    result["campaign_id"] = data["campaign_id"][starts]
+    result["url"] = data["url"][starts]
+    result["clicks"] = np.diff(np.append(starts, len(data)))
+    result["clickers"] = np.add.reduceat(clicker.astype("i8"), starts)
+    campaign_ids = np.unique(table.data["campaign_id"])
+    delivered = _contacts_per_campaign(table, "delivered", campaign_ids)
+    result["ctr"] = _rate(result["clickers"], delivered[np.searchsorted(campaign_ids, result["campaign_id"])])
+    return result
+
+
+def _first(table, event):
+    """ (keys, timestamps) of the earliest ``event`` of every (campaign_id, email) pair, sorted by key. """
+    data = table.data[(table.data["event"] == EVENT_CODES[event]) & ~np.isnat(table.data["timestamp"])]
+    data = data[np.argsort(data["timestamp"], kind="stable")]
+    keys, first = np.unique(_keys(data), return_index=True)
+    return keys, data["timestamp"][first]
+
+
+def time_to_open(table):
+    """ Delay between delivery and first open of every contact that opened, across all campaigns of an events table.
+
+    The distribution of a campaign is then e.g.
+    ``np.percentile(delays["delay"][delays["campaign_id"] == 1] / np.timedelta64(1, "s"), [50, 90])``.
+
+    :returns: structured array with campaign_id, email and delay as timedelta64[ms]
+    """
+    delivered_keys, delivered_at = _first(table, "delivered")
+    opened_keys, opened_at = _first(table, "opened")
+    keys, d, o = np.intersect1d(delivered_keys, opened_keys, assume_unique=True, return_indices=True)
+    result = np.empty(len(keys), dtype=[("campaign_id", "i8"), ("email", "i4"), ("delay", "timedelta64[ms]")])
+    result["campaign_id"] = keys >> 32
+    result["email"] = keys & 0xFFFFFFFF
+    result["delay"] = opened_at[o] - delivered_at[d]
+    return result
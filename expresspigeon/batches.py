@@ -0,0 +1,110 @@
+""" Splitting of large uploads into size-bounded batches sent concurrently. """
+import time
+from collections import namedtuple
+
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fanout import imap_unordered
+from expresspigeon.pool import monotonic
+from expresspigeon.retry import RETRY_STATUSES
+
+BatchResult = namedtuple('BatchResult', ['index', 'contacts', 'response', 'error', 'attempts', 'latency'])
+BatchResult.__doc__ = """ Outcome of one batch.
+
+``index`` numbers batches in input order from 0 and ``contacts`` holds the batch.  ``response`` is the API response
+to the last attempt; ``error`` is None when the batch was stored, otherwise the API error message or the exception
+raised while sending.  ``latency`` covers all ``attempts``, waits between them included.
+"""
+
+
+def encoded(value, codec):
+    data = codec.dumps(value)
+    return data if isinstance(data, bytes) else data.encode("utf-8")
+
+
+def batches(items, codec, max_count, max_bytes):
+    """ Groups ``items`` into lists of at most ``max_count`` items whose JSON encodings add up to at most
+    ``max_bytes``, encoding every item once.  An item larger than ``max_bytes`` on its own makes a batch by itself.
+
+    :returns: generator of (items, encoded items) pairs
+    """
+    batch, chunks, size = [], [], 0
+    for item in items:
+        data = encoded(item, codec)
+        if batch and (len(batch) >= max_count or size + len(data) + 1 > max_bytes):
+            yield batch, chunks
+            batch, chunks, size = [], [], 0
+        batch.append(item)
+        chunks.append(data)
+        size += len(data) + 1
+    if batch:
+        yield batch, chunks
+
+
+def batch_error(response):
+    """ :returns: None if ``response`` reports success, else the error message """
+    if getattr(response, "status", "success") == "success" and getattr(response, "code", 200) < 400:
+        return None
+    return getattr(response, "message", response)
+
+
+class UpsertRun(object):
+    """ Iterable over the :py:class:`BatchResult` of every batch of a :func:`Contacts.upsert_stream` call, in
+    completion order.
+
+    A batch that fails with an exception or a retryable status is sent again on its own, up to ``retries`` times
+    with doubling delays; batches rejected as invalid are not.  After iteration ``stored``, ``failed``,
+    ``batches`` and ``retries`` count contacts, contacts, batches and extra attempts.
+    """
+
+    def __init__(self, ep, endpoint, list_id, contacts, batch_size, max_bytes, concurrency, retries, backoff):
+        if ep.asynchronous:
+            raise ExpressPigeonException("upsert_stream needs a blocking ExpressPigeon client")
+        self.ep = ep
+        self.endpoint = endpoint
+        self.list_id = list_id
+        self.contacts = contacts
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.max_retries = retries
+        self.backoff = backoff
+        self.stored = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+
+    def body(self, chunks):
+        return b''.join([b'{"list_id": ', encoded(self.list_id, self.ep.codec), b', "contacts": [',
+                         b', '.join(chunks), b']}'])
+
+    def upload(self, numbered):
+        index, (contacts, chunks) = numbered
+        body = self.body(chunks)
+        started = monotonic()
+        attempts = 0
+        while True:
+            attempts += 1
+            response, error, retryable = None, None, True
+            try:
+                response = self.ep.post(self.endpoint, body=body)
+            except Exception as e:
+                error = e
+            else:
+                error = batch_error(response)
+                retryable = getattr(response, "code", None) in RETRY_STATUSES
+            if error is None and self.ep.mirror is not None:
+                self.ep.mirror.upserted(self.list_id, contacts, response)
+            if error is None or not retryable or attempts > self.max_retries:
+                return BatchResult(index, contacts, response, error, attempts, monotonic() - started)
+            time.sleep(self.backoff * (2 ** (attempts - 1)))
+
+    def __iter__(self):
+        numbered = enumerate(batches(self.contacts, self.ep.codec, self.batch_size, self.max_bytes))
+        for result in imap_unordered(self.upload, numbered, self.concurrency):
+            self.batches += 1
+            self.retries += result.attempts - 1
+            if result.error is None:
+                self.stored += len(result.contacts)
+            else:
+                self.failed += len(result.contacts)
+            yield result
@@ -0,0 +1,158 @@
+""" Coalescing of single transactional sends into bulk requests.
+
+A :py:class:`BatchingSender` takes ``send_message`` calls from any number of threads and returns a future for each.
+Messages collect until ``max_delay`` seconds have passed since the first of them, or ``max_batch`` messages or
+``max_bytes`` of JSON are waiting.  The batch is then zipped in memory into the archive format of
+:py:meth:`Messages.send_message_bulk` and sent in one request.  The bulk endpoint answers with one JSON line per
+message in input order, so each future resolves to the response its own message would have had from
+:py:meth:`Messages.send_message`.
+"""
+import io
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from expresspigeon.batches import encoded
+from expresspigeon.bulk import MESSAGE_SEPARATOR, BulkArchive
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.pool import monotonic
+
+
+def bulk_archive(lines, compression=zipfile.ZIP_DEFLATED):
+    """ Zip archive in the bulk format of encoded message lines, as bytes. """
+    return b"".join(BulkArchive(lines, compression=compression))
+
+
+def bulk_results(response, count, codec):
+    """ Splits the text answer of the bulk endpoint into one record per message.
+
+    :raises: :py:class:`ExpressPigeonException`: if the API answered with an error or with the wrong number of lines
+    """
+    if not hasattr(response, "splitlines"):
+        raise ExpressPigeonException(getattr(response, "message", response))
+    lines = [line for line in response.splitlines() if line.strip()]
+    if len(lines) != count:
+        raise ExpressPigeonException("bulk answer has {0} results for {1} messages".format(len(lines), count))
+    return [codec.loads_records(line.encode("utf-8")) for line in lines]
+
+
+class BatchingSender(object):
+    """ Sends messages through the bulk endpoint in batches, see the module documentation.
+
+    :param messages: the Messages endpoint of a blocking client
+    :param max_batch: most messages in one bulk request
+    :param max_delay: longest time in seconds a message waits for others to join its batch
+    :param max_bytes: most JSON bytes in one bulk request, before compression
+    :param concurrency: bulk requests in flight at once
+    :param compression: zipfile compression of the archive
+    :raises: :py:class:`ExpressPigeonException`: if ``messages`` belongs to an asyncio client
+    """
+
+    def __init__(self, messages, max_batch=500, max_delay=0.05, max_bytes=4 * 1024 * 1024, concurrency=2,
+                 compression=zipfile.ZIP_DEFLATED):
+        if messages.ep.asynchronous:
+            raise ExpressPigeonException("BatchingSender needs a blocking ExpressPigeon client")
+        self.messages = messages
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.batches = 0
+        self.sent = 0
+        self._pending = []
+        self._size = 0
+        self._started = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._in_flight = set()
+        self._thread = threading.Thread(target=self._run, name="expresspigeon-batching-sender")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send_message(self, template_id, to, reply_to, from_name, subject, merge_fields=None, view_online=False,
+                     click_tracking=True):
+        """ Queues a message for the next batch; see :py:meth:`Messages.send_message` for the parameters.  Cancelling
+        the future before its batch is sent leaves the message out.
+
+        :returns: Future of the message's own result, e.g. ``future.result().id``
+        :rtype: concurrent.futures.Future
+        """
+        line = encoded({'template_id': template_id, 'to': to, 'reply_to': reply_to, 'from': from_name,
+                        'subject': subject, 'merge_fields': merge_fields, 'view_online': view_online,
+                        'click_tracking': click_tracking}, self.messages.ep.codec)
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise ExpressPigeonException("BatchingSender is closed")
+            if self._pending and self._size + len(line) > self.max_bytes:
+                self._submit()
+            if not self._pending:
+                self._started = monotonic()
+            self._pending.append((line, future))
+            self._size += len(line) + len(MESSAGE_SEPARATOR)
+            if len(self._pending) >= self.max_batch:
+                self._submit()
+            self._condition.notify()
+        return future
+
+    def _submit(self):
+        """ Hands the pending messages to the executor; called with the condition held. """
+        batch, self._pending, self._size = self._pending, [], 0
+        sending = self._executor.submit(self._send, batch)
+        self._in_flight.add(sending)
+        sending.add_done_callback(self._in_flight.discard)
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                due = self._started + self.max_delay - monotonic()
+                if due > 0:
+                    self._condition.wait(due)
+                elif self._pending:
+                    self._submit()
+
+    def _send(self, batch):
+        batch = [(line, future) for line, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            archive = bulk_archive([line for line, _ in batch], self.compression)
+            response = self.messages.send_message_bulk(io.BytesIO(archive))
+            results = bulk_results(response, len(batch), self.messages.ep.codec)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        with self._condition:
+            self.batches += 1
+            self.sent += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def flush(self):
+        """ Sends the waiting messages now and waits for every batch in flight. """
+        with self._condition:
+            if self._pending:
+                self._submit()
+            in_flight = list(self._in_flight)
+        for sending in in_flight:
+            sending.result()
+
+    def close(self):
+        """ Sends what is waiting and stops; later sends raise ExpressPigeonException. """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
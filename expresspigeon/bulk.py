@@ -0,0 +1,87 @@
+""" Streaming construction of bulk message archives.
+
+:py:meth:`Messages.send_message_bulk` uploads a zip archive with one ``bulk.txt`` entry holding a JSON document per
+message, separated by CRLF.  A :py:class:`BulkArchive` produces that archive from any iterable of messages as a
+stream of bytes chunks: each message is encoded and compressed as it is pulled from the iterable and the archive is
+handed out as soon as a chunk of it is ready, so neither the messages nor the archive are ever held whole.  The zip
+entry is written with a trailing data descriptor and in zip64 form, since its sizes are only known at the end.
+"""
+import zipfile
+
+from expresspigeon.batches import encoded
+from expresspigeon.codec import get_codec
+
+CHUNK_SIZE = 64 * 1024
+
+MESSAGE_SEPARATOR = b"\r\n"
+
+
+class _Sink(object):
+    """ Write-only, unseekable file collecting what zipfile writes until it is drained. """
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+
+class BulkArchive(object):
+    """ Iterable over the bytes of a bulk archive built from ``messages``.
+
+    :param messages: iterable of message dicts with the fields of :py:meth:`Messages.send_message` ("template_id",
+    "to", "reply_to", "from", "subject", "merge_fields", ...), or of their JSON encodings as bytes
+    :param codec: JSON codec encoding the dicts, the standard library one by default
+    :param compression: zipfile.ZIP_DEFLATED, or zipfile.ZIP_STORED to skip compression
+    :param compresslevel: deflate level from 1 (fastest) to 9 (smallest), None for zlib's default
+    :param chunk_size: size of the chunks handed out; bounds the memory the archive holds
+
+    The messages are consumed during iteration, so a generator source can be iterated once only.
+    """
+
+    def __init__(self, messages, codec=None, compression=zipfile.ZIP_DEFLATED, compresslevel=None,
+                 chunk_size=CHUNK_SIZE, name="bulk.txt"):
+        self.messages = messages
+        self.codec = get_codec(codec)
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.chunk_size = chunk_size
+        self.name = name
+        self.count = 0
+
+    def _zipfile(self, sink):
+        if self.compresslevel is None:
+            return zipfile.ZipFile(sink, "w", self.compression)
+        return zipfile.ZipFile(sink, "w", self.compression, compresslevel=self.compresslevel)
+
+    def __iter__(self):
+        sink = _Sink()
+        with self._zipfile(sink) as archive:
+            with archive.open(self.name, "w", force_zip64=True) as entry:
+                for message in self.messages:
+                    if self.count:
+                        entry.write(MESSAGE_SEPARATOR)
+                    entry.write(message if isinstance(message, bytes) else encoded(message, self.codec))
+                    self.count += 1
+                    if sink.size >= self.chunk_size:
+                        yield sink.drain()
+        data = sink.drain()
+        if data:
+            yield data
@@ -0,0 +1,146 @@
+""" Client-side cache for read-mostly endpoints.
+
+Lists, dictionaries, auto responders and flows change a few times a day but are read to resolve ids on almost every
+call.  A :py:class:`ResponseCache` keeps successful GET responses of those endpoints for a per-endpoint TTL in a
+bounded LRU, and drops them as soon as the owning client writes to the same resource.
+"""
+import threading
+from collections import OrderedDict
+
+from expresspigeon.pool import monotonic
+
+# TTL in seconds per endpoint template; endpoints without an entry are never cached.
+DEFAULT_TTLS = {
+    "lists": 300.0,
+    "dictionaries": 300.0,
+    "dictionaries/{id}": 300.0,
+    "auto_responders": 300.0,
+    "flows": 300.0,
+}
+
+# Writes to the key family can change what reads of the value families return, e.g. upserting contacts changes the
+# contact counts of lists.
+DEPENDENTS = {
+    "contacts": ("lists",),
+}
+
+MISSING = object()
+
+# Fixed path segments of the API's routes after the resource; every other segment there is an id.
+ROUTE_SEGMENTS = frozenset([
+    "all_subscribers", "bounced", "bulk", "clicked", "copy", "csv", "delete", "delivered", "form", "list", "move",
+    "non_opens", "opened", "report", "schedule", "spam", "start", "stop", "triggers", "unsubscribed", "upload",
+    "upload_status",
+])
+
+
+def endpoint_template(endpoint):
+    """ Route of an endpoint: the path without the query string and with every id segment, numeric or not, replaced
+    by ``{id}``, e.g. ``dictionaries/42`` -> ``dictionaries/{id}``, ``lists/upload_status/u1`` ->
+    ``lists/upload_status/{id}``.
+    """
+    segments = endpoint.split("?", 1)[0].strip("/").split("/")
+    return "/".join([segments[0]] + ["{id}" if segment not in ROUTE_SEGMENTS else segment
+                                     for segment in segments[1:]])
+
+
+def endpoint_family(endpoint):
+    """ The resource an endpoint belongs to: its first path segment. """
+    return endpoint.split("?", 1)[0].strip("/").split("/", 1)[0]
+
+
+class ResponseCache(object):
+    """ Thread-safe TTL cache with LRU eviction for GET responses, keyed by endpoint.
+
+    :param ttls: TTL in seconds per endpoint template, layered over :py:data:`DEFAULT_TTLS`; a TTL of None or 0
+    disables caching of that endpoint
+    :param maxsize: maximum number of responses kept; the least recently used one is evicted first
+    """
+
+    def __init__(self, ttls=None, maxsize=256):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def ttl(self, endpoint):
+        return self.ttls.get(endpoint_template(endpoint))
+
+    def generation(self, endpoint):
+        """ Invalidation counter of the endpoint's family; pass it to :func:`put` so that a response fetched before
+        a concurrent write is not stored after the write invalidated the family.
+        """
+        with self._lock:
+            return self._generation(endpoint_family(endpoint))
+
+    def _generation(self, family):
+        return self._epoch, self._generations.get(family, 0)
+
+    def get(self, endpoint):
+        """ :returns: the cached response, or :py:data:`MISSING` if there is none or it expired """
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None:
+                expires, value = entry
+                if expires > monotonic():
+                    self._entries[endpoint] = self._entries.pop(endpoint)
+                    self.hits += 1
+                    return list(value) if isinstance(value, list) else value
+                del self._entries[endpoint]
+            self.misses += 1
+            return MISSING
+
+    def put(self, endpoint, value, generation=None):
+        ttl = self.ttl(endpoint)
+        if not ttl:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation(endpoint_family(endpoint)):
+                return
+            self._entries.pop(endpoint, None)
+            self._entries[endpoint] = (monotonic() + ttl, list(value) if isinstance(value, list) else value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, family=None):
+        """ Drops every cached response of ``family`` (e.g. "lists"), or everything when no family is given. """
+        with self._lock:
+            if family is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                for endpoint in [e for e in self._entries if endpoint_family(e) == family]:
+                    del self._entries[endpoint]
+                self._generations[family] = self._generations.get(family, 0) + 1
+            self.invalidations += 1
+
+    def mutated(self, endpoint):
+        """ Invalidates what a write to ``endpoint`` may have changed. """
+        family = endpoint_family(endpoint)
+        self.invalidate(family)
+        for dependent in DEPENDENTS.get(family, ()):
+            self.invalidate(dependent)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
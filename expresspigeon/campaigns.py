@@ -1,3 +1,7 @@
+from expresspigeon.paging import paginate
+from expresspigeon.reports import full_report
+
+
 class Campaigns(object):
     """Campaigns endpoint
     """
@@ -45,7 +49,31 @@ class Campaigns(object):
             query += "?" + "&".join(params)
         return self.ep.get(query)
 
-    def send(self, list_id, template_id, name, from_name, reply_to, subject, google_analytics):
+    def iter_all(self, start_date=None, end_date=None, from_id=None, prefetch=True):
+        """ Iterates over all campaigns in date range, requesting further pages from :func:`get_all` as needed.
+
+        :param from_id: smallest campaign id
+        :type from_id: str
+
+        :param start_date: Start of the reporting period (UTC, for example 2013-03-16T11:22:23.210+0000)
+        :type start_date: str
+
+        :param end_date: End of the reporting period (UTC, for example 2013-03-16T11:22:23.210+0000)
+        :type end_date: str
+
+        :param prefetch: Fetch the next page in the background while the current one is consumed
+        :type prefetch: bool
+
+        :returns: generator of campaign EpResponse objects, see :func:`get_all`
+        :rtype: generator
+
+        :raises: :py:class:`ExpressPigeonException`: if the API returns an error instead of a page
+        """
+
+        return paginate(lambda page_from_id: self.get_all(start_date, end_date, page_from_id), from_id,
+                        prefetch=prefetch)
+
+    def send(self, list_id, template_id, name, from_name, reply_to, subject, google_analytics, idempotency_key=None):
         """ Creates a campaign. Invocation of this API will trigger sending a new campaign.
         The content type of a request must be application/json.
 
@@ -75,12 +103,17 @@ class Campaigns(object):
         Should be true or false.
         :type google_analytics: bool
 
+        :param idempotency_key: Key the API uses to drop repeated sends of this campaign. Generated per call when the
+        client retries failed calls.
+        :type idempotency_key: str
+
         :returns: EpResponse with campaign_id field
         :rtype: EpResponse
         """
         return self.ep.post(self.endpoint, params={'list_id': list_id, 'template_id': template_id, 'name': name,
                                                    'from_name': from_name, 'reply_to': reply_to, 'subject': subject,
-                                                   'google_analytics': google_analytics})
+                                                   'google_analytics': google_analytics},
+                            idempotent=True, idempotency_key=idempotency_key)
 
     def schedule(self, list_id, template_id, name, from_name, reply_to, subject, google_analytics, schedule_for):
         """ Schedules a campaign. The content type of a request must be application/json.
@@ -124,7 +157,8 @@ class Campaigns(object):
 
         return self.ep.post(self.endpoint, params={'list_id': list_id, 'template_id': template_id, 'name': name,
                                                    'from_name': from_name, 'reply_to': reply_to, 'subject': subject,
-                                                   'google_analytics': google_analytics, 'schedule_for': schedule_for})
+                                                   'google_analytics': google_analytics, 'schedule_for': schedule_for},
+                            idempotent=True)
 
     def report(self, campaign_id):
         """ Returns report for specific campaign
@@ -285,3 +319,23 @@ class Campaigns(object):
         """
 
         return self.ep.get("{0}/{1}/non_opens".format(self.endpoint, campaign_id))
+
+    def full_report(self, campaign_ids, concurrency=8):
+        """ Fetches :func:`report` and every event report (:func:`all_subscribers`, :func:`delivered`,
+        :func:`opened`, :func:`clicked`, :func:`bounced`, :func:`unsubscribed`, :func:`spam`, :func:`non_opens`) of
+        many campaigns concurrently and joins the rows of each campaign by email.
+
+        :param campaign_ids: ids of the campaigns to report on
+        :type campaign_ids: list
+
+        :param concurrency: Maximum number of report calls in flight
+        :type concurrency: int
+
+        :returns: {campaign_id: CampaignReport}, where each report has the ``summary``, the interned ``emails`` and
+        per event an EventColumn of row numbers into ``emails`` with timestamps in an array of epoch seconds, e.g.
+        ``reports[1].emails_for("opened")`` or ``reports[1].get("bob@example.net")["clicked"]``
+        :rtype: dict
+
+        :raises: :py:class:`ExpressPigeonException`: if the API answers any of the calls with an error
+        """
+        return full_report(self, campaign_ids, concurrency)
@@ -0,0 +1,99 @@
+""" JSON codecs.
+
+The client encodes request parameters and decodes responses through a codec.  The standard library codec is always
+available and is the default: its C object_hook builds EpResponse records faster than a faster parser followed by a
+conversion pass (see ``benchmarks/decode_bench.py``).  Lazy responses only need plain parsing, so for those
+:func:`get_codec` picks the fastest backend found at import time.
+"""
+import json
+
+from expresspigeon.records import object_hook, record_type
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def to_records(value):
+    """ Converts plain decoded JSON into EpResponse records, the way :func:`object_hook` does during parsing. """
+    kind = type(value)
+    if kind is dict:
+        cls = record_type(tuple(value))
+        if cls is None:
+            return dict((k, to_records(v)) for k, v in value.items())
+        return cls._make([to_records(v) if type(v) in (dict, list) else v for v in value.values()])
+    if kind is list:
+        return [to_records(v) if type(v) in (dict, list) else v for v in value]
+    return value
+
+
+class JsonCodec(object):
+    """ Codec backed by the standard library json module. """
+
+    name = "json"
+
+    def dumps(self, obj):
+        """ :returns: str or UTF-8 encoded bytes """
+        return json.dumps(obj)
+
+    def loads(self, data):
+        """ Parses UTF-8 encoded JSON into plain dicts and lists. """
+        return json.loads(data.decode("utf-8"))
+
+    def loads_records(self, data):
+        """ Parses UTF-8 encoded JSON into EpResponse records. """
+        return json.loads(data.decode("utf-8"), object_hook=object_hook)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def loads_records(self, data):
+        return to_records(orjson.loads(data))
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def loads_records(self, data):
+        return to_records(ujson.loads(data))
+
+
+CODECS = dict((codec.name, codec) for codec in (JsonCodec, OrjsonCodec, UjsonCodec))
+
+AVAILABLE = [name for name, module in (("orjson", orjson), ("ujson", ujson)) if module is not None] + ["json"]
+
+
+def get_codec(codec=None, lazy=False):
+    """ Resolves a codec given by name or instance. None selects the default: the stdlib codec, or the fastest
+    installed backend for lazy decoding.
+
+    :raises: ValueError: if the named backend is unknown or not installed
+    """
+    if codec is None:
+        codec = AVAILABLE[0] if lazy else "json"
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec not in CODECS:
+        raise ValueError("unknown JSON codec: {0}".format(codec))
+    if codec not in AVAILABLE:
+        raise ValueError("JSON codec {0} is not installed".format(codec))
+    return CODECS[codec]()
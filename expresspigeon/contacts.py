@@ -1,3 +1,6 @@
+from expresspigeon.batches import UpsertRun
+
+
 class Contacts(object):
     """Contacts endpoint
     """
@@ -21,7 +24,46 @@ class Contacts(object):
         :returns: EpResponse with JSON representation of a contact
         :rtype: EpResponse
         """
-        return self.ep.post(self.endpoint, params={"list_id": list_id, "contacts": contacts})
+        response = self.ep.post(self.endpoint, params={"list_id": list_id, "contacts": contacts})
+        if self.ep.mirror is not None:
+            self.ep.mirror.upserted(list_id, contacts, response)
+        return response
+
+    def upsert_stream(self, list_id, contacts, batch_size=1000, max_bytes=1024 * 1024, concurrency=4, retries=2,
+                      backoff=0.5):
+        """ Creates or updates any number of contacts in batches uploaded concurrently.
+
+        Contacts are consumed lazily and encoded once each, so a generator over millions of rows only ever holds
+        the batches in flight.
+
+        :param list_id: Contact list ID the contacts will be added to
+        :type list_id: long
+
+        :param contacts: Iterable of dictionaries describing contacts. The "email" field is required.
+        :type contacts: iterable
+
+        :param batch_size: Maximum number of contacts per request.
+        :type batch_size: int
+
+        :param max_bytes: Maximum encoded size of the contacts in one request.
+        :type max_bytes: int
+
+        :param concurrency: Number of batches uploaded at once.
+        :type concurrency: int
+
+        :param retries: Times a batch that failed for a transient reason is sent again on its own.
+        :type retries: int
+
+        :param backoff: Seconds to wait before the first retry of a batch; doubles with every further retry.
+        :type backoff: float
+
+        :returns: iterable of BatchResult(index, contacts, response, error, attempts, latency) in completion order
+        :rtype: UpsertRun
+
+        :raises: :py:class:`ExpressPigeonException`: on the asyncio client
+        """
+        return UpsertRun(self.ep, self.endpoint, list_id, contacts, batch_size, max_bytes, concurrency, retries,
+                         backoff)
 
     def find_by_email(self, email):
         """ Returns a single contact by email address.
@@ -66,7 +108,10 @@ class Contacts(object):
 
         query = "{0}?email={1}".format(self.endpoint, email) if list_id is None \
             else "{0}?email={1}&list_id={2}".format(self.endpoint, email, list_id)
-        return self.ep.delete(query)
+        response = self.ep.delete(query)
+        if self.ep.mirror is not None:
+            self.ep.mirror.deleted(email, list_id, response)
+        return response
     
     def move(self, source, target, contacts):
         """ JSON document represents a list of contacts to be moved between source and target lists. All fields are required.
@@ -83,4 +128,7 @@ class Contacts(object):
         :returns: EpResponse with JSON representation of a contact
         :rtype: EpResponse
         """
-        return self.ep.post("{0}/move".format(self.endpoint), params={"source_list": source, "target_list": target, "contacts": contacts})
+        response = self.ep.post("{0}/move".format(self.endpoint), params={"source_list": source, "target_list": target, "contacts": contacts})
+        if self.ep.mirror is not None:
+            self.ep.mirror.moved(source, target, contacts, response)
+        return response
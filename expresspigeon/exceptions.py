@@ -0,0 +1,6 @@
+class InvalidAuthKey(Exception):
+    pass
+
+
+class ExpressPigeonException(Exception):
+    pass
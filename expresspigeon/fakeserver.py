@@ -0,0 +1,633 @@
+""" In-process fake of the ExpressPigeon API for tests and benchmarks.
+
+:py:class:`FakeApi` keeps lists, contacts, messages, campaigns, flows, auto responders, dictionaries and templates in
+memory and answers the routes this client uses, with optional latency and error injection.  It is a plain callable,
+``api(method, path, headers, body) -> (status, headers, body)``, so it can be served over HTTP by
+:py:class:`FakeServer` or called directly::
+
+    with FakeServer(FakeApi(latency=0.002)) as server:
+        client = ExpressPigeon("any key")
+        client.ROOT = server.url
+        client.lists.create("Customers", "Shop", "shop@example.net")
+
+Responses follow the shapes documented on the endpoint classes; the fake does not validate template contents or
+deliver anything.  ``python -m expresspigeon.fakeserver`` serves one in a process of its own and prints its URL.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from urlparse import parse_qs, urlsplit
+
+PAGE_SIZE = 1000
+
+JSON = "application/json"
+
+REPORT_EVENTS = ("opened", "clicked", "bounced", "unsubscribed", "spam", "all_subscribers", "delivered", "non_opens")
+
+EPOCH = datetime(2013, 9, 20, 11, 29, 57)
+
+
+def timestamp(seconds=0):
+    return (EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+
+def parse_multipart(body, content_type):
+    """ Splits a multipart/form-data body into {name: bytes}; repeated names keep the last part. """
+    match = re.search(r'boundary="?([^";]+)"?', content_type or "")
+    if not match:
+        return {}
+    parts = {}
+    delimiter = b"--" + match.group(1).encode("latin-1")
+    for chunk in body.split(delimiter)[1:]:
+        if chunk.startswith(b"--"):
+            break
+        head, _, data = chunk[2:].partition(b"\r\n\r\n")
+        name = re.search(br'name="([^"]*)"', head)
+        if name:
+            parts[name.group(1).decode("utf-8")] = data[:-2] if data.endswith(b"\r\n") else data
+    return parts
+
+
+class FakeApi(object):
+    """ The fake API itself.
+
+    :param latency: seconds added to every response
+    :param jitter: up to this many extra seconds, drawn uniformly per response
+    :param error_rate: fraction of calls answered with ``error_status`` instead of being handled
+    :param error_status: status of injected errors; 429 and 503 carry ``Retry-After: 0``
+    :param seed: seed for the jitter and error draws
+    :param auth_key: accepted X-auth-key, None to accept any non-empty key
+    :param upload_polls: status checks an upload stays in progress for before its report is ready
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None, auth_key=None,
+                 upload_polls=0):
+        self.upload_polls = upload_polls
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.auth_key = auth_key
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = {}
+        self.lists = {}
+        self.contacts = {}
+        self.messages = {}
+        self.campaigns = {}
+        self.scheduled = set()
+        self.uploads = {}
+        self.templates = {}
+        self.dictionaries = {}
+        self.flows = {}
+        self.auto_responders = {}
+        self.routes = [(method, re.compile("^" + pattern + "$"), handler) for method, pattern, handler in [
+            ("GET", r"lists", self.get_lists),
+            ("POST", r"lists", self.create_list),
+            ("PUT", r"lists", self.update_list),
+            ("DELETE", r"lists/(\d+)", self.delete_list),
+            ("POST", r"lists/(\d+)/upload", self.upload_list),
+            ("GET", r"lists/upload_status/(\w+)", self.upload_status),
+            ("GET", r"lists/(\d+)/csv", self.list_csv),
+            ("POST", r"contacts", self.upsert_contacts),
+            ("GET", r"contacts", self.find_contact),
+            ("DELETE", r"contacts", self.delete_contact),
+            ("POST", r"contacts/move", self.move_contacts),
+            ("POST", r"messages", self.send_message),
+            ("POST", r"messages/bulk", self.send_bulk),
+            ("GET", r"messages", self.message_reports),
+            ("GET", r"messages/(\d+)", self.message_report),
+            ("GET", r"campaigns", self.get_campaigns),
+            ("POST", r"campaigns", self.send_campaign),
+            ("GET", r"campaigns/(\d+)", self.campaign_report),
+            ("DELETE", r"campaigns/(\d+)", self.delete_campaign),
+            ("GET", r"campaigns/(\d+)/(\w+)", self.campaign_events),
+            ("POST", r"templates/(\d+)/copy", self.copy_template),
+            ("DELETE", r"templates/(\d+)", self.delete_template),
+            ("GET", r"dictionaries", self.get_dictionaries),
+            ("POST", r"dictionaries", self.create_dictionaries),
+            ("GET", r"dictionaries/(\d+)", self.get_dictionary),
+            ("GET", r"flows", self.get_flows),
+            ("POST", r"flows/(\d+)/(start|stop|report|delete)", self.flow_action),
+            ("POST", r"flows/(\d+)/triggers/(schedule|list|form)", self.flow_trigger),
+            ("GET", r"auto_responders", self.get_auto_responders),
+            ("POST", r"auto_responders/(\d+)/(start|stop)", self.auto_responder_action),
+            ("GET", r"auto_responders/(\d+)", self.auto_responder_report),
+            ("GET", r"auto_responders/(\d+)/(\d+)/(bounced|unsubscribed|spam)", self.auto_responder_events),
+        ]]
+
+    def next_id(self, kind):
+        with self._lock:
+            self._ids[kind] = self._ids.get(kind, 0) + 1
+            return self._ids[kind]
+
+    def __call__(self, method, path, headers, body):
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        key = header(headers, "X-auth-key")
+        if not key or (self.auth_key is not None and key != self.auth_key):
+            return error(401, "invalid auth key")
+        if fail:
+            status, response_headers, data = error(self.error_status, "injected failure")
+            if self.error_status in (429, 503):
+                response_headers["Retry-After"] = "0"
+            return status, response_headers, data
+        parts = urlsplit(path)
+        route = parts.path.strip("/")
+        query = dict((k, v[-1]) for k, v in parse_qs(parts.query).items())
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(route) if route_method == method else None
+            if match:
+                with self._lock:
+                    return handler(query, headers, body, *match.groups())
+        return error(404, "no route for {0} {1}".format(method, route))
+
+    # -- lists and contacts
+
+    def get_lists(self, query, headers, body):
+        return ok(sorted(self.lists.values(), key=lambda l: l["id"]))
+
+    def create_list(self, query, headers, body):
+        params = loads(body)
+        list_id = self.next_id("list")
+        contact_list = {"id": list_id, "name": params.get("name"), "from_name": params.get("from_name"),
+                        "reply_to": params.get("reply_to"), "contact_count": 0}
+        self.lists[list_id] = contact_list
+        return success("list={0} created/updated successfully".format(list_id), list=contact_list)
+
+    def update_list(self, query, headers, body):
+        params = loads(body)
+        contact_list = self.lists.get(params.get("id"))
+        if contact_list is None:
+            return error(404, "list={0} not found".format(params.get("id")))
+        contact_list.update((k, v) for k, v in params.items() if k in ("name", "from_name", "reply_to"))
+        return success("list={0} created/updated successfully".format(contact_list["id"]), list=contact_list)
+
+    def delete_list(self, query, headers, body, list_id):
+        if self.lists.pop(int(list_id), None) is None:
+            return error(404, "list={0} not found".format(list_id))
+        for contact in self.contacts.values():
+            contact["lists"].discard(int(list_id))
+        return success("list={0} deleted successfully".format(list_id))
+
+    def subscribe(self, list_id, contact):
+        email = contact.get("email")
+        if not email:
+            return None
+        stored = self.contacts.setdefault(email, {"email": email, "lists": set(), "created_at": timestamp(),
+                                                  "status": "ENGAGED", "email_format": "html"})
+        stored.update((k, v) for k, v in contact.items() if k != "lists")
+        if list_id is not None and list_id not in stored["lists"]:
+            stored["lists"].add(list_id)
+            self.lists[list_id]["contact_count"] += 1
+        return email
+
+    def upsert_contacts(self, query, headers, body):
+        params = loads(body)
+        list_id = params.get("list_id")
+        if list_id is not None and list_id not in self.lists:
+            return error(404, "list={0} not found".format(list_id))
+        emails = [self.subscribe(list_id, contact) for contact in params.get("contacts") or []]
+        if None in emails:
+            return error(400, "email is required")
+        return success("contacts created/updated successfully", contacts=emails)
+
+    def upload_list(self, query, headers, body, list_id):
+        list_id = int(list_id)
+        if list_id not in self.lists:
+            return error(404, "list={0} not found".format(list_id))
+        data = parse_multipart(body, header(headers, "Content-Type")).get("contacts_file", b"")
+        imported = 0
+        for row in csv.reader(io.StringIO(data.decode("utf-8"))):
+            if row and "@" in row[0]:
+                fields = {"email": row[0].strip()}
+                if len(row) > 1:
+                    fields["first_name"] = row[1]
+                if len(row) > 2:
+                    fields["last_name"] = row[2]
+                self.subscribe(list_id, fields)
+                imported += 1
+        upload_id = "u{0}".format(self.next_id("upload"))
+        self.uploads[upload_id] = {"suppressed": 0, "skipped": 0, "list_name": self.lists[list_id]["name"],
+                                   "merged": 0, "imported": imported, "completed": True, "failed": False,
+                                   "pending": self.upload_polls}
+        return ok({"code": 200, "status": "success", "upload_id": upload_id})
+
+    def upload_status(self, query, headers, body, upload_id):
+        report = self.uploads.get(upload_id)
+        if report is None:
+            return error(404, "upload={0} not found".format(upload_id))
+        if report["pending"]:
+            report["pending"] -= 1
+            return success("file upload in progress", report={"completed": False, "failed": False})
+        return success("file upload completed", report=dict((k, v) for k, v in report.items() if k != "pending"))
+
+    def list_csv(self, query, headers, body, list_id):
+        list_id = int(list_id)
+        if list_id not in self.lists:
+            return error(404, "list={0} not found".format(list_id))
+        out = io.StringIO()
+        out.write('"Email", "First name", "Last name"\n')
+        writer = csv.writer(out, lineterminator="\n")
+        for contact in self.contacts.values():
+            if list_id in contact["lists"]:
+                writer.writerow([contact["email"], contact.get("first_name", ""), contact.get("last_name", "")])
+        return 200, {"Content-Type": "text/csv"}, out.getvalue().encode("utf-8")
+
+    def public_contact(self, contact):
+        public = dict((k, v) for k, v in contact.items() if k != "lists")
+        public["lists"] = [{"id": list_id} for list_id in sorted(contact["lists"])]
+        return public
+
+    def find_contact(self, query, headers, body):
+        contact = self.contacts.get(query.get("email"))
+        if contact is None:
+            return error(404, "contact={0} not found".format(query.get("email")))
+        return ok(self.public_contact(contact))
+
+    def delete_contact(self, query, headers, body):
+        email = query.get("email")
+        contact = self.contacts.get(email)
+        if contact is None:
+            return error(404, "contact={0} not found".format(email))
+        if query.get("list_id"):
+            list_id = int(query["list_id"])
+            if list_id in contact["lists"]:
+                contact["lists"].discard(list_id)
+                self.lists[list_id]["contact_count"] -= 1
+        else:
+            for list_id in contact["lists"]:
+                if list_id in self.lists:
+                    self.lists[list_id]["contact_count"] -= 1
+            del self.contacts[email]
+        return success("contact={0} deleted successfully".format(email))
+
+    def move_contacts(self, query, headers, body):
+        params = loads(body)
+        source, target = params.get("source_list"), params.get("target_list")
+        if source not in self.lists or target not in self.lists:
+            return error(404, "list not found")
+        moved = []
+        for email in params.get("contacts") or []:
+            contact = self.contacts.get(email)
+            if contact is not None and source in contact["lists"]:
+                contact["lists"].discard(source)
+                self.lists[source]["contact_count"] -= 1
+                self.subscribe(target, {"email": email})
+                moved.append(email)
+        return success("contacts moved successfully", contacts=moved)
+
+    # -- messages
+
+    def queue_message(self, params):
+        if not params.get("to") or params.get("template_id") is None:
+            return {"code": 400, "status": "error", "message": "template_id and to are required"}
+        message_id = self.next_id("message")
+        clicked = message_id % 7 == 0
+        self.messages[message_id] = {"id": message_id, "email": params["to"], "in_transit": False,
+                                     "delivered": True, "bounced": False, "opened": message_id % 3 == 0,
+                                     "clicked": clicked, "spam": False,
+                                     "urls": ["http://example.net/{0}".format(message_id % 5)] if clicked else [],
+                                     "created_at": timestamp(message_id), "updated_at": timestamp(message_id + 60)}
+        return {"code": 200, "status": "success", "message": "email queued", "id": message_id}
+
+    def send_message(self, query, headers, body):
+        if "multipart/form-data" in (header(headers, "Content-Type") or ""):
+            params = dict((k, v.decode("utf-8")) for k, v in
+                          parse_multipart(body, header(headers, "Content-Type")).items() if k != "file")
+        else:
+            params = loads(body)
+        result = self.queue_message(params)
+        return result["code"], {"Content-Type": JSON}, json.dumps(result)
+
+    def send_bulk(self, query, headers, body):
+        data = parse_multipart(body, header(headers, "Content-Type")).get("file")
+        if not data:
+            return error(400, "file is required")
+        lines = []
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for name in archive.namelist():
+                for line in archive.read(name).decode("utf-8").splitlines():
+                    if line.strip():
+                        lines.append(json.dumps(self.queue_message(json.loads(line)), separators=(",", ":")))
+        return 200, {"Content-Type": "text/plain"}, "\n".join(lines).encode("utf-8")
+
+    def message_report(self, query, headers, body, message_id):
+        message = self.messages.get(int(message_id))
+        if message is None:
+            return error(404, "message={0} not found".format(message_id))
+        return ok(message)
+
+    def message_reports(self, query, headers, body):
+        return ok(page(self.messages, query))
+
+    def seed_messages(self, count, domain="example.net"):
+        """ Adds ``count`` sent messages, e.g. to page through their reports. """
+        with self._lock:
+            for i in range(count):
+                self.queue_message({"to": "user{0}@{1}".format(i, domain), "template_id": 1})
+
+    # -- campaigns and templates
+
+    def get_campaigns(self, query, headers, body):
+        return ok(page(self.campaigns, query))
+
+    def send_campaign(self, query, headers, body):
+        params = loads(body)
+        if params.get("list_id") not in self.lists:
+            return error(404, "list={0} not found".format(params.get("list_id")))
+        campaign_id = self.next_id("campaign")
+        self.campaigns[campaign_id] = {"id": campaign_id, "total": self.lists[params["list_id"]]["contact_count"],
+                                       "send_time": params.get("schedule_for") or timestamp(campaign_id),
+                                       "template_name": str(params.get("template_id")),
+                                       "reply_to": params.get("reply_to"), "from_name": params.get("from_name"),
+                                       "subject": params.get("subject"), "name": params.get("name"),
+                                       "list_id": params["list_id"]}
+        if "schedule_for" in params:
+            self.scheduled.add(campaign_id)
+        return success("new campaign created successfully", campaign_id=campaign_id)
+
+    def campaign_report(self, query, headers, body, campaign_id):
+        campaign = self.campaigns.get(int(campaign_id))
+        if campaign is None:
+            return error(404, "campaign={0} not found".format(campaign_id))
+        total = campaign["total"]
+        return ok({"delivered": total, "clicked": total // 7, "opened": total // 3, "spam": 0, "in_transit": 0,
+                   "unsubscribed": 0, "bounced": 0})
+
+    def delete_campaign(self, query, headers, body, campaign_id):
+        campaign = self.campaigns.get(int(campaign_id))
+        if campaign is None:
+            return error(404, "campaign={0} not found".format(campaign_id))
+        if int(campaign_id) not in self.scheduled:
+            return error(400, "campaign={0} is already sent".format(campaign_id))
+        del self.campaigns[int(campaign_id)]
+        return success("campaign={0} deleted successfully".format(campaign_id))
+
+    def campaign_events(self, query, headers, body, campaign_id, event):
+        campaign = self.campaigns.get(int(campaign_id))
+        if campaign is None or event not in REPORT_EVENTS:
+            return error(404, "campaign={0} not found".format(campaign_id))
+        subscribers = sorted(email for email, contact in self.contacts.items()
+                             if campaign["list_id"] in contact["lists"])
+        rows = []
+        for i, email in enumerate(subscribers):
+            opened = i % 3 == 0
+            if event == "opened" and not opened or event == "non_opens" and opened:
+                continue
+            if event == "clicked" and i % 7:
+                continue
+            if event in ("bounced", "unsubscribed", "spam") and i % 50 != 49:
+                continue
+            row = {"id": i + 1, "email": email}
+            if event in ("opened", "clicked"):
+                row.update({"timestamp": timestamp(i), "ip_address": "127.0.0.1", "event_type": event,
+                            "user_agent": "Mozilla/5.0"})
+                if event == "clicked":
+                    row["url"] = "http://example.net/{0}".format(i % 5)
+            elif event in ("all_subscribers", "delivered"):
+                row["timestamp"] = timestamp(i)
+            rows.append(row)
+        return ok(rows)
+
+    def copy_template(self, query, headers, body, template_id):
+        new_id = self.next_id("template")
+        self.templates[new_id] = dict(loads(body), source=int(template_id))
+        return success("template copied successfully", template_id=new_id)
+
+    def delete_template(self, query, headers, body, template_id):
+        if self.templates.pop(int(template_id), None) is None:
+            return error(404, "template={0} not found".format(template_id))
+        return success("template={0} deleted successfully".format(template_id))
+
+    # -- dictionaries, flows, auto responders
+
+    def get_dictionaries(self, query, headers, body):
+        return ok([dict((k, v) for k, v in d.items() if k != "values") for d in self.dictionaries.values()])
+
+    def create_dictionaries(self, query, headers, body):
+        ids = []
+        for params in loads(body) or []:
+            dict_id = self.next_id("dictionary")
+            self.dictionaries[dict_id] = {"id": dict_id, "name": params.get("name"),
+                                          "values": params.get("values", []), "created_at": timestamp(),
+                                          "updated_at": timestamp()}
+            ids.append(dict_id)
+        return success("dictionaries created successfully", ids=ids)
+
+    def get_dictionary(self, query, headers, body, dict_id):
+        dictionary = self.dictionaries.get(int(dict_id))
+        if dictionary is None:
+            return error(404, "dictionary={0} not found".format(dict_id))
+        return ok(dictionary)
+
+    def add_flow(self, name, live=True):
+        with self._lock:
+            flow_id = self.next_id("flow")
+            self.flows[flow_id] = {"id": flow_id, "name": name, "live": live, "created_at": timestamp()}
+            return flow_id
+
+    def get_flows(self, query, headers, body):
+        return ok(sorted(self.flows.values(), key=lambda f: f["id"]))
+
+    def flow_action(self, query, headers, body, flow_id, action):
+        flow = self.flows.get(int(flow_id))
+        if flow is None:
+            return error(404, "flow={0} not found".format(flow_id))
+        if action == "report":
+            return ok({"id": flow["id"], "started": 0, "finished": 0})
+        if action == "delete":
+            del self.flows[int(flow_id)]
+        return success("flow={0} {1} successfully".format(flow_id, action))
+
+    def flow_trigger(self, query, headers, body, flow_id, trigger):
+        if int(flow_id) not in self.flows:
+            return error(404, "flow={0} not found".format(flow_id))
+        return success("{0} trigger updated".format(trigger))
+
+    def add_auto_responder(self, name, parts=1):
+        with self._lock:
+            auto_responder_id = self.next_id("auto_responder")
+            self.auto_responders[auto_responder_id] = {
+                "auto_responder_id": auto_responder_id, "name": name,
+                "auto_responder_parts": [{"auto_responder_part_id": self.next_id("auto_responder_part"),
+                                          "subject": name, "template_id": 1} for _ in range(parts)]}
+            return auto_responder_id
+
+    def get_auto_responders(self, query, headers, body):
+        return ok(sorted(self.auto_responders.values(), key=lambda a: a["auto_responder_id"]))
+
+    def auto_responder_action(self, query, headers, body, auto_responder_id, action):
+        if int(auto_responder_id) not in self.auto_responders:
+            return error(404, "auto_responder={0} not found".format(auto_responder_id))
+        return success("auto_responder={0} {1}ed for {2}".format(auto_responder_id, action,
+                                                                  loads(body).get("email")))
+
+    def auto_responder_report(self, query, headers, body, auto_responder_id):
+        auto_responder = self.auto_responders.get(int(auto_responder_id))
+        if auto_responder is None:
+            return error(404, "auto_responder={0} not found".format(auto_responder_id))
+        return ok([{"delivered": 0, "clicked": 0, "opened": 0, "spam": 0, "in_transit": 0, "unsubscribed": 0,
+                    "bounced": 0, "auto_responder_part_id": part["auto_responder_part_id"]}
+                   for part in auto_responder["auto_responder_parts"]])
+
+    def auto_responder_events(self, query, headers, body, auto_responder_id, part_id, event):
+        if int(auto_responder_id) not in self.auto_responders:
+            return error(404, "auto_responder={0} not found".format(auto_responder_id))
+        return ok([])
+
+
+def page(rows, query):
+    """ Rows with ids above ``from_id``, at most :py:data:`PAGE_SIZE` of them, in id order. """
+    from_id = int(query["from_id"]) if query.get("from_id") else 0
+    ids = sorted(i for i in rows if i > from_id)[:PAGE_SIZE]
+    return [rows[i] for i in ids]
+
+
+def header(headers, name):
+    """ Case-insensitive header lookup that works for plain dicts as well as parsed HTTP headers. """
+    value = headers.get(name)
+    if value is None:
+        name = name.lower()
+        for key, candidate in headers.items():
+            if key.lower() == name:
+                return candidate
+    return value
+
+
+def loads(body):
+    return json.loads(body.decode("utf-8")) if body else {}
+
+
+def ok(value):
+    return 200, {"Content-Type": JSON}, json.dumps(value)
+
+
+def success(message, **fields):
+    fields.update({"code": 200, "status": "success", "message": message})
+    return ok(fields)
+
+
+def error(status, message):
+    return status, {"Content-Type": JSON}, json.dumps({"code": status, "status": "error", "message": message})
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    """ Serves a :py:class:`FakeApi` (or any app with the same signature) on a keep-alive localhost port.
+
+    Use it as a context manager; ``url`` is the root to point a client at.
+    """
+    daemon_threads = True
+
+    def __init__(self, app=None, host="127.0.0.1", port=0):
+        HTTPServer.__init__(self, (host, port), FakeRequestHandler)
+        self.app = app if app is not None else FakeApi()
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://{0}:{1}/".format(self.server_address[0], self.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def read_body(self):
+        if "chunked" in (self.headers.get("Transfer-Encoding") or "").lower():
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if not size:
+                    while self.rfile.readline().strip():
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def respond(self):
+        body = self.read_body()
+        status, headers, data = self.server.app(self.command, self.path, self.headers, body)
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = respond
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake ExpressPigeon API on localhost.")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed-messages", type=int, default=0, help="sent messages to report on")
+    args = parser.parse_args()
+
+    api = FakeApi(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                  error_status=args.error_status)
+    api.seed_messages(args.seed_messages)
+    server = FakeServer(api, port=args.port)
+    print(server.url)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
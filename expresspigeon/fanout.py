@@ -0,0 +1,165 @@
+""" Helpers for running many API calls concurrently from a bounded worker pool. """
+import threading
+from array import array
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from expresspigeon.pool import monotonic
+
+
+def imap_unordered(fn, iterable, concurrency):
+    """ Calls ``fn`` on every item of ``iterable`` from ``concurrency`` worker threads and yields the results
+    as they complete.
+
+    The iterable is consumed lazily: no more than ``concurrency`` items are in flight at any time, so a generator
+    of millions of items never gets materialised.  An exception raised by ``fn`` propagates to the consumer.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for item in iterable:
+            pending.add(executor.submit(fn, item))
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+SendResult = namedtuple('SendResult', ['to', 'message_id', 'error', 'response', 'latency'])
+SendResult.__doc__ = """ Outcome of one transactional send.
+
+``message_id`` is set when the message was queued; otherwise ``error`` holds the API error message or the
+exception raised while sending.  ``latency`` is the round trip in seconds.
+"""
+
+
+class SendStats(object):
+    """ Throughput and latency of a fan-out run, updated as results arrive. """
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+        self.latencies = array('d')
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = monotonic()
+
+    def add(self, result):
+        with self._lock:
+            if result.message_id is not None:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.latencies.append(result.latency)
+
+    def finish(self):
+        self.finished = monotonic()
+
+    @property
+    def total(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished if self.finished is not None else monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        """ Completed sends per second. """
+        elapsed = self.elapsed
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+    def percentile(self, p):
+        """ Latency in seconds below which ``p`` percent of the sends completed. """
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "elapsed": self.elapsed,
+            "throughput": self.throughput,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.percentile(100),
+        }
+
+    def __repr__(self):
+        return ("SendStats(sent={sent}, failed={failed}, elapsed={elapsed:.3f}s, throughput={throughput:.1f}/s, "
+                "p50={p50:.4f}s, p99={p99:.4f}s)").format(**self.summary())
+
+
+def recipient_fields(recipient, merge_fields):
+    """ Normalises a recipient given as an email, a (email, merge_fields) pair or a dict with "to" and
+    optional "merge_fields" keys.
+
+    :returns: (to, merge_fields) with the per-recipient fields layered over the shared ones
+    """
+    if isinstance(recipient, dict):
+        to, own = recipient["to"], recipient.get("merge_fields")
+    elif isinstance(recipient, (tuple, list)):
+        to, own = recipient
+    else:
+        to, own = recipient, None
+    if merge_fields and own:
+        fields = dict(merge_fields)
+        fields.update(own)
+        return to, fields
+    return to, own if own is not None else merge_fields
+
+
+def send_result(to, response, latency):
+    message_id = getattr(response, "id", None)
+    if message_id is not None and getattr(response, "status", "success") == "success":
+        return SendResult(to, message_id, None, response, latency)
+    return SendResult(to, None, getattr(response, "message", response), response, latency)
+
+
+class SendManyRun(object):
+    """ Iterable over the :py:class:`SendResult` of every recipient in completion order.
+
+    ``stats`` is live while the run is being consumed and final once iteration ends.
+    """
+
+    def __init__(self, send, recipients, merge_fields, concurrency):
+        self.stats = SendStats()
+        self._send = send
+        self._recipients = recipients
+        self._merge_fields = merge_fields
+        self._concurrency = concurrency
+
+    def _send_one(self, recipient):
+        to, merge_fields = recipient_fields(recipient, self._merge_fields)
+        started = monotonic()
+        try:
+            response = self._send(to, merge_fields)
+        except Exception as e:
+            result = SendResult(to, None, e, None, monotonic() - started)
+        else:
+            result = send_result(to, response, monotonic() - started)
+        self.stats.add(result)
+        return result
+
+    def __iter__(self):
+        self.stats.start()
+        try:
+            for result in imap_unordered(self._send_one, self._recipients, self._concurrency):
+                yield result
+        finally:
+            self.stats.finish()
@@ -1,6 +1,9 @@
+import csv
 import os
-import random
-import string
+
+from expresspigeon.multipart import MultipartBody
+from expresspigeon.streams import CHUNK_SIZE, ProgressMeter, text_stream
+from expresspigeon.uploads import UploadFuture, default_poller
 
 
 class Lists(object):
@@ -82,25 +85,37 @@ class Lists(object):
         :rtype: EpResponse
         """
 
-        with (open(contacts_file)) as f:
-            boundary = ''.join(random.choice(string.digits + string.ascii_letters) for i in range(30))
-            lines = []
-            lines.extend((
-                '--{0}'.format(boundary),
-                'Content-Disposition: form-data; name="contacts_file"; contacts_file="{0}"'
-                .format(os.path.basename(contacts_file)),
-                '',
-                str(f.read())
-            ))
-
-            lines.extend((
-                '--{0}--'.format(boundary),
-                '',
-            ))
-            body = '\r\n'.join(lines)
-
-            return self.ep.post('{0}/{1}/upload'.format(self.endpoint, list_id),
-                                content_type="multipart/form-data; boundary={0}".format(boundary), body=body)
+        body = MultipartBody().add_part(['Content-Disposition: form-data; name="contacts_file"; contacts_file="{0}"'
+                                         .format(os.path.basename(contacts_file))], path=contacts_file).close()
+        return self.ep.post('{0}/{1}/upload'.format(self.endpoint, list_id), content_type=body.content_type,
+                            body=body)
+
+    def upload_async(self, list_id, contacts_file, timeout=None, poller=None):
+        """ Uploads a CSV file like :func:`upload` and returns at once with a future of the final
+        :func:`upload_status`. The file is sent from a worker thread, then a background poller checks the status
+        quickly at first and then at growing intervals.
+
+        :param list_id: Id of list to be updated with contacts from CSV
+        :type list_id: int
+
+        :param contacts_file: Absolute path to the CSV file with contacts
+        :type contacts_file: str
+
+        :param timeout: Seconds to wait for the import before the future fails, None to wait as long as it takes
+        :type timeout: float
+
+        :param poller: UploadPoller to send the file and check the status from, the one shared by the process by
+        default
+        :type poller: UploadPoller
+
+        :returns: UploadFuture with the upload_id once the file is sent; result() is the final upload_status
+        response, e.g.
+        ``api.lists.upload_async(1, "contacts.csv").result().report.imported``
+        :rtype: UploadFuture
+        """
+
+        return (poller or default_poller()).upload(UploadFuture(), lambda: self.upload(list_id, contacts_file),
+                                                   self.upload_status, timeout)
 
     def upload_status(self, upload_id):
         """ Checks status of upload. If the upload was finished a detailed report is returned.
@@ -129,4 +144,54 @@ class Lists(object):
         :rtype: str or EpResponse
         """
 
-        return self.ep.read_stream("{0}/{1}/csv".format(self.endpoint, list_id))
\ No newline at end of file
+        return self.ep.read_stream("{0}/{1}/csv".format(self.endpoint, list_id))
+
+    def iter_csv(self, list_id, progress=None):
+        """ Streams the contacts of a list as parsed CSV rows, without holding the export in memory.
+
+        :param list_id: list id to export
+        :type list_id: str
+
+        :param progress: called with Progress(bytes, elapsed, bytes_per_second, done) as the export downloads
+        :type progress: callable
+
+        :returns: generator of rows, the first one being the header row
+        :rtype: generator of lists of str
+
+        :raises: :py:class:`ExpressPigeonException`: if the API answers with an error
+        """
+
+        meter = ProgressMeter(progress)
+        with self.ep.open_stream("{0}/{1}/csv".format(self.endpoint, list_id)) as response:
+            for row in csv.reader(text_stream(response, meter), skipinitialspace=True):
+                yield row
+        meter.finish()
+
+    def export_csv(self, list_id, path, progress=None):
+        """ Streams the contacts of a list as CSV straight into a file.
+
+        :param list_id: list id to export
+        :type list_id: str
+
+        :param path: file to write the export to
+        :type path: str
+
+        :param progress: called with Progress(bytes, elapsed, bytes_per_second, done) as the export downloads
+        :type progress: callable
+
+        :returns: final Progress of the download
+        :rtype: Progress
+
+        :raises: :py:class:`ExpressPigeonException`: if the API answers with an error
+        """
+
+        meter = ProgressMeter(progress)
+        with self.ep.open_stream("{0}/{1}/csv".format(self.endpoint, list_id)) as response:
+            with open(path, "wb") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    meter.update(len(chunk))
+        return meter.finish()
@@ -1,8 +1,13 @@
-import os
-import random
-import string
 import json
-import io
+import zipfile
+
+from expresspigeon.batching import BatchingSender
+from expresspigeon.bulk import BulkArchive
+from expresspigeon.fanout import SendManyRun
+from expresspigeon.multipart import MultipartBody
+from expresspigeon.paging import paginate
+from expresspigeon.prepared import PreparedMessage
+from expresspigeon.sync import ReportSync
 
 class Messages(object):
     """ Transactional emails are sometimes called triggered emails. Unlike bulk emails,
@@ -24,7 +29,7 @@ class Messages(object):
         self.ep = ep
 
     def send_message(self, template_id, to, reply_to, from_name, subject, merge_fields=None, view_online=False,
-                     click_tracking=True):
+                     click_tracking=True, idempotency_key=None):
         """ Send s single transactional message.
         It is possible to inject HTML chunks into specific placeholders inside your email template.
         NOTE: It is important to use only single quotes in injected HTML
@@ -54,6 +59,10 @@ class Messages(object):
         default is true
         :type click_tracking: bool
 
+        :param idempotency_key: Key the API uses to drop repeated sends of this message, e.g. when a job is rerun.
+        Generated per call when the client retries failed calls.
+        :type idempotency_key: str
+
         :returns: EpResponse with the id represents an ID of a message that was sent.
         You can use this value in order to get a report on status of this message.
         :rtype: EpResponse
@@ -64,43 +73,128 @@ class Messages(object):
                                                    'subject': subject,
                                                    'merge_fields': merge_fields,
                                                    'view_online': view_online,
-                                                   'click_tracking': click_tracking})
+                                                   'click_tracking': click_tracking},
+                            idempotent=True, idempotency_key=idempotency_key)
     
+    def prepare(self, template_id, reply_to, from_name, subject, merge_fields=None, view_online=False,
+                click_tracking=True):
+        """ Returns the message with everything but its recipient fixed and encoded once, for bursts of sends of one
+        template, e.g. ``reset = api.messages.prepare(...)`` then ``reset.send(email, {"token": token})``.
+
+        :param merge_fields: Merge field values shared by all recipients; per-send merge fields override them.
+        :type merge_fields: dict
+
+        See :func:`send_message` for the remaining parameters.
+
+        :returns: PreparedMessage, whose send(to, merge_fields=None, idempotency_key=None) returns what
+        :func:`send_message` does
+        :rtype: PreparedMessage
+        """
+
+        return PreparedMessage(self, template_id, reply_to, from_name, subject, merge_fields, view_online,
+                               click_tracking)
+
+    def send_many(self, template_id, recipients, reply_to, from_name, subject, merge_fields=None,
+                  view_online=False, click_tracking=True, concurrency=8):
+        """ Send the same transactional message to many recipients concurrently, one API call each.
+
+        Sends run on a pool of ``concurrency`` worker threads. Recipients are consumed lazily, so a generator
+        over a huge recipient table is fine.
+
+        :param recipients: Iterable of recipients. Each is an email address, a (email, merge_fields) pair or a dict
+        with "to" and optional "merge_fields" keys; per-recipient merge fields override the shared ones.
+        :type recipients: iterable
+
+        :param merge_fields: Merge field values shared by all recipients.
+        :type merge_fields: dict
+
+        :param concurrency: Number of sends in flight at once.
+        :type concurrency: int
+
+        See :func:`send_message` for the remaining parameters.
+
+        :returns: iterable of SendResult(to, message_id, error, response, latency) in completion order; its
+        ``stats`` attribute reports throughput and latency percentiles for the run.
+        :rtype: SendManyRun
+        """
+
+        def send(to, fields):
+            return self.send_message(template_id, to, reply_to, from_name, subject, merge_fields=fields,
+                                     view_online=view_online, click_tracking=click_tracking)
+
+        return SendManyRun(send, recipients, merge_fields, concurrency)
+
     def send_message_bulk(self, bulk):
         """ Send transactional messages in bulk.
 
         NOTE: ZIP file represents multiple JSON objects, one for each transactional message
         
-        :param bulk: absolute path to zipped bulk file
-        :type bulk: path
+        :param bulk: absolute path to zipped bulk file, a binary file object such as io.BytesIO holding the archive,
+        or a BulkArchive (see :func:`bulk_archive`) that is zipped while it is uploaded
+        :type bulk: path or file or BulkArchive
 
         :returns: EpResponse with the text, where each line is a small JSON document in the same order as the JSON documents in the input file.
         :rtype: EpResponse
         """
 
-        with (open(bulk, "rb")) as f:
-            boundary = ''.join(random.choice(string.digits + string.ascii_letters) for i in range(30))
-            lines = []
-            binary = io.BytesIO()
-            
-            lines.extend((
-                '--{0}'.format(boundary),
-                'Content-Disposition: form-data; name="file"; filename="{0}"'.format(os.path.basename(bulk)),
-                'Content-Type: application/octet-stream',
-                ''
-            ))
-            
-            binary.write('\r\n'.join(lines).encode('UTF-8'))
-            binary.write(b'\r\n')
-            binary.write(f.read())
-            binary.write(b'\r\n')
-            binary.write('--{0}--'.format(boundary).encode('UTF-8'))
-            binary.write(b'\r\n')
-            
-            return self.ep.post("{0}/bulk".format(self.endpoint),
-                                content_type="multipart/form-data; boundary={0}".format(boundary), body=binary.getvalue())
-    
-    
+        if isinstance(bulk, BulkArchive):
+            # a one-shot chunked upload: nothing to replay, so it is not retried
+            body = MultipartBody().add_stream("file", "bulk.zip", bulk).close()
+            return self.ep.post("{0}/bulk".format(self.endpoint), content_type=body.content_type, body=iter(body))
+        if hasattr(bulk, "read"):
+            body = MultipartBody().add_data("file", "bulk.zip", bulk.read()).close()
+        else:
+            body = MultipartBody().add_file("file", bulk).close()
+        return self.ep.post("{0}/bulk".format(self.endpoint), content_type=body.content_type, body=body,
+                            idempotent=True)
+
+    def bulk_archive(self, messages, compression=zipfile.ZIP_DEFLATED, compresslevel=None):
+        """ Builds the archive for :func:`send_message_bulk` from an iterable of messages while it is uploaded,
+        without a temporary file, e.g.
+        ``api.messages.send_message_bulk(api.messages.bulk_archive({"template_id": 1, "to": email, ...}
+        for email in emails))``.
+
+        :param messages: Message dicts with the fields of :func:`send_message`, e.g. {"template_id": 1,
+        "to": "bob@example.net", "reply_to": "shop@example.net", "from": "Shop", "subject": "Hi",
+        "merge_fields": {...}}; consumed as the upload proceeds, so memory use does not depend on their number.
+        :type messages: iterable
+
+        :param compression: zipfile.ZIP_DEFLATED, or zipfile.ZIP_STORED to skip compression
+        :type compression: int
+
+        :param compresslevel: Deflate level from 1 (fastest) to 9 (smallest), None for the default
+        :type compresslevel: int
+
+        :returns: BulkArchive, which can be sent once; its count is the number of messages archived so far
+        :rtype: BulkArchive
+        """
+
+        return BulkArchive(messages, self.ep.codec, compression, compresslevel)
+
+    def batching_sender(self, max_batch=500, max_delay=0.05, max_bytes=4 * 1024 * 1024, concurrency=2):
+        """ Returns a sender whose send_message calls are collected and sent together through
+        :func:`send_message_bulk`, each call getting a future of its own result.
+
+        :param max_batch: Most messages in one bulk request
+        :type max_batch: int
+
+        :param max_delay: Longest time in seconds a message waits for others to join its batch
+        :type max_delay: float
+
+        :param max_bytes: Most bytes of JSON in one bulk request, before compression
+        :type max_bytes: int
+
+        :param concurrency: Bulk requests in flight at once
+        :type concurrency: int
+
+        :returns: BatchingSender; close it, or use it as a context manager, to send what is still waiting
+        :rtype: BatchingSender
+
+        :raises: :py:class:`ExpressPigeonException`: on the asyncio client
+        """
+
+        return BatchingSender(self, max_batch, max_delay, max_bytes, concurrency)
+
     def send_message_attachment(self, template_id, attachments, to, reply_to, from_name, subject, merge_fields=None, view_online=False,
                      click_tracking=True, suppress_address=False):
         """ Send s single transactional message with attachments.
@@ -143,117 +237,21 @@ class Messages(object):
         You can use this value in order to get a report on status of this message.
         :rtype: EpResponse
         """
-        boundary = ''.join(random.choice(string.digits + string.ascii_letters) for i in range(30))
-        binary = io.BytesIO()
+        body = MultipartBody()
         for attachment in attachments:
-            with (open(attachment, "rb")) as f:
-                lines = []
-                lines.extend((
-                    '--{0}'.format(boundary),
-                    'Content-Disposition: form-data; name="file"; filename="{0}"'.format(os.path.basename(attachment)),
-                    'Content-Type: application/octet-stream',
-                    ''
-                ))
-                
-                binary.write('\r\n'.join(lines).encode('UTF-8'))
-                binary.write(b'\r\n')
-                binary.write(f.read())
-                binary.write(b'\r\n')
-                binary.write('--{0}'.format(boundary).encode('UTF-8'))
-                binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="template_id"')
-        binary.write(b'\r\n\r\n')
-        binary.write(str(template_id).encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-    
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="reply_to"')
-        binary.write(b'\r\n\r\n')
-        binary.write(reply_to.encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="from"')
-        binary.write(b'\r\n\r\n')
-        binary.write(from_name.encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="to"')
-        binary.write(b'\r\n\r\n')
-        binary.write(to.encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="subject"')
-        binary.write(b'\r\n\r\n')
-        binary.write(subject.encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="view_online"')
-        binary.write(b'\r\n\r\n')
-        binary.write(str(view_online).encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="suppress_address"')
-        binary.write(b'\r\n\r\n')
-        binary.write(str(suppress_address).encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="click_tracking"')
-        binary.write(b'\r\n\r\n')
-        binary.write(str(click_tracking).encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-
-        binary.write(b'--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'\r\n')
-        binary.write(b'Content-Disposition: form-data; name="merge_fields"')
-        binary.write(b'\r\n\r\n')
-        binary.write(json.dumps(merge_fields).encode('UTF-8'))
-        binary.write(b'\r\n--')
-        binary.write(boundary.encode('UTF-8'))
-        binary.write(b'--\r\n')
-
-        return self.ep.post(self.endpoint,
-                                content_type="multipart/form-data; boundary={0}".format(boundary), body=binary.getvalue())
+            body.add_file("file", attachment)
+        body.add_field("template_id", template_id)
+        body.add_field("reply_to", reply_to)
+        body.add_field("from", from_name)
+        body.add_field("to", to)
+        body.add_field("subject", subject)
+        body.add_field("view_online", view_online)
+        body.add_field("suppress_address", suppress_address)
+        body.add_field("click_tracking", click_tracking)
+        body.add_field("merge_fields", json.dumps(merge_fields))
+        body.close()
+
+        return self.ep.post(self.endpoint, content_type=body.content_type, body=body, idempotent=True)
 
     def report(self, message_id):
         """ Returns a report with properties of a sent message, such as 'delivered' or 'bounced', 'opened', 'clicked'
@@ -336,4 +334,46 @@ class Messages(object):
         query = self.endpoint
         if params:
             query += "?" + "&".join(params)
-        return self.ep.get(query)
\ No newline at end of file
+        return self.ep.get(query)
+
+    def iter_reports(self, start_date=None, end_date=None, from_id=None, prefetch=True):
+        """ Iterates over reports for all transactional emails, requesting further pages from :func:`reports`
+        as needed.
+
+        :param from_id: Id from where to start, e.g. the last id already processed.
+        :type from_id: str
+
+        :param start_date: Start of the reporting period (UTC, example 2013-03-16T11:22:23.210+0000)
+        :type start_date: str
+
+        :param end_date: End of the reporting period (UTC, example 2013-03-16T11:22:23.210+0000)
+        :type end_date: str
+
+        :param prefetch: Fetch the next page in the background while the current one is consumed
+        :type prefetch: bool
+
+        :returns: generator of message report EpResponse objects, see :func:`reports`
+        :rtype: generator
+
+        :raises: :py:class:`ExpressPigeonException`: if the API returns an error instead of a page
+        """
+
+        return paginate(lambda page_from_id: self.reports(start_date, end_date,
+                                                          None if page_from_id is None else str(page_from_id)),
+                        from_id, prefetch=prefetch)
+
+    def sync_reports(self, checkpoint, start_date=None):
+        """ Returns an incremental sync of reports that resumes from the from_id stored in a checkpoint file, e.g.
+        ``api.messages.sync_reports("reports.checkpoint").run(handle_rows, interval=60)``.
+
+        :param checkpoint: Path of the checkpoint file, created on the first sync
+        :type checkpoint: str
+
+        :param start_date: Start of the first sync (UTC, example 2013-03-16T11:22:23.210+0000), None for all reports
+        :type start_date: str
+
+        :returns: ReportSync, iterate it for the new rows or call poll(callback) with each page of them
+        :rtype: ReportSync
+        """
+
+        return ReportSync(self, checkpoint, start_date)
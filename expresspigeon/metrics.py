@@ -0,0 +1,183 @@
+""" Client-side metrics: latency histograms, byte counters, status codes and errors per endpoint template.
+
+Every call made through a client produces an :py:class:`Observation`, which is handed to
+``ExpressPigeon.response_hook`` and, when the client was given one, recorded by a :py:class:`Metrics`.  Endpoints are
+aggregated by template (``messages/{id}`` rather than ``messages/123``) so the number of series stays bounded.
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+from expresspigeon.cache import endpoint_template
+
+# upper bounds in seconds of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PHASES = ("connect", "ttfb", "total")
+
+Observation = namedtuple('Observation', ['method', 'endpoint', 'template', 'status', 'connect', 'ttfb', 'total',
+                                         'request_bytes', 'response_bytes', 'error'])
+Observation.__doc__ = """ One call as seen by the client.
+
+``connect`` is the time spent opening a new connection (0 when one was reused, None when the transport cannot tell),
+``ttfb`` the time until the response headers arrived and ``total`` the whole call including retries and waits, all in
+seconds.  ``status`` is None and ``error`` holds the exception when the call raised.
+"""
+
+
+class Histogram(object):
+    """ Fixed-bucket histogram; observing a value is a binary search and an increment. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p):
+        """ Estimates the value below which ``p`` percent of the observations fall, interpolating linearly within
+        the bucket that holds it.
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class EndpointStats(object):
+    def __init__(self, buckets):
+        self.latency = dict((phase, Histogram(buckets)) for phase in PHASES)
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.statuses = {}
+        self.errors = {}
+
+
+class Metrics(object):
+    """ Thread-safe aggregation of :py:class:`Observation` objects per (method, endpoint template). """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, observation):
+        key = (observation.method, observation.template)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats(self.buckets)
+            stats.requests += 1
+            stats.request_bytes += observation.request_bytes or 0
+            stats.response_bytes += observation.response_bytes or 0
+            for phase in PHASES:
+                value = getattr(observation, phase)
+                if value is not None:
+                    stats.latency[phase].observe(value)
+            if observation.status is not None:
+                stats.statuses[observation.status] = stats.statuses.get(observation.status, 0) + 1
+            if observation.error is not None:
+                name = type(observation.error).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self):
+        """ :returns: {"GET messages/{id}": {"requests", "request_bytes", "response_bytes", "statuses", "errors",
+        "latency": {phase: {"count", "sum", "p50", "p90", "p99"}}}}
+        """
+        with self._lock:
+            return dict(("{0} {1}".format(method, template), {
+                "requests": stats.requests,
+                "request_bytes": stats.request_bytes,
+                "response_bytes": stats.response_bytes,
+                "statuses": dict(stats.statuses),
+                "errors": dict(stats.errors),
+                "latency": dict((phase, h.snapshot()) for phase, h in stats.latency.items()),
+            }) for (method, template), stats in self._endpoints.items())
+
+    def prometheus(self, prefix="expresspigeon_client"):
+        """ Renders the metrics in the Prometheus text exposition format. """
+        lines = [
+            "# HELP {0}_request_duration_seconds Call latency by phase.".format(prefix),
+            "# TYPE {0}_request_duration_seconds histogram".format(prefix),
+        ]
+        counters = []
+        with self._lock:
+            for (method, template), stats in sorted(self._endpoints.items()):
+                labels = 'endpoint="{0}",method="{1}"'.format(escape(template), method)
+                for phase in PHASES:
+                    h = stats.latency[phase]
+                    if not h.count:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(self.buckets + (float("inf"),), h.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append('{0}_request_duration_seconds_bucket{{{1},phase="{2}",le="{3}"}} {4}'
+                                     .format(prefix, labels, phase, le, cumulative))
+                    lines.append('{0}_request_duration_seconds_sum{{{1},phase="{2}"}} {3!r}'
+                                 .format(prefix, labels, phase, h.sum))
+                    lines.append('{0}_request_duration_seconds_count{{{1},phase="{2}"}} {3}'
+                                 .format(prefix, labels, phase, h.count))
+                for status, n in sorted(stats.statuses.items()):
+                    counters.append(("responses_total", 'Responses by status.',
+                                     '{0},status="{1}"'.format(labels, status), n))
+                for error, n in sorted(stats.errors.items()):
+                    counters.append(("errors_total", 'Calls that raised, by exception type.',
+                                     '{0},error="{1}"'.format(labels, escape(error)), n))
+                counters.append(("request_bytes_total", 'Request body bytes sent.', labels, stats.request_bytes))
+                counters.append(("response_bytes_total", 'Response body bytes received.', labels,
+                                 stats.response_bytes))
+        for name in ("responses_total", "errors_total", "request_bytes_total", "response_bytes_total"):
+            samples = [c for c in counters if c[0] == name]
+            if not samples:
+                continue
+            lines.append("# HELP {0}_{1} {2}".format(prefix, name, samples[0][1]))
+            lines.append("# TYPE {0}_{1} counter".format(prefix, name))
+            lines.extend("{0}_{1}{{{2}}} {3}".format(prefix, name, labels, n) for _, _, labels, n in samples)
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def body_size(body):
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return None
+
+
+def observation(req, endpoint, status, total, response_bytes, error=None):
+    timings = req.timings
+    return Observation(req.get_method(), endpoint, endpoint_template(endpoint), status, timings.get("connect"),
+                       timings.get("ttfb"), total, body_size(req.data), response_bytes, error)
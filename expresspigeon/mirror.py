@@ -0,0 +1,292 @@
+""" Local SQLite mirror of lists and contacts.
+
+:py:class:`ContactMirror` copies the lists of the account (:py:meth:`Lists.find_all`) and their members
+(:py:meth:`Lists.iter_csv`) into an indexed SQLite database and answers :py:meth:`ContactMirror.find_by_email` from it
+without a round trip.  The client's own :py:meth:`Contacts.upsert`, :py:meth:`Contacts.upsert_stream`,
+:py:meth:`Contacts.delete` and :py:meth:`Contacts.move` write through to the mirror, so changes made through this
+client show up at once.  The mirror needs the blocking client.
+
+Refreshes are incremental: only lists that are new, whose contact count changed, or that were exported longer than
+``max_list_age`` ago are exported again; lists that are gone are dropped.  A lookup refreshes first when the last
+refresh is older than ``max_age``.  Changes made by other clients therefore show up within ``max_age`` when they
+change a contact count, and within ``max_list_age`` otherwise.
+
+A list export downloads into a private staging database and is swapped in with one short transaction, so lookups and
+write-through carry on while it runs; write-through that lands during a refresh is applied again after each swap.  One
+thread refreshes at a time: lookups that find the mirror stale while another thread refreshes answer from the data
+already mirrored, only the very first refresh is waited for.
+"""
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from expresspigeon.codec import to_records
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.records import LazyList
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lists (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    from_name TEXT,
+    reply_to TEXT,
+    contact_count INTEGER,
+    exported_at REAL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    email TEXT PRIMARY KEY,
+    fields TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    email TEXT NOT NULL,
+    list_id INTEGER NOT NULL,
+    PRIMARY KEY (email, list_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS memberships_list ON memberships (list_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+
+def succeeded(response):
+    return getattr(response, "status", None) != "error" and getattr(response, "code", 200) < 400
+
+
+def field_name(header):
+    """ Contact field of a CSV export column, e.g. "First name" -> "first_name". """
+    return header.strip().lower().replace(" ", "_")
+
+
+class ContactMirror(object):
+    """ SQLite copy of lists and contacts kept current by incremental refreshes and the client's own writes.
+
+    :param api: the ExpressPigeon client; its contact writes are mirrored while attached
+    :param path: SQLite database file, ":memory:" for a mirror that lives as long as the object
+    :param max_age: seconds after the last refresh before a lookup refreshes again, None to refresh only explicitly
+    :param max_list_age: seconds after which an unchanged list is exported again, None to rely on contact counts
+    :param attach: register with the client so that upsert, upsert_stream, delete and move write through
+    :raises: :py:class:`ExpressPigeonException`: if ``api`` is an asyncio client
+    """
+
+    def __init__(self, api, path=":memory:", max_age=300.0, max_list_age=None, attach=True):
+        if api.asynchronous:
+            raise ExpressPigeonException("ContactMirror needs a blocking ExpressPigeon client")
+        self.api = api
+        self.max_age = max_age
+        self.max_list_age = max_list_age
+        self.exports = 0
+        self.refreshes = 0
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+        self._journal = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(SCHEMA)
+        if attach:
+            api.mirror = self
+
+    def close(self):
+        if self.api.mirror is self:
+            self.api.mirror = None
+        self._db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                yield self._db
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    @property
+    def refreshed_at(self):
+        """ Wall-clock time of the last refresh, None before the first one. """
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'refreshed_at'").fetchone()
+        return row[0] if row else None
+
+    def stale(self):
+        refreshed_at = self.refreshed_at
+        return refreshed_at is None or self.max_age is not None and time.time() - refreshed_at > self.max_age
+
+    def refresh(self, force=False):
+        """ Brings the mirror up to date with the account, exporting only the lists that need it.
+
+        :param force: export every list again
+        :returns: ids of the lists that were exported
+        :raises: :py:class:`ExpressPigeonException`: if the API answers with an error
+        """
+        with self._refreshing:
+            return self._refresh(force)
+
+    def _refresh(self, force=False):
+        with self._lock:
+            self._journal = []
+        try:
+            return self._sync(force)
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def _sync(self, force):
+        remote = self.api.lists.find_all()
+        if not isinstance(remote, (list, LazyList)):
+            raise ExpressPigeonException(getattr(remote, "message", remote))
+        now = time.time()
+        with self._lock:
+            known = dict((row[0], row[1:]) for row in
+                         self._db.execute("SELECT id, contact_count, exported_at FROM lists"))
+        exported = []
+        for contact_list in remote:
+            count, exported_at = known.pop(contact_list.id, (None, None))
+            if force or count != contact_list.contact_count or exported_at is None or \
+                    self.max_list_age is not None and now - exported_at > self.max_list_age:
+                self._export(contact_list)
+                exported.append(contact_list.id)
+        with self._transaction() as db:
+            for list_id in known:
+                db.execute("DELETE FROM lists WHERE id = ?", (list_id,))
+                db.execute("DELETE FROM memberships WHERE list_id = ?", (list_id,))
+            db.execute("DELETE FROM contacts WHERE email NOT IN (SELECT email FROM memberships)")
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)", (now,))
+        self.refreshes += 1
+        return exported
+
+    def _export(self, contact_list):
+        rows = self.api.lists.iter_csv(contact_list.id)
+        names = [field_name(header) for header in next(rows, [])]
+        # rows go to a staging database on disk as they download, so a large list is never held in memory and the
+        # mirror stays readable until the swap
+        staging = sqlite3.connect("")
+        try:
+            staging.execute("CREATE TABLE staging (fields TEXT NOT NULL)")
+            with staging:
+                staging.executemany("INSERT INTO staging (fields) VALUES (?)",
+                                    ((json.dumps(dict(zip(names, row))),) for row in rows if row))
+            with self._transaction() as db:
+                db.execute("DELETE FROM memberships WHERE list_id = ?", (contact_list.id,))
+                for (fields,) in staging.execute("SELECT fields FROM staging ORDER BY rowid"):
+                    fields = json.loads(fields)
+                    self._store(fields.get("email"), fields)
+                    db.execute("INSERT OR IGNORE INTO memberships (email, list_id) VALUES (?, ?)",
+                               (fields.get("email"), contact_list.id))
+                db.execute("INSERT OR REPLACE INTO lists (id, name, from_name, reply_to, contact_count, exported_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           (contact_list.id, getattr(contact_list, "name", None),
+                            getattr(contact_list, "from_name", None), getattr(contact_list, "reply_to", None),
+                            contact_list.contact_count, time.time()))
+                # the export may predate write-through made while it downloaded
+                for change in self._journal:
+                    change()
+        finally:
+            staging.close()
+        self.exports += 1
+
+    def _store(self, email, fields):
+        """ Merges fields into a contact; empty CSV values do not overwrite known ones. """
+        row = self._db.execute("SELECT fields FROM contacts WHERE email = ?", (email,)).fetchone()
+        merged = json.loads(row[0]) if row else {}
+        merged.update((k, v) for k, v in fields.items() if v not in ("", None) or k not in merged)
+        merged["email"] = email
+        self._db.execute("INSERT OR REPLACE INTO contacts (email, fields) VALUES (?, ?)", (email, json.dumps(merged)))
+
+    def _join(self, email, list_id):
+        if self._db.execute("INSERT OR IGNORE INTO memberships (email, list_id) VALUES (?, ?)",
+                            (email, list_id)).rowcount:
+            self._db.execute("UPDATE lists SET contact_count = contact_count + 1 WHERE id = ?", (list_id,))
+
+    def _leave(self, email, list_id):
+        if self._db.execute("DELETE FROM memberships WHERE email = ? AND list_id = ?", (email, list_id)).rowcount:
+            self._db.execute("UPDATE lists SET contact_count = contact_count - 1 WHERE id = ?", (list_id,))
+
+    def _lookup(self):
+        if not self.stale():
+            return
+        # only the first refresh is waited for; later ones run on one thread while the others read what is mirrored
+        if self._refreshing.acquire(self.refreshed_at is None):
+            try:
+                if self.stale():
+                    self._refresh()
+            finally:
+                self._refreshing.release()
+
+    def find_by_email(self, email):
+        """ The mirrored contact in the shape of :py:meth:`Contacts.find_by_email`, None if it is not in any list.
+
+        Refreshes first when the mirror is older than ``max_age``.
+        """
+        self._lookup()
+        with self._lock:
+            row = self._db.execute("SELECT fields FROM contacts WHERE email = ?", (email,)).fetchone()
+            if row is None:
+                return None
+            contact = json.loads(row[0])
+            contact["lists"] = [{"id": list_id} for (list_id,) in self._db.execute(
+                "SELECT list_id FROM memberships WHERE email = ? ORDER BY list_id", (email,))]
+        return to_records(contact)
+
+    def is_member(self, email, list_id):
+        self._lookup()
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM memberships WHERE email = ? AND list_id = ?",
+                                    (email, list_id)).fetchone() is not None
+
+    def emails(self, list_id):
+        """ Mirrored emails of a list, sorted. """
+        self._lookup()
+        with self._lock:
+            return [email for (email,) in self._db.execute(
+                "SELECT email FROM memberships WHERE list_id = ? ORDER BY email", (list_id,))]
+
+    # write-through from Contacts
+
+    def _write(self, change):
+        """ Applies a write-through change, and remembers it for the exports of a refresh in progress. """
+        with self._transaction():
+            change()
+            if self._journal is not None:
+                self._journal.append(change)
+
+    def upserted(self, list_id, contacts, response):
+        if not succeeded(response):
+            return
+        # contacts without an email are rejected by the API and have nothing to be mirrored under
+        contacts = [dict((k, v) for k, v in contact.items() if k != "lists") for contact in contacts
+                    if contact.get("email")]
+
+        def change():
+            for fields in contacts:
+                self._store(fields["email"], fields)
+                if list_id is not None:
+                    self._join(fields["email"], list_id)
+        self._write(change)
+
+    def deleted(self, email, list_id, response):
+        if not succeeded(response):
+            return
+
+        def change():
+            list_ids = [list_id] if list_id is not None else [row[0] for row in self._db.execute(
+                "SELECT list_id FROM memberships WHERE email = ?", (email,))]
+            for member_of in list_ids:
+                self._leave(email, member_of)
+            if list_id is None:
+                self._db.execute("DELETE FROM contacts WHERE email = ?", (email,))
+        self._write(change)
+
+    def moved(self, source, target, emails, response):
+        if not succeeded(response):
+            return
+
+        def change():
+            for email in emails:
+                if self._db.execute("SELECT 1 FROM memberships WHERE email = ? AND list_id = ?",
+                                    (email, source)).fetchone():
+                    self._leave(email, source)
+                    self._join(email, target)
+        self._write(change)
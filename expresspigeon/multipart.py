@@ -0,0 +1,188 @@
+""" Streaming multipart/form-data bodies.
+
+A :py:class:`MultipartBody` is a sequence of in-memory header/trailer segments and file segments that stay on disk.
+Its length is known up front, so it is sent with a Content-Length header, and file contents are streamed in
+fixed-size chunks, through ``sendfile`` where the socket allows it, so peak memory does not depend on file size.
+Parts produced on the fly by a generator (:func:`MultipartBody.add_stream`) leave the length unknown; such a body
+goes out with chunked transfer encoding instead.
+"""
+import mmap
+import os
+import random
+import string
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+CHUNK_SIZE = 256 * 1024
+
+
+def make_boundary():
+    return ''.join(random.choice(string.digits + string.ascii_letters) for i in range(30))
+
+
+class FileSegment(object):
+    """ ``length`` bytes of the file at ``path`` starting at ``offset``; the whole file by default. """
+
+    def __init__(self, path, offset=0, length=None):
+        self.path = path
+        self.offset = offset
+        self.length = os.path.getsize(path) - offset if length is None else length
+
+    def __len__(self):
+        return self.length
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yields the segment as bytes chunks of at most ``chunk_size``. """
+        if not self.length:
+            return
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                end = self.offset + self.length
+                for start in range(self.offset, end, chunk_size):
+                    yield mapped[start:min(start + chunk_size, end)]
+            finally:
+                mapped.close()
+
+    def send(self, sock, chunk_size=CHUNK_SIZE):
+        """ Writes the segment to ``sock`` without copying it through Python buffers where possible:
+        ``sendfile`` on plain sockets, memoryview slices of a memory map on TLS sockets.
+        """
+        if not self.length:
+            return
+        with open(self.path, "rb") as f:
+            if hasattr(sock, "sendfile") and not (ssl and isinstance(sock, ssl.SSLSocket)):
+                sock.sendfile(f, self.offset, self.length)
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                view = memoryview(mapped)
+                try:
+                    end = self.offset + self.length
+                    for start in range(self.offset, end, chunk_size):
+                        chunk = view[start:min(start + chunk_size, end)]
+                        try:
+                            sock.sendall(chunk)
+                        finally:
+                            chunk.release()
+                finally:
+                    view.release()
+            finally:
+                mapped.close()
+
+
+class StreamSegment(object):
+    """ Contents produced by an iterable of bytes chunks; its length is unknown until it has been sent. """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+class MultipartBody(object):
+    """ multipart/form-data body assembled from fields and files without reading the files.
+
+    The body can be iterated (bytes chunks) or written to a socket with :func:`write_to` any number of times,
+    so a request carrying it can be retried.
+    """
+
+    def __init__(self, boundary=None):
+        self.boundary = boundary or make_boundary()
+        self.segments = []
+        self._closed = False
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary={0}".format(self.boundary)
+
+    def add_part(self, headers, data=None, path=None):
+        """ Appends a part with the given header lines and either in-memory ``data`` or the contents of the file
+        at ``path``.
+        """
+        if self._closed:
+            raise ValueError("multipart body is already closed")
+        head = '\r\n'.join(['--{0}'.format(self.boundary)] + list(headers) + ['', ''])
+        self.segments.append(head.encode('UTF-8'))
+        if path is not None:
+            self.segments.append(FileSegment(path))
+        elif data is not None:
+            self.segments.append(data if isinstance(data, bytes) else str(data).encode('UTF-8'))
+        self.segments.append(b'\r\n')
+        return self
+
+    def add_field(self, name, value):
+        return self.add_part(['Content-Disposition: form-data; name="{0}"'.format(name)], data=value)
+
+    def add_file(self, name, path, filename=None, content_type='application/octet-stream'):
+        return self.add_part(['Content-Disposition: form-data; name="{0}"; filename="{1}"'
+                              .format(name, filename or os.path.basename(path)),
+                              'Content-Type: {0}'.format(content_type)], path=path)
+
+    def add_stream(self, name, filename, chunks, content_type='application/octet-stream'):
+        """ Appends a file part whose contents come from the iterable of bytes ``chunks``.
+
+        The body then has no length and can be iterated once only; send ``iter(body)`` so that it goes out with
+        chunked transfer encoding.
+        """
+        self.add_part(['Content-Disposition: form-data; name="{0}"; filename="{1}"'.format(name, filename),
+                       'Content-Type: {0}'.format(content_type)])
+        self.segments.insert(len(self.segments) - 1, StreamSegment(chunks))
+        return self
+
+    def add_data(self, name, filename, data, content_type='application/octet-stream'):
+        """ Appends a file part whose contents are the in-memory bytes ``data``. """
+        return self.add_part(['Content-Disposition: form-data; name="{0}"; filename="{1}"'.format(name, filename),
+                              'Content-Type: {0}'.format(content_type)], data=data)
+
+    def close(self):
+        """ Appends the closing boundary; no parts can be added afterwards. """
+        if not self._closed:
+            self.segments.append('--{0}--\r\n'.format(self.boundary).encode('UTF-8'))
+            self._closed = True
+        return self
+
+    def __len__(self):
+        if any(isinstance(segment, StreamSegment) for segment in self.segments):
+            raise TypeError("a streamed multipart body has no length")
+        return sum(len(segment) for segment in self.segments)
+
+    def _coalesced(self):
+        """ Segments with adjacent in-memory segments joined, so headers go out in as few writes as possible. """
+        pending = []
+        for segment in self.segments:
+            if isinstance(segment, (FileSegment, StreamSegment)):
+                if pending:
+                    yield b''.join(pending)
+                    pending = []
+                yield segment
+            else:
+                pending.append(segment)
+        if pending:
+            yield b''.join(pending)
+
+    def __iter__(self):
+        for segment in self._coalesced():
+            if isinstance(segment, FileSegment):
+                for chunk in segment.chunks():
+                    yield chunk
+            elif isinstance(segment, StreamSegment):
+                for chunk in segment:
+                    if chunk:
+                        yield chunk
+            else:
+                yield segment
+
+    def write_to(self, sock):
+        for segment in self._coalesced():
+            if isinstance(segment, FileSegment):
+                segment.send(sock)
+            elif isinstance(segment, StreamSegment):
+                for chunk in segment:
+                    sock.sendall(chunk)
+            else:
+                sock.sendall(segment)
@@ -0,0 +1,49 @@
+""" Transparent paging over endpoints that return at most a page of rows and continue from ``from_id``. """
+from concurrent.futures import ThreadPoolExecutor
+
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.records import LazyList
+
+PAGE_SIZE = 1000
+
+
+def page_rows(page, from_id, page_size=PAGE_SIZE):
+    """ Splits a fetched page into the rows to hand out and the ``from_id`` of the next page.
+
+    Rows whose id equals ``from_id`` are dropped so that it does not matter whether the server treats
+    ``from_id`` as inclusive or exclusive.
+
+    :returns: (rows, next_from_id) where next_from_id is None on the last page
+    :raises: :py:class:`ExpressPigeonException`: if the server answered with an error instead of a page
+    """
+    if not isinstance(page, (list, LazyList)):
+        raise ExpressPigeonException(getattr(page, "message", page))
+    rows = [row for row in page if from_id is None or str(row.id) != str(from_id)]
+    if len(page) < page_size or not rows:
+        return rows, None
+    return rows, rows[-1].id
+
+
+def paginate(fetch, from_id=None, page_size=PAGE_SIZE, prefetch=True):
+    """ Yields every row of a paged endpoint, fetching pages on demand.
+
+    :param fetch: callable taking a from_id (None for the first page) and returning a page
+    :param prefetch: request the next page in a background thread while the current one is consumed
+
+    At most two pages are held at any time, however many rows the walk covers.
+    """
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        rows, next_id = page_rows(fetch(from_id), from_id, page_size)
+        while True:
+            upcoming = executor.submit(fetch, next_id) if executor and next_id is not None else None
+            for row in rows:
+                yield row
+            rows = None
+            if next_id is None:
+                return
+            page = upcoming.result() if upcoming else fetch(next_id)
+            rows, next_id = page_rows(page, next_id, page_size)
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
@@ -0,0 +1,335 @@
+import collections
+import io
+import select
+import socket
+import threading
+import time
+
+from expresspigeon.exceptions import ExpressPigeonException
+
+try:
+    import http.client as http_client
+except ImportError:
+    import httplib as http_client
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+monotonic = getattr(time, "monotonic", time.time)
+
+# raised by getresponse() when the server closed the connection without sending a byte of a response
+RemoteDisconnected = getattr(http_client, "RemoteDisconnected", http_client.BadStatusLine)
+
+
+class PoolTimeout(ExpressPigeonException):
+    pass
+
+
+class PooledResponse(object):
+    """ Fully read response of a pooled request.
+
+    The connection is handed back to its pool before this object is returned, so holding on to a response
+    never pins a socket.
+    """
+
+    def __init__(self, status, reason, headers, data):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+
+    def info(self):
+        return self.headers
+
+    def read(self):
+        return self.data
+
+
+class PooledStream(io.RawIOBase):
+    """ Response of a pooled request whose body is read incrementally.
+
+    The connection goes back to the pool once the body has been read to the end; closing the stream before that
+    discards the connection.
+    """
+
+    def __init__(self, pool, conn, response):
+        io.RawIOBase.__init__(self)
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+        self._pool = pool
+        self._conn = conn
+        self._response = response
+
+    def info(self):
+        return self.headers
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._conn is None:
+            return 0
+        n = self._response.readinto(b)
+        if not n:
+            self._release()
+        return n
+
+    def read(self, amt=-1):
+        if self._conn is None:
+            return b""
+        data = self._response.read() if amt is None or amt < 0 else self._response.read(amt)
+        if not data or self._response.isclosed():
+            self._release()
+        return data
+
+    def _release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.put_connection(conn, reusable=self._response.isclosed() and not self._response.will_close)
+
+    def close(self):
+        self._release()
+        io.RawIOBase.close(self)
+
+
+def is_connection_dropped(conn):
+    """ Health check used on checkout. An idle keep-alive socket must not be readable: if it is, the server
+    either closed it (EOF) or sent something we did not ask for, and the connection cannot be reused.
+    """
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0.0)
+    except (ValueError, select.error, socket.error):
+        return True
+    return bool(readable)
+
+
+def send_request(conn, method, path, body, headers):
+    """ conn.request() that also accepts streaming bodies exposing ``write_to(sock)`` and ``__len__``. """
+    if not hasattr(body, "write_to"):
+        conn.request(method, path, body, headers)
+        return
+    names = set(name.lower() for name in headers)
+    conn.putrequest(method, path, skip_host="host" in names, skip_accept_encoding="accept-encoding" in names)
+    if "content-length" not in names:
+        conn.putheader("Content-Length", str(len(body)))
+    for name, value in headers.items():
+        conn.putheader(name, value)
+    conn.endheaders()
+    body.write_to(conn.sock)
+
+
+def never_received(error, sent):
+    """ True when a request that failed with ``error`` on a reused connection cannot have been acted on by the
+    server, so that it is safe to send it again.
+
+    :param sent: whether the request had been written completely
+    """
+    if isinstance(error, RemoteDisconnected):
+        return True
+    return not sent and isinstance(error, socket.error) and not isinstance(error, socket.timeout)
+
+
+def replayable(body):
+    """ Whether ``body`` can be sent a second time: a one-shot iterator or file of chunks cannot. """
+    return body is None or hasattr(body, "__len__")
+
+
+class ConnectionPool(object):
+    """ Thread-safe, bounded pool of keep-alive connections to a single host.
+
+    At most ``maxsize`` connections exist at any time (idle and checked out together).  A caller that finds
+    the pool exhausted waits up to ``block_timeout`` seconds (forever if None) for a connection to come back.
+    Idle connections older than ``idle_timeout`` seconds are evicted on checkout.
+    """
+
+    def __init__(self, scheme, host, port=None, maxsize=10, idle_timeout=60.0, timeout=None, ssl_context=None,
+                 block_timeout=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.block_timeout = block_timeout
+        self.connections_created = 0
+        self.connections_reused = 0
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(maxsize)
+
+    def _new_connection(self):
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs["timeout"] = self.timeout
+        if self.scheme == "https":
+            if self.ssl_context is not None:
+                kwargs["context"] = self.ssl_context
+            conn = http_client.HTTPSConnection(self.host, self.port, **kwargs)
+        else:
+            conn = http_client.HTTPConnection(self.host, self.port, **kwargs)
+        with self._lock:
+            self.connections_created += 1
+        return conn
+
+    def _acquire_slot(self):
+        if self.block_timeout is None:
+            self._slots.acquire()
+            return
+        deadline = monotonic() + self.block_timeout
+        while not self._slots.acquire(False):
+            if monotonic() >= deadline:
+                raise PoolTimeout("no free connection to {0} within {1}s".format(self.host, self.block_timeout))
+            time.sleep(0.001)
+
+    def get_connection(self):
+        """ Checks out a connection, reusing the most recently returned healthy one when possible.
+
+        :returns: (connection, reused) tuple
+        """
+        self._acquire_slot()
+        try:
+            now = monotonic()
+            stale = []
+            conn = None
+            with self._lock:
+                while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                    stale.append(self._idle.popleft()[0])
+                while self._idle:
+                    candidate = self._idle.pop()[0]
+                    if is_connection_dropped(candidate):
+                        stale.append(candidate)
+                    else:
+                        conn = candidate
+                        self.connections_reused += 1
+                        break
+            for dead in stale:
+                dead.close()
+            if conn is not None:
+                return conn, True
+            return self._new_connection(), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def put_connection(self, conn, reusable=True):
+        """ Returns a checked out connection. Connections that cannot be reused are closed. """
+        try:
+            if reusable and conn.sock is not None:
+                with self._lock:
+                    self._idle.append((conn, monotonic()))
+            else:
+                conn.close()
+        finally:
+            self._slots.release()
+
+    def urlopen(self, method, path, body=None, headers=None, preload=True, timings=None):
+        """ Sends a request on a pooled connection and reads the response fully, or with ``preload=False``
+        returns a :py:class:`PooledStream` that holds the connection until its body is consumed.
+
+        A reused connection may have been closed by the server after the health check passed.  The request is
+        then repeated once on a fresh connection, but only when the server cannot have acted on it: the connection
+        broke while the request was being written, or was closed before any byte of a response, and its body can be
+        sent again.  Any other failure, a timeout waiting for the response included, is raised for the retry policy
+        to handle.
+
+        :param timings: dict that receives the seconds spent connecting ("connect", 0 for a reused connection) and
+        until the response headers arrived ("ttfb")
+        """
+        headers = headers or {}
+        started = monotonic()
+        conn, reused = self.get_connection()
+        while True:
+            sent = False
+            try:
+                if timings is not None:
+                    if not reused:
+                        connecting = monotonic()
+                        conn.connect()
+                        timings["connect"] = monotonic() - connecting
+                    else:
+                        timings["connect"] = 0.0
+                send_request(conn, method, path, body, headers)
+                sent = True
+                response = conn.getresponse()
+                if timings is not None:
+                    timings["ttfb"] = monotonic() - started
+                data = response.read() if preload else None
+            except (socket.error, http_client.HTTPException) as e:
+                self.put_connection(conn, reusable=False)
+                if not reused or not replayable(body) or not never_received(e, sent):
+                    raise
+                conn, reused = self._retry_connection()
+                continue
+            if not preload:
+                return PooledStream(self, conn, response)
+            self.put_connection(conn, reusable=not response.will_close)
+            return PooledResponse(response.status, response.reason, response.msg, data)
+
+    def _retry_connection(self):
+        self._acquire_slot()
+        try:
+            return self._new_connection(), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def close(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            conn.close()
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+
+class PoolManager(object):
+    """ Keeps one :py:class:`ConnectionPool` per (scheme, host, port). """
+
+    def __init__(self, maxsize=10, idle_timeout=60.0, timeout=None, ssl_context=None, block_timeout=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.block_timeout = block_timeout
+        self.pools = {}
+        self._lock = threading.Lock()
+
+    def connection_pool(self, scheme, host, port=None):
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(scheme, host, port, maxsize=self.maxsize, idle_timeout=self.idle_timeout,
+                                      timeout=self.timeout, ssl_context=self.ssl_context,
+                                      block_timeout=self.block_timeout)
+                self.pools[key] = pool
+            return pool
+
+    def urlopen(self, method, url, body=None, headers=None, preload=True, timings=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError("unsupported URL scheme: {0}".format(parts.scheme))
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self.connection_pool(parts.scheme, parts.hostname, parts.port)
+        return pool.urlopen(method, path, body=body, headers=headers, preload=preload, timings=timings)
+
+    def clear(self):
+        with self._lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+        for pool in pools:
+            pool.close()
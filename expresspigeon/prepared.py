@@ -0,0 +1,50 @@
+""" Transactional sends of one template to many recipients with the constant work done once.
+
+Of the JSON body :py:meth:`Messages.send_message` posts, only ``to`` and ``merge_fields`` change from one recipient to
+the next.  A :py:class:`PreparedMessage` encodes the other fields once, together with the request's URL and headers,
+and each :py:meth:`PreparedMessage.send` encodes the two per-recipient values and splices them in between the
+constant fragments.  The request then goes through the client as usual: retries, rate limiting and metrics apply.
+"""
+from expresspigeon.batches import encoded
+from expresspigeon.retry import IDEMPOTENCY_HEADER, idempotency_key as new_idempotency_key
+
+
+class PreparedMessage(object):
+    """ A transactional message with everything but the recipient fixed, see :py:meth:`Messages.prepare`.
+
+    The URL is resolved from the client's ROOT when the message is prepared.
+    """
+
+    def __init__(self, messages, template_id, reply_to, from_name, subject, merge_fields=None, view_online=False,
+                 click_tracking=True):
+        ep = messages.ep
+        self.ep = ep
+        self.endpoint = messages.endpoint
+        self.merge_fields = merge_fields
+        constant = encoded({'template_id': template_id, 'reply_to': reply_to, 'from': from_name, 'subject': subject,
+                            'view_online': view_online, 'click_tracking': click_tracking}, ep.codec)
+        self._head = constant[:-1] + b', "to": '
+        self.request = ep.Request(url=ep.__url__(self.endpoint), method="POST", data=b"",
+                                  headers={"X-auth-key": ep.auth_key, "Content-type": "application/json",
+                                           "User-Agent": "Mozilla/5.0"})
+
+    def body(self, to, merge_fields=None):
+        """ JSON body of the message to ``to``, as bytes. """
+        if self.merge_fields:
+            shared = dict(self.merge_fields)
+            shared.update(merge_fields or {})
+            merge_fields = shared
+        fields = b"null" if merge_fields is None else encoded(merge_fields, self.ep.codec)
+        return b"".join((self._head, encoded(to, self.ep.codec), b', "merge_fields": ', fields, b"}"))
+
+    def send(self, to, merge_fields=None, idempotency_key=None):
+        """ Sends the message to one recipient, see :py:meth:`Messages.send_message`.
+
+        :param merge_fields: merge field values of this recipient, overriding those given to prepare
+        :returns: EpResponse with the id of the message sent, or an awaitable of it on the asyncio client
+        """
+        req = self.request.copy(self.body(to, merge_fields))
+        if idempotency_key or self.ep.retry is not None:
+            req.add_header(IDEMPOTENCY_HEADER, idempotency_key or new_idempotency_key())
+        return self.ep.post(self.endpoint, request=req)
+
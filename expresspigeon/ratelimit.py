@@ -0,0 +1,271 @@
+""" Client-side rate limiting with token buckets per endpoint family.
+
+Every call takes a token from the bucket of its family (messages, contacts, reports) before it is sent.  When the
+API throttles a call anyway (429, or 503 with Retry-After) the family is blocked for the Retry-After delay, its rate
+is halved and then recovers a little with every successful call, and the call is sent again.  Families without a
+bucket are not paced, but they are blocked the same way once throttled.  A call that stays
+throttled raises :py:class:`RateLimited` instead of returning the error body, so throttling can be told apart from
+a real failure.
+
+Bucket state lives in a store: :py:class:`MemoryBucketStore` shares it between the threads of one process,
+:py:class:`FileBucketStore` between processes on one host through a locked file (place it on a tmpfs such as
+/dev/shm to keep it in shared memory).
+"""
+import json
+import os
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+from expresspigeon.cache import endpoint_template
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.pool import monotonic
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# (tokens per second, burst) per family; families without an entry are not limited.
+DEFAULT_LIMITS = {
+    "messages": (10.0, 20),
+    "contacts": (5.0, 10),
+    "reports": (2.0, 5),
+}
+
+# lowest fraction of the configured rate that repeated throttling can push a family down to
+MIN_FACTOR = 1.0 / 16
+# fraction of the configured rate regained with every successful call after throttling
+RECOVERY = 0.05
+# seconds a family without a bucket is blocked when the API throttles it without a Retry-After
+THROTTLED_PAUSE = 1.0
+
+
+class RateLimited(ExpressPigeonException):
+    """ A call was throttled by the API, or would have to wait longer than allowed for a token.
+
+    ``family`` is the endpoint family, ``retry_after`` the delay in seconds before the family accepts calls again
+    and ``response`` the decoded error response, if the API sent one.
+    """
+
+    def __init__(self, message, family=None, retry_after=None, response=None):
+        ExpressPigeonException.__init__(self, message)
+        self.family = family
+        self.retry_after = retry_after
+        self.response = response
+
+
+def rate_family(endpoint, method):
+    """ Endpoint family a call is limited under: messages (sends), contacts, reports (report and message status
+    reads) or, for anything else, the first path segment.
+    """
+    path = endpoint_template(endpoint)
+    family = path.split("/", 1)[0]
+    method = method.upper()
+    if family == "messages":
+        return "reports" if method == "GET" else "messages"
+    if family == "contacts":
+        return family
+    if path.endswith("/report") or (method == "GET" and family in ("campaigns", "auto_responders") and "/" in path):
+        return "reports"
+    return family
+
+
+def retry_after(headers):
+    """ Parses a Retry-After header given as seconds or as an HTTP date.
+
+    :returns: delay in seconds, or None when the header is missing or malformed
+    """
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+
+def is_throttled(status, headers):
+    return status == 429 or (status == 503 and retry_after(headers) is not None)
+
+
+def reserve(state, now, rate, burst):
+    """ Takes a token from a bucket.
+
+    :param state: [tokens, updated, factor, blocked_until] or None for a full bucket
+    :returns: (new state, seconds to wait before trying again, 0 when a token was taken)
+    """
+    tokens, updated, factor, blocked_until = state or (burst, now, 1.0, 0.0)
+    tokens = min(float(burst), tokens + max(0.0, now - updated) * rate * factor)
+    if now < blocked_until:
+        return [tokens, now, factor, blocked_until], blocked_until - now
+    if tokens >= 1.0:
+        return [tokens - 1.0, now, factor, blocked_until], 0.0
+    return [tokens, now, factor, blocked_until], (1.0 - tokens) / (rate * factor)
+
+
+def blocked(state, now):
+    """ Wait of a family without a bucket: what is left of the block set when it was last throttled.
+
+    :returns: (state, seconds to wait, 0 when the call may go out now)
+    """
+    if state is None or now >= state[3]:
+        return state, 0.0
+    return state, state[3] - now
+
+
+class MemoryBucketStore(object):
+    """ Bucket state shared by the threads of one process. """
+
+    clock = staticmethod(monotonic)
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, family, fn):
+        """ Replaces the state of ``family`` with ``fn(state)[0]`` atomically and returns ``fn(state)[1]``. """
+        with self._lock:
+            state, result = fn(self._states.get(family))
+            self._states[family] = state
+            return result
+
+
+class FileBucketStore(object):
+    """ Bucket state shared by the processes of one host through the file at ``path``, which is locked with
+    ``flock`` for every update.  Timestamps are wall-clock time so that all processes agree on them.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise ExpressPigeonException("FileBucketStore needs fcntl, which is not available on this platform")
+        self.path = path
+        self._lock = threading.Lock()
+
+    def update(self, family, fn):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = b""
+                while True:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    data += chunk
+                try:
+                    states = json.loads(data.decode("utf-8")) if data else {}
+                except ValueError:
+                    states = {}
+                state, result = fn(states.get(family))
+                states[family] = state
+                encoded = json.dumps(states).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, encoded)
+                return result
+            finally:
+                os.close(fd)
+
+
+class RateLimiter(object):
+    """ Token buckets per endpoint family, shared by every client and thread that uses this limiter.
+
+    :param limits: (tokens per second, burst) per family, layered over :py:data:`DEFAULT_LIMITS`; None removes the
+    limit of a family
+    :param store: :py:class:`MemoryBucketStore` (default) or :py:class:`FileBucketStore`
+    :param max_retries: times a throttled call is sent again before :py:class:`RateLimited` is raised
+    :param max_wait: longest wait in seconds for a token or a throttled family, None to wait as long as needed
+    """
+
+    def __init__(self, limits=None, store=None, max_retries=3, max_wait=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.store = store or MemoryBucketStore()
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.waits = 0
+        self.waited = 0.0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def family(self, endpoint, method):
+        return rate_family(endpoint, method)
+
+    def reserve(self, family):
+        """ Takes a token without sleeping.
+
+        :returns: seconds to wait before calling again, 0 when the call may go out now
+        :raises: :py:class:`RateLimited`: if the wait is longer than ``max_wait``
+        """
+        limit = self.limits.get(family)
+        now = self.store.clock()
+        if limit:
+            rate, burst = limit
+            wait = self.store.update(family, lambda state: reserve(state, now, rate, burst))
+        else:
+            wait = self.store.update(family, lambda state: blocked(state, now))
+        if wait and self.max_wait is not None and wait > self.max_wait:
+            raise RateLimited("rate limit of {0} exceeded, retry in {1:.2f}s".format(family, wait), family, wait)
+        return wait
+
+    def waited_for(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.waited += seconds
+
+    def acquire(self, family):
+        """ Blocks until a token of ``family`` is available. """
+        while True:
+            wait = self.reserve(family)
+            if not wait:
+                return
+            self.waited_for(wait)
+            time.sleep(wait)
+
+    def throttled(self, family, delay=None):
+        """ Records that the API throttled a call: blocks the family for ``delay`` seconds (by default the time to
+        earn one token at the reduced rate, :py:data:`THROTTLED_PAUSE` for a family without a bucket) and halves
+        its rate.
+
+        :returns: the delay applied
+        """
+        with self._lock:
+            self.throttles += 1
+        limit = self.limits.get(family)
+        now = self.store.clock()
+
+        def backoff(state):
+            tokens, updated, factor, blocked_until = state or (0.0, now, 1.0, 0.0)
+            if limit:
+                factor = max(MIN_FACTOR, factor / 2.0)
+                pause = delay if delay is not None else 1.0 / (limit[0] * factor)
+            else:
+                pause = delay if delay is not None else THROTTLED_PAUSE
+            return [0.0, now, factor, max(blocked_until, now + pause)], pause
+
+        return self.store.update(family, backoff)
+
+    def succeeded(self, family):
+        """ Lets a throttled family regain part of its rate. """
+        limit = self.limits.get(family)
+        if not limit:
+            return
+
+        def recover(state):
+            if state is not None and state[2] < 1.0:
+                state = state[:2] + [min(1.0, state[2] + RECOVERY)] + state[3:]
+            return state, None
+
+        self.store.update(family, recover)
+
+    def stats(self):
+        with self._lock:
+            return {"waits": self.waits, "waited": self.waited, "throttles": self.throttles}
@@ -0,0 +1,186 @@
+""" Response records.
+
+JSON objects in API responses are decoded into ``EpResponse`` records: namedtuple classes, so ``__slots__``-based
+tuples with attribute access, one class per distinct key signature.  The classes are cached, so decoding a page of
+1000 report rows builds one class rather than a thousand.  Objects whose keys cannot be attribute names (custom field
+names with spaces, for instance) are kept as plain dicts.
+
+In lazy mode responses are :py:class:`LazyRecord`/:py:class:`LazyList` views instead, which keep the raw bytes until
+a field is read and then wrap nested values only as they are reached.
+"""
+from collections import namedtuple
+
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+MAX_CACHED_TYPES = 1024
+
+_INVALID = object()
+_types = {}
+
+
+def record_type(keys):
+    """ Returns the cached EpResponse class for a key signature, or None if the keys are not valid field names.
+
+    :param keys: field names in order
+    :type keys: tuple
+    """
+    cls = _types.get(keys)
+    if cls is None:
+        try:
+            cls = namedtuple('EpResponse', keys)
+        except ValueError:
+            cls = _INVALID
+        if len(_types) < MAX_CACHED_TYPES:
+            _types[keys] = cls
+    return None if cls is _INVALID else cls
+
+
+def object_hook(d):
+    """ json object_hook building EpResponse records. """
+    cls = record_type(tuple(d))
+    if cls is None:
+        return d
+    return cls(*d.values())
+
+
+def lazy(value):
+    if isinstance(value, dict):
+        return LazyRecord(value)
+    if isinstance(value, list):
+        return LazyList(value)
+    return value
+
+
+class LazyRecord(object):
+    """ Read-only view of a JSON object that is parsed on first access.
+
+    Built either from raw response bytes plus a codec, or from an already parsed dict.  Nested objects and arrays are
+    wrapped only when their field is read.  Fields are read as attributes, or by key for names that are not valid
+    identifiers.
+    """
+
+    __slots__ = ("_raw", "_codec", "_data", "_wrapped")
+
+    def __init__(self, data=None, raw=None, codec=None):
+        self._raw = raw
+        self._codec = codec
+        self._data = data
+        self._wrapped = None
+
+    def _asdict(self):
+        """ The parsed object as a plain dict. """
+        data = self._data
+        if data is None:
+            data = self._data = self._codec.loads(self._raw)
+            self._raw = None
+        return data
+
+    @property
+    def _fields(self):
+        return tuple(self._asdict())
+
+    def _field(self, name):
+        wrapped = self._wrapped
+        if wrapped is not None and name in wrapped:
+            return wrapped[name]
+        value = self._asdict()[name]
+        if isinstance(value, (dict, list)):
+            value = lazy(value)
+            if wrapped is None:
+                wrapped = self._wrapped = {}
+            wrapped[name] = value
+        return value
+
+    def __getattr__(self, name):
+        try:
+            return self._field(name)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._field(key)
+        return self._field(self._fields[key])
+
+    def __contains__(self, key):
+        return key in self._asdict()
+
+    def __iter__(self):
+        for name in self._asdict():
+            yield self._field(name)
+
+    def __len__(self):
+        return len(self._asdict())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyRecord):
+            return self._asdict() == other._asdict()
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "EpResponse({0})".format(", ".join("{0}={1!r}".format(k, v) for k, v in self._asdict().items()))
+
+
+class LazyList(Sequence):
+    """ Read-only view of a JSON array that is parsed on first access; items are wrapped as they are read. """
+
+    __slots__ = ("_raw", "_codec", "_data")
+
+    def __init__(self, data=None, raw=None, codec=None):
+        self._raw = raw
+        self._codec = codec
+        self._data = data
+
+    def _aslist(self):
+        data = self._data
+        if data is None:
+            data = self._data = self._codec.loads(self._raw)
+            self._raw = None
+        return data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [lazy(value) for value in self._aslist()[index]]
+        return lazy(self._aslist()[index])
+
+    def __len__(self):
+        return len(self._aslist())
+
+    def __iter__(self):
+        for value in self._aslist():
+            yield lazy(value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyList):
+            return self._aslist() == other._aslist()
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._aslist())
+
+
+def lazy_loads(raw, codec):
+    """ Wraps a raw JSON document without parsing it; scalars are parsed right away. """
+    start = raw.lstrip()[:1]
+    if start == b"{":
+        return LazyRecord(raw=raw, codec=codec)
+    if start == b"[":
+        return LazyList(raw=raw, codec=codec)
+    return codec.loads(raw)
@@ -0,0 +1,141 @@
+""" Retrying of calls that failed for transient reasons.
+
+A :py:class:`RetryPolicy` classifies the outcome of every attempt.  Network errors and 408/429/5xx answers are
+transient; anything else is final.  A transient failure is retried with capped exponential backoff and full jitter
+(honouring Retry-After when the API sends it), provided resending cannot duplicate an effect:
+
+* GET, PUT and DELETE are idempotent and always retried;
+* sends (``Messages.send_message``, ``Campaigns.send`` and friends) carry a client-generated ``Idempotency-Key``
+  that the API uses to drop duplicates, and are retried as well;
+* any other call is only retried when the connection was refused, i.e. nothing reached the server.
+"""
+import errno
+import random
+import socket
+import threading
+import uuid
+
+from expresspigeon.ratelimit import retry_after
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+try:
+    import http.client as http_client
+except ImportError:
+    import httplib as http_client
+
+try:
+    from urllib import request as url_lib
+except ImportError:
+    import urllib2 as url_lib
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+# exceptions raised by urllib and the connection pools when a call fails on the network; asyncio reports a
+# connection closed mid-response with IncompleteReadError, an EOFError
+NETWORK_ERRORS = (socket.error, http_client.HTTPException, url_lib.URLError, EOFError)
+
+
+def idempotency_key():
+    return uuid.uuid4().hex
+
+
+def not_sent(error):
+    """ True when ``error`` shows the request never reached the server. """
+    reason = getattr(error, "reason", error)
+    return getattr(reason, "errno", None) in (errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+
+def is_transient(error):
+    """ True for network errors that may go away on another attempt; certificate failures never do. """
+    reason = getattr(error, "reason", error)
+    if ssl is not None and isinstance(reason, getattr(ssl, "CertificateError", ())):
+        return False
+    return isinstance(error, NETWORK_ERRORS)
+
+
+class RetryPolicy(object):
+    """ When and how often failed calls are sent again.
+
+    :param max_attempts: attempts per call, the first one included
+    :param backoff: base delay in seconds; attempt n waits up to backoff * 2 ** (n - 1)
+    :param max_backoff: cap on a single delay, Retry-After included
+    :param jitter: draw each delay uniformly from [0, delay] so that clients failing together do not retry together
+    :param statuses: HTTP statuses that are retried
+
+    Counters: ``calls`` retried at least once, ``retries`` sent in total, ``gave_up`` calls that failed after the
+    last attempt, ``added_latency`` seconds spent on failed attempts and waits, ``reasons`` retries per status or
+    exception name.
+    """
+
+    def __init__(self, max_attempts=4, backoff=0.2, max_backoff=10.0, jitter=True, statuses=RETRY_STATUSES):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.calls = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.added_latency = 0.0
+        self.reasons = {}
+        self._lock = threading.Lock()
+
+    def idempotent(self, req):
+        # urllib stores header names capitalized
+        return req.get_method().upper() in IDEMPOTENT_METHODS or req.has_header(IDEMPOTENCY_HEADER.capitalize())
+
+    def should_retry(self, req, attempt, status=None, error=None):
+        """ Decides whether a call is sent again after ``attempt`` attempts ended with ``status`` or ``error``. """
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None:
+            return is_transient(error) and (self.idempotent(req) or not_sent(error))
+        return status in self.statuses and self.idempotent(req)
+
+    def delay(self, attempt, response=None):
+        """ Seconds to wait before attempt ``attempt + 1``, at least the Retry-After of ``response`` if any. """
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        requested = retry_after(response.info()) if response is not None else None
+        if requested is not None:
+            delay = max(delay, min(self.max_backoff, requested))
+        return delay
+
+    def retrying(self, attempt, reason):
+        """ Records that a call is about to be sent for attempt ``attempt + 1`` after failing with ``reason``. """
+        name = reason if isinstance(reason, int) else type(reason).__name__
+        with self._lock:
+            if attempt == 1:
+                self.calls += 1
+            self.retries += 1
+            self.reasons[name] = self.reasons.get(name, 0) + 1
+
+    def finished(self, attempts, started, last_started, failed=False):
+        """ Records the end of a call: the time before its last attempt started is latency added by retrying. """
+        with self._lock:
+            if attempts > 1:
+                self.added_latency += last_started - started
+            if failed:
+                self.gave_up += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "gave_up": self.gave_up,
+                "added_latency": self.added_latency,
+                "reasons": dict(self.reasons),
+            }
+
@@ -0,0 +1,64 @@
+""" Coalescing of identical concurrent calls.
+
+Threads that make the same GET while an identical one is in flight wait for it and share its result instead of
+sending their own.  Only calls that overlap are collapsed; nothing is kept once the call completes (see
+:py:mod:`expresspigeon.cache` for that).
+"""
+import threading
+from concurrent.futures import Future
+
+
+def shared(result):
+    """ A copy of a list result for each follower, so that no caller sees another one's changes. """
+    return list(result) if isinstance(result, list) else result
+
+
+class SingleFlight(object):
+    """ Runs at most one call per key at a time across threads.
+
+    ``calls`` counts calls that went upstream, ``collapsed`` calls that were answered by another one in flight.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """ Calls ``fn()``, unless a call with the same ``key`` is in flight, in which case its result is returned
+        (or its exception raised) when it completes.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                self.calls += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+        if not leader:
+            return shared(flight.result())
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key)
+            flight.set_exception(e)
+            raise
+        self._land(key)
+        flight.set_result(result)
+        return result
+
+    def _land(self, key):
+        # callers arriving from now on start a new flight rather than receive this one's result
+        with self._lock:
+            del self._flights[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": len(self._flights)}
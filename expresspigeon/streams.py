@@ -0,0 +1,62 @@
+""" Incremental reading of large response bodies with progress reporting. """
+import io
+from collections import namedtuple
+
+from expresspigeon.pool import monotonic
+
+CHUNK_SIZE = 64 * 1024
+
+Progress = namedtuple('Progress', ['bytes', 'elapsed', 'bytes_per_second', 'done'])
+
+
+class ProgressMeter(object):
+    """ Counts transferred bytes and reports a :py:class:`Progress` to ``callback`` every ``every`` bytes and
+    once more when the transfer is done.
+    """
+
+    def __init__(self, callback=None, every=1024 * 1024):
+        self.callback = callback
+        self.every = every
+        self.bytes = 0
+        self.started = monotonic()
+        self._next_report = every
+
+    def progress(self, done=False):
+        elapsed = monotonic() - self.started
+        return Progress(self.bytes, elapsed, self.bytes / elapsed if elapsed > 0 else 0.0, done)
+
+    def update(self, n):
+        self.bytes += n
+        if self.callback is not None and self.bytes >= self._next_report:
+            self._next_report = self.bytes + self.every
+            self.callback(self.progress())
+
+    def finish(self):
+        final = self.progress(True)
+        if self.callback is not None:
+            self.callback(final)
+        return final
+
+
+class ProgressReader(io.RawIOBase):
+    """ Raw binary stream over ``raw`` that feeds every read into a :py:class:`ProgressMeter`. """
+
+    def __init__(self, raw, meter):
+        io.RawIOBase.__init__(self)
+        self.raw = raw
+        self.meter = meter
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.raw.readinto(b)
+        if n:
+            self.meter.update(n)
+        return n
+
+
+def text_stream(raw, meter, chunk_size=CHUNK_SIZE):
+    """ Decodes a binary response as UTF-8 text without universal newline translation, as the csv module expects. """
+    return io.TextIOWrapper(io.BufferedReader(ProgressReader(raw, meter), chunk_size), encoding="utf-8", newline="")
+
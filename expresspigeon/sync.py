@@ -0,0 +1,145 @@
+""" Incremental sync of transactional message reports.
+
+:py:class:`ReportSync` remembers where the last poll stopped, the id of the last report handed out (``from_id``) and
+the newest ``created_at`` seen (the date watermark), in a :py:class:`Checkpoint` file.  A poll only asks the API for
+reports after ``from_id``, so its cost follows the number of new messages rather than the history, and a restarted
+process continues where the previous one stopped.
+
+The checkpoint moves forward once a whole page has been handed out: a consumer that stops or crashes in the middle
+of a page gets that page again on the next poll, so delivery is at least once.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from expresspigeon.paging import PAGE_SIZE, page_rows
+
+try:
+    from os import replace
+except ImportError:
+    from os import rename as replace
+
+
+class Checkpoint(object):
+    """ State kept in a JSON file that is replaced atomically on every save, so a crash leaves either the old or the
+    new state on disk, never a torn one. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """ The saved state, {} if there is none yet. """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError):
+            return {}
+
+    def save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temporary = tempfile.mkstemp(prefix=".checkpoint-", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            replace(temporary, self.path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+
+
+class ReportSync(object):
+    """ Hands out :py:meth:`Messages.reports` rows that are newer than the checkpoint.
+
+    :param messages: the Messages endpoint
+    :param checkpoint: :py:class:`Checkpoint` or the path of its file
+    :param start_date: where the very first sync starts (UTC, example 2013-03-16T11:22:23.210+0000); None for the
+    whole history. Ignored once the checkpoint has a from_id.
+    """
+
+    def __init__(self, messages, checkpoint, start_date=None, page_size=PAGE_SIZE):
+        self.messages = messages
+        self.checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint)
+        self.start_date = start_date
+        self.page_size = page_size
+        self.state = self.checkpoint.load()
+        self.polls = 0
+        self.requests = 0
+        self.rows = 0
+
+    @property
+    def from_id(self):
+        return self.state.get("from_id")
+
+    @property
+    def watermark(self):
+        """ Newest created_at handed out so far. """
+        return self.state.get("watermark")
+
+    def _fetch(self, from_id):
+        self.requests += 1
+        if from_id is None and self.start_date is not None:
+            end_date = time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime())
+            return self.messages.reports(self.start_date, end_date)
+        return self.messages.reports(from_id=None if from_id is None else str(from_id))
+
+    def _commit(self, rows):
+        state = dict(self.state)
+        state["from_id"] = rows[-1].id
+        created = [r.created_at for r in rows if getattr(r, "created_at", None)]
+        if created:
+            state["watermark"] = max([state.get("watermark") or ""] + created)
+        state["synced"] = state.get("synced", 0) + len(rows)
+        self.checkpoint.save(state)
+        self.state = state
+        self.rows += len(rows)
+
+    def pages(self):
+        """ Yields the new reports a page (a list of rows) at a time, saving the checkpoint after each page once the
+        consumer asks for the next one or the poll ends.
+
+        :raises: :py:class:`ExpressPigeonException`: if the API returns an error instead of a page
+        """
+        self.polls += 1
+        from_id = self.from_id
+        while True:
+            rows, next_id = page_rows(self._fetch(from_id), from_id, self.page_size)
+            if rows:
+                yield rows
+                self._commit(rows)
+                from_id = rows[-1].id
+            if next_id is None:
+                return
+
+    def __iter__(self):
+        """ Yields the new reports one row at a time, see :func:`pages`. """
+        for rows in self.pages():
+            for row in rows:
+                yield row
+
+    def poll(self, callback):
+        """ Passes every page of new reports to ``callback(rows)``; the checkpoint moves past a page when the
+        callback returns.
+
+        :returns: number of new rows
+        """
+        count = 0
+        for rows in self.pages():
+            callback(rows)
+            count += len(rows)
+        return count
+
+    def run(self, callback, interval=60.0, stop=None):
+        """ Polls every ``interval`` seconds until ``stop``, a :py:class:`threading.Event`, is set. """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            started = time.time()
+            self.poll(callback)
+            stop.wait(max(0.0, interval - (time.time() - started)))
+
+    def stats(self):
+        return {"polls": self.polls, "requests": self.requests, "rows": self.rows, "from_id": self.from_id,
+                "watermark": self.watermark}
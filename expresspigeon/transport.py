@@ -0,0 +1,122 @@
+""" Transports: how a prepared request reaches the API.
+
+The client hands every request to a transport and reads the (status, response) pair it returns; the response has
+``info()`` returning the headers and ``read()``, and, for streamed responses, ``readinto()`` and ``close()``.
+
+* :py:class:`UrllibTransport` opens a new connection per call through urllib;
+* :py:class:`PooledTransport` keeps connections alive in a :py:class:`PoolManager` of ``http.client`` connections;
+* :py:class:`InProcessTransport` calls a Python handler directly, without sockets, e.g. a
+  :py:class:`expresspigeon.fakeserver.FakeApi`, so that load tests measure the client alone.
+"""
+import email.message
+import io
+
+from expresspigeon.pool import PoolManager, monotonic
+
+try:
+    from urllib import request as url_lib
+except ImportError:
+    import urllib2 as url_lib
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+
+class Transport(object):
+    """ Interface of a transport. """
+
+    def open(self, req, stream=False):
+        """ Sends a prepared :py:class:`ExpressPigeon.Request`.
+
+        :param stream: leave the body unread so it can be consumed incrementally; the response must be closed
+        :returns: (status, response)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Releases idle connections. """
+        pass
+
+
+class UrllibTransport(Transport):
+    """ A new connection per call through urllib; HTTP errors are returned as responses, not raised. """
+
+    def __init__(self, timeout=None, ssl_context=None):
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+
+    def open(self, req, stream=False):
+        handler = url_lib.HTTPSHandler(context=self.ssl_context) if self.ssl_context else url_lib.HTTPSHandler
+        opener = url_lib.build_opener(handler)
+        started = monotonic()
+        try:
+            if self.timeout is not None:
+                response = opener.open(req, timeout=self.timeout)
+            else:
+                response = opener.open(req)
+            req.timings["ttfb"] = monotonic() - started
+            return response.getcode(), response
+        except url_lib.HTTPError as e:
+            req.timings["ttfb"] = monotonic() - started
+            return e.code, e
+
+
+class PooledTransport(Transport):
+    """ Keep-alive ``http.client`` connections from a :py:class:`PoolManager`, see its parameters. """
+
+    def __init__(self, maxsize=10, idle_timeout=60.0, timeout=None, ssl_context=None, block_timeout=None):
+        self.pool = PoolManager(maxsize=maxsize, idle_timeout=idle_timeout, timeout=timeout, ssl_context=ssl_context,
+                                block_timeout=block_timeout)
+
+    def open(self, req, stream=False):
+        response = self.pool.urlopen(req.get_method(), req.get_full_url(), body=req.data,
+                                     headers=dict(req.header_items()), preload=not stream, timings=req.timings)
+        return response.status, response
+
+    def close(self):
+        self.pool.clear()
+
+
+class InProcessResponse(io.BytesIO):
+    """ Response produced by an in-process handler; a binary file over its body. """
+
+    def __init__(self, status, headers, data):
+        io.BytesIO.__init__(self, data)
+        self.status = status
+        self.headers = email.message.Message()
+        for name, value in headers.items():
+            self.headers[name] = value
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.status
+
+
+class InProcessTransport(Transport):
+    """ Routes requests to ``handler(method, path, headers, body) -> (status, headers, body)`` in the calling thread.
+
+    ``path`` includes the query string and ``body`` is bytes; streaming request bodies are joined first.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def open(self, req, stream=False):
+        started = monotonic()
+        parts = urlsplit(req.get_full_url())
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        body = req.data
+        if body is None:
+            body = b""
+        elif not isinstance(body, bytes):
+            body = b"".join(body)
+        status, headers, data = self.handler(req.get_method(), path, dict(req.header_items()), body)
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        req.timings["connect"] = 0.0
+        req.timings["ttfb"] = monotonic() - started
+        return status, InProcessResponse(status, headers, data)
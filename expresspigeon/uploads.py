@@ -0,0 +1,201 @@
+""" Waiting for list uploads without a sleeping thread per upload.
+
+:py:meth:`Lists.upload_async` returns an :py:class:`UploadFuture` at once and hands the upload to an
+:py:class:`UploadPoller`.  The file is sent by one of a few worker threads of the poller; the upload id it gets back
+then joins the uploads that one poller thread serves for the whole process: it keeps them in a heap ordered by their
+next check and calls :py:meth:`Lists.upload_status` as each falls due, quickly at first and then at exponentially
+growing intervals, until the report is complete.  The thread exits when nothing is pending and is started again by
+the next upload.
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.pool import monotonic
+
+try:
+    from concurrent.futures import InvalidStateError
+except ImportError:  # older futures let the outcome of a cancelled future be set
+    InvalidStateError = RuntimeError
+
+
+def intervals(first=0.25, factor=2.0, maximum=30.0):
+    """ Delays between status checks: ``first``, then growing by ``factor`` up to ``maximum``. """
+    delay = first
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+def upload_finished(response):
+    """ Whether an upload_status response is final.
+
+    :raises: :py:class:`ExpressPigeonException`: if the API answered with an error
+    """
+    if getattr(response, "status", None) == "error" or getattr(response, "code", 200) >= 400:
+        raise ExpressPigeonException(getattr(response, "message", response))
+    report = getattr(response, "report", None)
+    return report is not None and (getattr(report, "completed", True) or getattr(report, "failed", False))
+
+
+def resolve(future, result=None, exception=None):
+    """ Sets the outcome of ``future`` unless it was cancelled meanwhile. """
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class UploadFuture(Future):
+    """ Resolves to the final :py:meth:`Lists.upload_status` response of an upload, whose ``report`` has the import
+    counts, or to the exception the upload or a status check failed with.  ``upload_id`` is None until the file has
+    been sent. """
+
+    def __init__(self, upload_id=None):
+        Future.__init__(self)
+        self.upload_id = upload_id
+        self.polls = 0
+
+
+class _Pending(object):
+    __slots__ = ("future", "status", "delays", "deadline")
+
+    def __init__(self, future, status, delays, deadline):
+        self.future = future
+        self.status = status
+        self.delays = delays
+        self.deadline = deadline
+
+
+class UploadPoller(object):
+    """ Checks the status of any number of uploads from a single background thread.
+
+    :param first: seconds before the first status check
+    :param factor: growth of the interval after every check that finds the upload still running
+    :param maximum: longest interval between checks
+    :param senders: most files sent at once
+    """
+
+    def __init__(self, first=0.25, factor=2.0, maximum=30.0, senders=4):
+        self.first = first
+        self.factor = factor
+        self.maximum = maximum
+        self.senders = senders
+        self.polls = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    def upload(self, future, send, status, timeout=None):
+        """ Calls ``send()`` on a worker thread, then polls ``status(upload_id)`` with the upload id it answered,
+        see :py:meth:`watch`.
+
+        :returns: ``future``
+        """
+        with self._condition:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.senders)
+            executor = self._executor
+        executor.submit(self._send, future, send, status, timeout)
+        return future
+
+    def _send(self, future, send, status, timeout):
+        if future.cancelled():
+            return
+        try:
+            response = send()
+            upload_id = getattr(response, "upload_id", None)
+            if upload_id is None:
+                raise ExpressPigeonException(getattr(response, "message", response))
+        except Exception as e:
+            resolve(future, exception=e)
+            return
+        future.upload_id = upload_id
+        self.watch(future, lambda: status(upload_id), timeout)
+
+    def watch(self, future, status, timeout=None):
+        """ Polls ``status()`` for ``future`` until it returns a final response, or ``timeout`` seconds pass. """
+        delays = intervals(self.first, self.factor, self.maximum)
+        deadline = monotonic() + timeout if timeout is not None else None
+        self._schedule(_Pending(future, status, delays, deadline))
+        return future
+
+    @property
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _schedule(self, item):
+        with self._condition:
+            heapq.heappush(self._heap, (monotonic() + next(item.delays), next(self._sequence), item))
+            if self._thread is None:
+                self._start()
+            self._condition.notify()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="expresspigeon-upload-poller")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while True:
+                        if not self._heap:
+                            return
+                        due = self._heap[0][0] - monotonic()
+                        if due <= 0:
+                            break
+                        self._condition.wait(due)
+                    item = heapq.heappop(self._heap)[2]
+                try:
+                    self._check(item)
+                except Exception as e:
+                    resolve(item.future, exception=e)
+        finally:
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                    if self._heap:
+                        self._start()
+
+    def _check(self, item):
+        future = item.future
+        if future.cancelled():
+            return
+        self.polls += 1
+        future.polls += 1
+        try:
+            response = item.status()
+            finished = upload_finished(response)
+        except Exception as e:
+            resolve(future, exception=e)
+            return
+        if finished:
+            resolve(future, response)
+        elif item.deadline is not None and monotonic() >= item.deadline:
+            message = "upload={0} not finished in time".format(future.upload_id)
+            resolve(future, exception=ExpressPigeonException(message))
+        else:
+            self._schedule(item)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_poller():
+    """ The poller shared by all clients of the process. """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = UploadPoller()
+        return _default
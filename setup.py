@@ -10,7 +10,7 @@ setup(name='ExpressPigeon',
       author='Gleb Galkin',
       author_email='gleb@expresspigeon.com',
       license='BSD',
-      packages=find_packages(exclude=['*.tests', '*.tests.*', 'tests.*', 'tests']),
+      packages=find_packages(exclude=['*.tests', '*.tests.*', 'tests.*', 'tests', 'benchmarks', 'benchmarks.*']),
       keywords=' '.join(['expresspigeon',
                          'api',
                          'email',
@@ -27,4 +27,6 @@ setup(name='ExpressPigeon',
           'Topic :: Software Development :: Libraries',
           'Topic :: Software Development :: Libraries :: Python Modules'
       ],
+      install_requires=['futures; python_version < "3"'],
+      extras_require={'analytics': ['numpy']},
       tests_require=['pytz'])
\ No newline at end of file
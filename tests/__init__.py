@@ -2,6 +2,7 @@ import base64
 import email
 import imaplib
 import os
+import threading
 import unittest
 import time
 from expresspigeon import ExpressPigeon
@@ -11,6 +12,13 @@ try:
 except ImportError:
     import urllib2 as url_lib
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
 
 class ExpressPigeonTest(unittest.TestCase):
     template_id = 356646
@@ -132,3 +140,68 @@ class Gmail(object):
             conn.store(email, '+FLAGS', '\\Deleted')
 
         return True if len(conn.search(None, '(SUBJECT "{0}")'.format(subject))[1][0].split(" ")) == 0 else False
+
+
+class LocalApiServer(ThreadingMixIn, HTTPServer):
+    """ Keep-alive HTTP server on localhost for tests that must not reach the live API.
+
+    ``app`` is called as app(method, path, headers, body) and returns (status, headers, body).  With
+    ``discard_bodies`` request bodies are drained in chunks and the app sees an empty body.
+    """
+    daemon_threads = True
+
+    def __init__(self, app, discard_bodies=False):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), LocalApiHandler)
+        self.app = app
+        self.discard_bodies = discard_bodies
+        self.connections = 0
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{0}/".format(self.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class LocalApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.server.discard_bodies:
+            while length:
+                length -= len(self.rfile.read(min(length, 65536)))
+            return b""
+        return self.rfile.read(length) if length else b""
+
+    def respond(self):
+        body = self.read_body()
+        self.server.requests.append((self.command, self.path, dict(self.headers.items()), body))
+        status, headers, data = self.server.app(self.command, self.path, self.headers, body)
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = respond
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import unittest
+from expresspigeon import AsyncExpressPigeon
+from tests import LocalApiServer
+
+BULK = "{0}{1}bulk.zip".format(os.path.split(os.path.abspath(__file__))[0], os.path.sep)
+CSV = "{0}{1}emails.csv".format(os.path.split(os.path.abspath(__file__))[0], os.path.sep)
+
+
+def echo_app(method, path, headers, body):
+    if path.endswith("/bulk"):
+        return 200, {"Content-Type": "text/plain"}, '{"id": 1}\n{"id": 2}'
+    return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success", "path": path,
+                                                                  "method": method, "size": len(body)})
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class AsyncExpressPigeonTest(unittest.TestCase):
+    def test_endpoint_methods_are_awaitable(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                found = await api.lists.find_all()
+                deleted = await api.campaigns.delete(7)
+                return found, deleted
+
+        with LocalApiServer(echo_app) as server:
+            found, deleted = run(scenario(server.url))
+            self.assertEqual(found.path, "/lists")
+            self.assertEqual(deleted.path, "/campaigns/7")
+            self.assertEqual(deleted.method, "DELETE")
+
+    def test_concurrent_sends_share_bounded_pool(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key", pool_size=4) as api:
+                api.ROOT = root
+                results = await asyncio.gather(*[
+                    api.messages.send_message(template_id=1, to="bob@example.net", reply_to="a@example.net",
+                                              from_name="me", subject="Hi") for _ in range(40)])
+                return results
+
+        with LocalApiServer(echo_app) as server:
+            results = run(scenario(server.url))
+            self.assertEqual(len(results), 40)
+            self.assertTrue(all(r.status == "success" for r in results))
+            self.assertTrue(server.connections <= 4)
+
+    def test_file_endpoints(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                bulk = await api.messages.send_message_bulk(BULK)
+                upload = await api.lists.upload(1, CSV)
+                return bulk, upload
+
+        with LocalApiServer(echo_app) as server:
+            bulk, upload = run(scenario(server.url))
+            self.assertEqual(bulk, '{"id": 1}\n{"id": 2}')
+            self.assertEqual(upload.path, "/lists/1/upload")
+            self.assertTrue(upload.size > 0)
+
+    def test_reset_after_the_request_was_written_is_not_replayed(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(5)
+        methods = []
+
+        def serve():
+            while True:
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    return
+                reader = conn.makefile("rb")
+                while True:
+                    line = reader.readline()
+                    if not line:
+                        break
+                    method, length = line.split()[0].decode("ascii"), 0
+                    while line not in (b"\r\n", b""):
+                        if line.lower().startswith(b"content-length:"):
+                            length = int(line.split(b":")[1])
+                        line = reader.readline()
+                    reader.read(length)
+                    methods.append(method)
+                    if method == "POST":
+                        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                        break
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                reader.close()
+                conn.close()
+
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                await api.lists.find_all()
+                with self.assertRaises(ConnectionResetError):
+                    await api.messages.send_message(1, "a@e.e", "r@e.e", "Shop", "Hi")
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        try:
+            run(scenario("http://127.0.0.1:{0}/".format(listener.getsockname()[1])))
+        finally:
+            listener.close()
+        self.assertEqual(methods, ["GET", "POST"])
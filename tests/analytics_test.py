@@ -0,0 +1,79 @@
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.transport import InProcessTransport
+from expresspigeon import analytics
+
+np = analytics.np
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class AnalyticsTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+        list_id = self.api.lists.create("Customers", "Shop", "shop@example.net").list.id
+        self.api.contacts.upsert(list_id, [{"email": "u{0:03d}@e.e".format(i)} for i in range(70)])
+        self.campaign_ids = [self.api.campaigns.send(list_id, 1, "C", "Shop", "shop@example.net", "Hi", False)
+                             .campaign_id for _ in range(2)]
+
+    def test_events_from_full_report_and_responses_agree(self):
+        table = analytics.campaign_events(self.api.campaigns.full_report(self.campaign_ids))
+        campaign_id = self.campaign_ids[0]
+        responses = {campaign_id: {"opened": self.api.campaigns.opened(campaign_id),
+                                   "clicked": self.api.campaigns.clicked(campaign_id)}}
+        other = analytics.campaign_events(responses, table.categories)
+
+        opened = table.data[(table["campaign_id"] == campaign_id) & (table["event"] == analytics.EVENT_CODES["opened"])]
+        self.assertEqual(sorted(opened["email"]), sorted(other.data[other["event"] == 2]["email"]))
+        self.assertEqual(table["timestamp"].dtype, np.dtype("datetime64[ms]"))
+        self.assertEqual(str(opened[np.argsort(opened["timestamp"])]["timestamp"][0]), "2013-09-20T11:29:57.000")
+        self.assertTrue(np.isnat(table.data[table["event"] == analytics.EVENT_CODES["non_opens"]]["timestamp"]).all())
+        self.assertEqual(set(other.labels("url")[other["event"] == 3]),
+                         set("http://example.net/{0}".format(i) for i in range(5)))
+
+    def test_rates(self):
+        table = analytics.campaign_events(self.api.campaigns.full_report(self.campaign_ids))
+        rates = analytics.open_rate(table)
+        self.assertEqual(list(rates["campaign_id"]), sorted(self.campaign_ids))
+        self.assertEqual(list(rates["delivered"]), [70, 70])
+        self.assertEqual(list(rates["opened"]), [24, 24])
+        self.assertAlmostEqual(rates["open_rate"][0], 24 / 70.0)
+
+        ctr = analytics.click_through(table)
+        self.assertEqual(len(ctr), 10)
+        self.assertEqual(ctr["clicks"].sum(), 20)
+        first = ctr[(ctr["campaign_id"] == self.campaign_ids[0])
+                    & (ctr["url"] == table.categories["url"].codes["http://example.net/0"])]
+        self.assertEqual(first["clickers"][0], 2)
+        self.assertAlmostEqual(first["ctr"][0], 2 / 70.0)
+
+        delays = analytics.time_to_open(table)
+        self.assertEqual(len(delays), 48)
+        self.assertEqual(delays["delay"].dtype, np.dtype("timedelta64[ms]"))
+        self.assertTrue((delays["delay"] == np.timedelta64(0, "ms")).all())
+
+    def test_message_reports(self):
+        self.fake.seed_messages(30)
+        self.api.messages.send_message(1, "a@e.e", "b@e.e", "Shop", "Hi")
+        table = analytics.message_reports(self.api.messages.iter_reports())
+        self.assertEqual(len(table), 31)
+        self.assertEqual(table["created_at"].dtype, np.dtype("datetime64[ms]"))
+        self.assertEqual(table.labels("email")[-1], "a@e.e")
+        statuses = table.labels("status")
+        self.assertTrue(set(statuses) <= set(analytics.STATUSES))
+        self.assertEqual(int((statuses == "clicked").sum()), int((table["clicked"] & ~table["bounced"]
+                                                                  & ~table["spam"]).sum()))
+
+        clicked = table.children["urls"]
+        self.assertEqual(sorted(clicked["id"]), sorted(table["id"][table["clicked"]]))
+        self.assertEqual(list(clicked.labels("url")), ["http://example.net/{0}".format(i % 5) for i in clicked["id"]])
+        self.assertTrue(table.categories["url"] is clicked.categories["url"])
+
+    def test_message_status_without_flags_is_unknown(self):
+        rows = [self.api.messages.report(self.api.messages.send_message(1, "a@e.e", "b@e.e", "Shop", "Hi").id)]
+        self.fake.messages[rows[0].id].update(delivered=False, in_transit=True)
+        rows.append(self.api.messages.report(rows[0].id))
+        self.fake.messages[rows[0].id].update(in_transit=False)
+        rows.append(self.api.messages.report(rows[0].id))
+        self.assertEqual(list(analytics.message_reports(rows).labels("status")), ["delivered", "in_transit", "unknown"])
@@ -0,0 +1,57 @@
+import json
+import threading
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.aio import AsyncInProcessTransport
+from expresspigeon.batches import batches
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.codec import get_codec
+from tests import LocalApiServer
+
+
+class BatchesTest(unittest.TestCase):
+    def test_bounded_by_count_and_bytes(self):
+        codec = get_codec("json")
+        items = [{"email": "u{0}@e.e".format(i)} for i in range(10)]
+        self.assertEqual([len(b) for b, chunks in batches(items, codec, 4, 1000)], [4, 4, 2])
+        size = len(json.dumps(items[0])) + 1
+        self.assertEqual([len(b) for b, chunks in batches(items, codec, 100, size * 3)], [3, 3, 3, 1])
+        self.assertEqual([len(b) for b, chunks in batches(items, codec, 100, 1)], [1] * 10)
+
+    def test_upsert_stream_refuses_async_client(self):
+        api = AsyncExpressPigeon("key", transport=AsyncInProcessTransport(FakeApi()))
+        self.assertRaises(ExpressPigeonException, api.contacts.upsert_stream, 1, [{"email": "a@e.e"}])
+
+    def test_upsert_stream_retries_failed_batch_only(self):
+        lock = threading.Lock()
+        seen = {}
+
+        def app(method, path, headers, body):
+            contacts = json.loads(body.decode("utf-8"))["contacts"]
+            first = contacts[0]["email"]
+            with lock:
+                seen[first] = seen.get(first, 0) + 1
+                flaky = first == "u3@e.e" and seen[first] == 1
+            if flaky or first == "u6@e.e":
+                code = 502 if flaky else 400
+                return code, {"Content-Type": "application/json"}, \
+                    json.dumps({"code": code, "status": "error", "message": "nope"})
+            return 200, {"Content-Type": "application/json"}, \
+                json.dumps({"code": 200, "status": "success", "contacts": [c["email"] for c in contacts]})
+
+        with LocalApiServer(app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            contacts = ({"email": "u{0}@e.e".format(i)} for i in range(8))
+            run = api.contacts.upsert_stream(5, contacts, batch_size=3, concurrency=2, backoff=0.001)
+            results = sorted(run, key=lambda r: r.index)
+
+        self.assertEqual([r.index for r in results], [0, 1, 2])
+        self.assertEqual(seen, {"u0@e.e": 1, "u3@e.e": 2, "u6@e.e": 1})
+        self.assertEqual(results[1].attempts, 2)
+        self.assertEqual(list(results[1].response.contacts), ["u3@e.e", "u4@e.e", "u5@e.e"])
+        self.assertEqual(results[2].error, "nope")
+        self.assertEqual((run.stored, run.failed, run.batches, run.retries), (6, 2, 3, 1))
+        method, path, headers, body = server.requests[0]
+        self.assertEqual(json.loads(body.decode("utf-8"))["list_id"], 5)
@@ -0,0 +1,84 @@
+import threading
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.aio import AsyncInProcessTransport
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.transport import InProcessTransport
+
+
+class BulkCountingApi(FakeApi):
+    def __init__(self):
+        FakeApi.__init__(self)
+        self.bulk_requests = 0
+
+    def __call__(self, method, path, headers, body):
+        if path == "/messages/bulk":
+            self.bulk_requests += 1
+        return FakeApi.__call__(self, method, path, headers, body)
+
+
+class BatchingSenderTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = BulkCountingApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+
+    def test_concurrent_sends_share_bulk_requests(self):
+        futures = {}
+        lock = threading.Lock()
+
+        def produce(start):
+            for i in range(start, start + 50):
+                future = sender.send_message(1, "u{0}@e.e".format(i), "r@e.e", "Shop", "Hi", merge_fields={"n": i})
+                with lock:
+                    futures["u{0}@e.e".format(i)] = future
+
+        with self.api.messages.batching_sender(max_batch=100, max_delay=1.0) as sender:
+            threads = [threading.Thread(target=produce, args=(n * 50,)) for n in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(self.fake.bulk_requests, 2)
+        self.assertEqual(sender.sent, 200)
+        for to, future in futures.items():
+            result = future.result(timeout=1)
+            self.assertEqual(result.message, "email queued")
+            self.assertEqual(self.fake.messages[result.id]["email"], to)
+
+    def test_time_window_and_per_message_errors(self):
+        sender = self.api.messages.batching_sender(max_batch=1000, max_delay=0.01)
+        good = sender.send_message(1, "a@e.e", "r@e.e", "Shop", "Hi")
+        bad = sender.send_message(1, "", "r@e.e", "Shop", "Hi")
+        self.assertEqual(good.result(timeout=2).status, "success")
+        self.assertEqual(bad.result(timeout=2).code, 400)
+        self.assertEqual(self.fake.bulk_requests, 1)
+        sender.close()
+        self.assertRaises(ExpressPigeonException, sender.send_message, 1, "a@e.e", "r@e.e", "Shop", "Hi")
+
+    def test_size_threshold_and_failed_batch(self):
+        sender = self.api.messages.batching_sender(max_batch=1000, max_delay=10, max_bytes=500)
+        futures = [sender.send_message(1, "u{0}@e.e".format(i), "r@e.e", "Shop", "Hi") for i in range(10)]
+        sender.flush()
+        self.assertTrue(self.fake.bulk_requests >= 4)
+        self.assertEqual(len(set(f.result().id for f in futures)), 10)
+
+        self.fake.error_rate = 1.0
+        failed = sender.send_message(1, "a@e.e", "r@e.e", "Shop", "Hi")
+        sender.close()
+        self.assertTrue(isinstance(failed.exception(), ExpressPigeonException))
+
+    def test_cancelled_sends_are_left_out(self):
+        sender = self.api.messages.batching_sender(max_batch=1000, max_delay=10)
+        futures = [sender.send_message(1, "u{0}@e.e".format(i), "r@e.e", "Shop", "Hi") for i in range(3)]
+        self.assertTrue(futures[0].cancel())
+        sender.close()
+        self.assertTrue(futures[0].cancelled())
+        self.assertEqual([self.fake.messages[f.result(timeout=1).id]["email"] for f in futures[1:]],
+                         ["u1@e.e", "u2@e.e"])
+        self.assertEqual(sender.sent, 2)
+
+    def test_async_client_is_refused(self):
+        api = AsyncExpressPigeon("key", transport=AsyncInProcessTransport(self.fake))
+        self.assertRaises(ExpressPigeonException, api.messages.batching_sender)
@@ -0,0 +1,66 @@
+import asyncio
+import io
+import unittest
+import zipfile
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.bulk import BulkArchive
+from expresspigeon.fakeserver import FakeApi, FakeServer
+from expresspigeon.transport import UrllibTransport
+
+
+def messages(count, pulled=None):
+    for i in range(count):
+        if pulled is not None:
+            pulled.append(i)
+        yield {"template_id": 1, "to": "u{0}@e.e".format(i), "reply_to": "r@e.e", "from": "Shop", "subject": "Hi",
+               "merge_fields": {"n": i}}
+
+
+class BulkArchiveTest(unittest.TestCase):
+    def test_archive_is_streamed_while_messages_are_pulled(self):
+        pulled = []
+        archive = BulkArchive(messages(20000, pulled), chunk_size=4096)
+        chunks = iter(archive)
+        first = next(chunks)
+        self.assertTrue(len(first) >= 4096)
+        self.assertTrue(len(pulled) < 20000)
+        data = first + b"".join(chunks)
+        self.assertEqual(archive.count, 20000)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertEqual(z.namelist(), ["bulk.txt"])
+            lines = z.read("bulk.txt").split(b"\r\n")
+        self.assertEqual(len(lines), 20000)
+        self.assertTrue(b'"u19999@e.e"' in lines[-1])
+
+    def test_compression_settings(self):
+        stored = b"".join(BulkArchive(messages(500), compression=zipfile.ZIP_STORED))
+        fastest = b"".join(BulkArchive(messages(500), compresslevel=1))
+        self.assertTrue(len(fastest) < len(stored))
+        with zipfile.ZipFile(io.BytesIO(stored)) as z:
+            self.assertEqual(z.infolist()[0].compress_type, zipfile.ZIP_STORED)
+
+    def test_send_message_bulk_streams_chunked(self):
+        fake = FakeApi()
+        with FakeServer(fake) as server:
+            for api in (ExpressPigeon("key"), ExpressPigeon("key", transport=UrllibTransport())):
+                api.ROOT = server.url
+                archive = api.messages.bulk_archive(messages(3000))
+                response = api.messages.send_message_bulk(archive)
+                lines = response.splitlines()
+                self.assertEqual(len(lines), 3000)
+                self.assertTrue('"email queued"' in lines[0])
+                self.assertEqual(archive.count, 3000)
+        self.assertEqual(len(fake.messages), 6000)
+
+    def test_async_client_streams_chunked(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                return await api.messages.send_message_bulk(api.messages.bulk_archive(messages(3000)))
+
+        fake = FakeApi()
+        with FakeServer(fake) as server:
+            response = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+        self.assertEqual(len(response.splitlines()), 3000)
+        self.assertEqual(len(fake.messages), 3000)
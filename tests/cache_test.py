@@ -0,0 +1,82 @@
+import asyncio
+import json
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.aio import AsyncExpressPigeon
+from expresspigeon.cache import MISSING, ResponseCache, endpoint_template
+from tests import LocalApiServer
+
+
+def app(method, path, headers, body):
+    if method == "GET" and path == "/lists":
+        return 200, {"Content-Type": "application/json"}, json.dumps([{"id": 1, "name": "Customers"}])
+    if method == "GET" and path.startswith("/dictionaries/"):
+        return 404, {"Content-Type": "application/json"}, json.dumps({"code": 404, "message": "not found"})
+    return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success"})
+
+
+class CacheTest(unittest.TestCase):
+    def gets(self, server, path):
+        return len([r for r in server.requests if r[0] == "GET" and r[1] == path])
+
+    def test_endpoint_template(self):
+        self.assertEqual(endpoint_template("dictionaries/42"), "dictionaries/{id}")
+        self.assertEqual(endpoint_template("contacts?email=a@e.e"), "contacts")
+        self.assertEqual(endpoint_template("messages/8ea5b4dc-e5cd-4e93-b3c1-40e6a1a5b0e2"), "messages/{id}")
+        self.assertEqual(endpoint_template("lists/upload_status/u1"), "lists/upload_status/{id}")
+        self.assertEqual(endpoint_template("auto_responders/7/ab12/spam"), "auto_responders/{id}/{id}/spam")
+        self.assertEqual(endpoint_template("flows/7/triggers/list"), "flows/{id}/triggers/list")
+        self.assertEqual(endpoint_template("messages/bulk"), "messages/bulk")
+
+    def test_cached_until_the_client_writes(self):
+        with LocalApiServer(app) as server:
+            api = ExpressPigeon("key", cache=True)
+            api.ROOT = server.url
+            first = api.lists.find_all()
+            self.assertEqual(api.lists.find_all(), first)
+            self.assertEqual(self.gets(server, "/lists"), 1)
+            self.assertEqual(api.cache.hits, 1)
+
+            api.lists.delete(1)
+            api.lists.find_all()
+            self.assertEqual(self.gets(server, "/lists"), 2)
+
+            api.contacts.upsert(1, [{"email": "a@e.e"}])
+            api.lists.find_all()
+            self.assertEqual(self.gets(server, "/lists"), 3)
+
+            api.dictionaries.lookup(5)
+            api.dictionaries.lookup(5)
+            self.assertEqual(self.gets(server, "/dictionaries/5"), 2)
+
+            api.campaigns.get_all()
+            api.campaigns.get_all()
+            self.assertEqual(self.gets(server, "/campaigns"), 2)
+
+    def test_ttl_and_lru(self):
+        cache = ResponseCache(ttls={"flows": 0}, maxsize=2)
+        cache.put("flows", [1])
+        self.assertTrue(cache.get("flows") is MISSING)
+        cache.put("lists", [1])
+        cache.put("dictionaries", [2])
+        cache.get("lists")
+        cache.put("dictionaries/3", 3)
+        self.assertEqual(cache.get("lists"), [1])
+        self.assertTrue(cache.get("dictionaries") is MISSING)
+        self.assertEqual(cache.evictions, 1)
+
+        stale = cache.generation("lists")
+        cache.mutated("lists/1")
+        cache.put("lists", [9], stale)
+        self.assertTrue(cache.get("lists") is MISSING)
+
+    def test_async_client(self):
+        async def run(server):
+            async with AsyncExpressPigeon("key", cache=True) as api:
+                api.ROOT = server.url
+                await api.auto_responders.find_all()
+                await api.auto_responders.find_all()
+
+        with LocalApiServer(app) as server:
+            asyncio.new_event_loop().run_until_complete(run(server))
+            self.assertEqual(self.gets(server, "/auto_responders"), 1)
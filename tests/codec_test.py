@@ -0,0 +1,52 @@
+import json
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.codec import AVAILABLE, get_codec
+from expresspigeon.records import LazyList, LazyRecord, lazy_loads
+from tests import LocalApiServer
+
+PAYLOAD = json.dumps({"code": 200, "status": "success", "list": {"id": 7, "name": "Customers"},
+                      "contacts": ["a@e.e", "b@e.e"],
+                      "custom_fields": {"my custom field": "x"}}).encode("utf-8")
+
+
+class CodecTest(unittest.TestCase):
+    def test_backends_decode_the_same_records(self):
+        expected = get_codec("json").loads_records(PAYLOAD)
+        for name in AVAILABLE:
+            codec = get_codec(name)
+            res = codec.loads_records(PAYLOAD)
+            self.assertEqual(res, expected)
+            self.assertEqual(res.list.name, "Customers")
+            self.assertEqual(res.custom_fields, {"my custom field": "x"})
+            self.assertEqual(json.loads(codec.dumps({"to": "a@e.e", "n": [1, 2]})), {"to": "a@e.e", "n": [1, 2]})
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, get_codec, "marshmallow")
+
+    def test_lazy_record_parses_on_first_access(self):
+        res = lazy_loads(PAYLOAD, get_codec("json"))
+        self.assertTrue(isinstance(res, LazyRecord))
+        self.assertEqual(res._raw, PAYLOAD)
+        self.assertEqual(res.status, "success")
+        self.assertTrue(res._raw is None)
+        self.assertTrue(isinstance(res.list, LazyRecord))
+        self.assertTrue(res.list is res.list)
+        self.assertEqual(res.list.id, 7)
+        self.assertEqual(res.custom_fields["my custom field"], "x")
+        self.assertEqual(list(res.contacts), ["a@e.e", "b@e.e"])
+        self.assertRaises(AttributeError, getattr, res, "missing")
+
+    def test_lazy_client_and_paging(self):
+        def app(method, path, headers, body):
+            start = 1000 if "from_id" in path else 0
+            rows = [{"id": i, "email": "u{0}@e.e".format(i)} for i in range(start + 1, start + 1001)][:1500 - start]
+            return 200, {"Content-Type": "application/json"}, json.dumps(rows)
+
+        with LocalApiServer(app) as server:
+            api = ExpressPigeon("key", lazy=True, codec="json")
+            api.ROOT = server.url
+            page = api.messages.reports()
+            self.assertTrue(isinstance(page, LazyList))
+            self.assertEqual(page[1].email, "u2@e.e")
+            self.assertEqual(len(list(api.messages.iter_reports())), 1500)
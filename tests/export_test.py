@@ -0,0 +1,98 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon, ExpressPigeonException
+from tests import LocalApiServer
+
+HEADER = '"Email", "First name", "Last name"\n'
+ROWS = 50000
+
+
+def export_app(method, path, headers, body):
+    if path == "/lists/404/csv":
+        return 404, {"Content-Type": "application/json"}, '{"code": 404, "status": "error", "message": "list=404 not found"}'
+    if path == "/lists/403/csv":
+        return 403, {"Content-Type": "application/json"}, \
+            '{"code": 403, "status": "error", "message": "' + "denied " * 100000 + '"}'
+    lines = [HEADER, '"multi@e.e","Line\none",\n'] + ['"u{0}@e.e",,\n'.format(i) for i in range(ROWS)]
+    return 200, {"Content-Type": "text/csv"}, "".join(lines)
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_rows(self, rows):
+        self.assertEqual(rows[0], ["Email", "First name", "Last name"])
+        self.assertEqual(rows[1], ["multi@e.e", "Line\none", ""])
+        self.assertEqual(rows[-1], ["u{0}@e.e".format(ROWS - 1), "", ""])
+        self.assertEqual(len(rows), ROWS + 2)
+
+    def test_iter_csv(self):
+        with LocalApiServer(export_app) as server:
+            for keep_alive in (True, False):
+                api = ExpressPigeon("key", keep_alive=keep_alive)
+                api.ROOT = server.url
+                reports = []
+                self.check_rows(list(api.lists.iter_csv(1, progress=reports.append)))
+                self.assertTrue(reports[-1].done)
+                self.assertTrue(reports[-1].bytes > ROWS * 10)
+            self.assertEqual(api.lists.csv(1).split("\n")[0], HEADER.strip())
+
+    def test_pooled_connection_is_reused_after_export(self):
+        with LocalApiServer(export_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            list(api.lists.iter_csv(1))
+            list(api.lists.iter_csv(1))
+            self.assertEqual(server.connections, 1)
+
+    def test_export_csv(self):
+        path = os.path.join(self.directory, "export.csv")
+        with LocalApiServer(export_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            progress = api.lists.export_csv(1, path)
+            self.assertEqual(progress.bytes, os.path.getsize(path))
+            self.assertTrue(progress.bytes_per_second > 0)
+            with open(path) as f:
+                self.assertEqual(f.readline(), HEADER)
+
+    def test_error_raises(self):
+        with LocalApiServer(export_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            self.assertRaises(ExpressPigeonException, list, api.lists.iter_csv(404))
+
+    def test_async_export(self):
+        path = os.path.join(self.directory, "export.csv")
+
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                rows = [row async for row in api.lists.iter_csv(1)]
+                progress = await api.lists.export_csv(1, path)
+                return rows, progress
+
+        with LocalApiServer(export_app) as server:
+            rows, progress = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+            self.check_rows(rows)
+            self.assertEqual(progress.bytes, os.path.getsize(path))
+            self.assertEqual(server.connections, 1)
+
+    def test_async_error_raises_with_the_whole_body(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                with self.assertRaises(ExpressPigeonException) as raised:
+                    await api.open_stream("lists/403/csv")
+                return str(raised.exception)
+
+        with LocalApiServer(export_app) as server:
+            message = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+        self.assertEqual(len(message), len("denied ") * 100000)
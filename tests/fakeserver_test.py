@@ -0,0 +1,77 @@
+import os
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.fakeserver import FakeApi, FakeServer
+from expresspigeon.retry import RetryPolicy
+
+HERE = os.path.split(os.path.abspath(__file__))[0]
+
+
+class FakeServerTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeApi()
+        self.server = FakeServer(self.fake).start()
+        self.api = ExpressPigeon("key")
+        self.api.ROOT = self.server.url
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_lists_and_contacts(self):
+        created = self.api.lists.create("Customers", "Shop", "shop@example.net")
+        list_id = created.list.id
+        self.assertEqual(created.message, "list={0} created/updated successfully".format(list_id))
+        res = self.api.contacts.upsert(list_id, [{"email": "john@doe.net", "first_name": "John"}])
+        self.assertEqual(list(res.contacts), ["john@doe.net"])
+        self.assertEqual(self.api.contacts.find_by_email("john@doe.net").first_name, "John")
+
+        upload = self.api.lists.upload(list_id, os.path.join(HERE, "emails.csv"))
+        report = self.api.lists.upload_status(upload.upload_id).report
+        self.assertEqual(report.imported, 2)
+        rows = list(self.api.lists.iter_csv(list_id))
+        self.assertEqual(rows[0], ["Email", "First name", "Last name"])
+        self.assertEqual(sorted(r[0] for r in rows[1:]), ["alice@e.e", "ann@a.a", "john@doe.net"])
+        self.assertEqual(self.api.lists.find_all()[0].contact_count, 3)
+
+        other = self.api.lists.create("Other", "Shop", "shop@example.net").list.id
+        self.api.contacts.move(list_id, other, ["john@doe.net"])
+        self.assertEqual([l.id for l in self.api.contacts.find_by_email("john@doe.net").lists], [other])
+        self.assertEqual(self.api.contacts.delete("ann@a.a").code, 200)
+        self.assertEqual(self.api.contacts.find_by_email("ann@a.a").code, 404)
+
+    def test_messages_and_reports(self):
+        sent = self.api.messages.send_message(1, "a@e.e", "b@e.e", "Shop", "Hi", merge_fields={"n": 1})
+        self.assertEqual(sent.message, "email queued")
+        self.assertEqual(self.api.messages.report(sent.id).email, "a@e.e")
+        bulk = self.api.messages.send_message_bulk(os.path.join(HERE, "bulk.zip"))
+        self.assertEqual(len(bulk.splitlines()), 2)
+        self.fake.seed_messages(2500)
+        self.assertEqual(len(self.api.messages.reports()), 1000)
+        self.assertEqual(len(list(self.api.messages.iter_reports())), 2503)
+
+    def test_campaigns_and_other_endpoints(self):
+        list_id = self.api.lists.create("Customers", "Shop", "shop@example.net").list.id
+        self.api.contacts.upsert(list_id, [{"email": "u{0}@e.e".format(i)} for i in range(10)])
+        campaign_id = self.api.campaigns.send(list_id, 1, "Launch", "Shop", "shop@example.net", "Hi", False) \
+            .campaign_id
+        self.assertEqual(self.api.campaigns.report(campaign_id).delivered, 10)
+        self.assertEqual(len(self.api.campaigns.opened(campaign_id)), 4)
+        self.assertEqual(len(self.api.campaigns.non_opens(campaign_id)), 6)
+        self.assertEqual(self.api.campaigns.delete(campaign_id).code, 400)
+
+        ids = self.api.dictionaries.create([{"name": "d", "values": [{"name": "a", "value": "b"}]}]).ids
+        self.assertEqual(self.api.dictionaries.lookup(ids[0]).values[0].value, "b")
+        flow_id = self.fake.add_flow("Welcome")
+        self.assertEqual(self.api.flows.get_all()[0].name, "Welcome")
+        self.assertEqual(self.api.flows.start(flow_id, "a@e.e").code, 200)
+        auto_responder_id = self.fake.add_auto_responder("Drip", parts=2)
+        self.assertEqual(len(self.api.auto_responders.report(auto_responder_id)), 2)
+        self.assertEqual(self.api.templates.delete(99).code, 404)
+
+    def test_error_injection(self):
+        self.fake.error_rate = 1.0
+        self.assertEqual(self.api.lists.find_all().code, 503)
+        self.fake.error_rate = 0.5
+        api = ExpressPigeon("key", retry=RetryPolicy(max_attempts=20, backoff=0.0))
+        api.ROOT = self.server.url
+        self.assertEqual(api.lists.find_all(), [])
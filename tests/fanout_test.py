@@ -0,0 +1,75 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.fanout import imap_unordered
+from tests import LocalApiServer
+
+
+def messages_app(method, path, headers, body):
+    params = json.loads(body.decode("utf-8"))
+    if params["to"].startswith("bad"):
+        return 400, {"Content-Type": "application/json"}, json.dumps(
+            {"code": 400, "status": "error", "message": "Email in the 'to' field is not valid."})
+    return 200, {"Content-Type": "application/json"}, json.dumps(
+        {"code": 200, "status": "success", "message": "email queued", "id": "id-" + params["to"],
+         "merge_fields": params["merge_fields"]})
+
+
+class SendManyTest(unittest.TestCase):
+    def test_results_per_recipient(self):
+        with LocalApiServer(messages_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            run = api.messages.send_many(1, ["a@e.e", ("b@e.e", {"n": 2}), {"to": "bad"}], reply_to="r@e.e",
+                                         from_name="me", subject="Hi", merge_fields={"n": 1, "m": 1},
+                                         concurrency=2)
+            results = dict((r.to, r) for r in run)
+            self.assertEqual(results["a@e.e"].message_id, "id-a@e.e")
+            self.assertEqual(results["b@e.e"].response.merge_fields.n, 2)
+            self.assertEqual(results["b@e.e"].response.merge_fields.m, 1)
+            self.assertEqual(results["bad"].message_id, None)
+            self.assertEqual(results["bad"].error, "Email in the 'to' field is not valid.")
+            self.assertEqual(run.stats.sent, 2)
+            self.assertEqual(run.stats.failed, 1)
+            self.assertTrue(run.stats.throughput > 0)
+            self.assertTrue(run.stats.percentile(99) >= run.stats.percentile(50) > 0)
+
+    def test_async_send_many(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                run = api.messages.send_many(1, ["u{0}@e.e".format(i) for i in range(30)], reply_to="r@e.e",
+                                             from_name="me", subject="Hi", concurrency=5)
+                return [r async for r in run], run.stats
+
+        with LocalApiServer(messages_app) as server:
+            results, stats = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+            self.assertEqual(len(results), 30)
+            self.assertEqual(stats.sent, 30)
+
+    def test_imap_unordered_bounds_in_flight_work(self):
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0, "consumed": 0}
+
+        def work(item):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.005)
+            with lock:
+                state["running"] -= 1
+            return item * 2
+
+        def items():
+            for i in range(50):
+                state["consumed"] += 1
+                yield i
+
+        results = imap_unordered(work, items(), 4)
+        first = next(results)
+        self.assertTrue(state["consumed"] <= 5)
+        self.assertEqual(sorted([first] + list(results)), [i * 2 for i in range(50)])
+        self.assertTrue(state["peak"] <= 4)
@@ -0,0 +1,61 @@
+import json
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.metrics import Histogram
+from tests import LocalApiServer
+
+
+def app(method, path, headers, body):
+    if path == "/messages/2":
+        return 404, {"Content-Type": "application/json"}, json.dumps({"code": 404, "message": "not found"})
+    return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success", "id": 1})
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        h = Histogram(buckets=(1.0, 2.0, 4.0))
+        for value in (0.5, 1.5, 1.5, 3.0):
+            h.observe(value)
+        self.assertEqual(h.counts, [1, 2, 1, 0])
+        self.assertEqual(h.percentile(50), 1.5)
+        self.assertEqual(h.percentile(100), 4.0)
+
+    def test_calls_are_recorded_per_template(self):
+        observed = []
+
+        class HookedExpressPigeon(ExpressPigeon):
+            def response_hook(self, observation):
+                observed.append(observation)
+
+        with LocalApiServer(app) as server:
+            api = HookedExpressPigeon("key", metrics=True)
+            api.ROOT = server.url
+            api.messages.report(1)
+            api.messages.report(2)
+            api.messages.send_message(1, "a@e.e", "b@e.e", "B", "s")
+
+        self.assertEqual([o.template for o in observed], ["messages/{id}", "messages/{id}", "messages"])
+        first = observed[0]
+        self.assertTrue(first.connect > 0 and first.ttfb >= first.connect and first.total >= first.ttfb)
+        self.assertEqual(observed[1].connect, 0.0)
+
+        snapshot = api.metrics.snapshot()
+        report = snapshot["GET messages/{id}"]
+        self.assertEqual(report["requests"], 2)
+        self.assertEqual(report["statuses"], {200: 1, 404: 1})
+        self.assertEqual(report["latency"]["total"]["count"], 2)
+        self.assertTrue(report["response_bytes"] > 0)
+        self.assertTrue(snapshot["POST messages"]["request_bytes"] > 0)
+
+        text = api.metrics.prometheus()
+        self.assertTrue('expresspigeon_client_responses_total{endpoint="messages/{id}",method="GET",status="404"} 1'
+                        in text)
+        self.assertTrue('expresspigeon_client_request_duration_seconds_count{endpoint="messages",method="POST",'
+                        'phase="total"} 1' in text)
+        self.assertTrue("# TYPE expresspigeon_client_request_duration_seconds histogram" in text)
+
+    def test_errors_are_recorded(self):
+        api = ExpressPigeon("key", keep_alive=False, metrics=True)
+        api.ROOT = "http://127.0.0.1:1/"
+        self.assertRaises(Exception, api.lists.find_all)
+        self.assertEqual(api.metrics.snapshot()["GET lists"]["errors"], {"URLError": 1})
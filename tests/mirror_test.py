@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.aio import AsyncInProcessTransport
+from expresspigeon.codec import to_records
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.mirror import ContactMirror
+from expresspigeon.transport import InProcessTransport
+
+
+class CountingApi(FakeApi):
+    def __init__(self):
+        FakeApi.__init__(self)
+        self.requests = []
+
+    def __call__(self, method, path, headers, body):
+        self.requests.append((method, path))
+        return FakeApi.__call__(self, method, path, headers, body)
+
+
+class ContactMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = CountingApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+        self.customers = self.api.lists.create("Customers", "Shop", "shop@example.net").list.id
+        self.leads = self.api.lists.create("Leads", "Shop", "shop@example.net").list.id
+        self.api.contacts.upsert(self.customers, [{"email": "u{0}@e.e".format(i), "first_name": "U{0}".format(i)}
+                                                  for i in range(20)])
+        self.api.contacts.upsert(self.leads, [{"email": "u0@e.e"}, {"email": "lead@e.e"}])
+
+    def test_lookups_are_local(self):
+        mirror = ContactMirror(self.api)
+        self.assertEqual(sorted(mirror.refresh()), [self.customers, self.leads])
+        del self.fake.requests[:]
+        contact = mirror.find_by_email("u0@e.e")
+        self.assertEqual(contact.first_name, "U0")
+        self.assertEqual([l.id for l in contact.lists], [self.customers, self.leads])
+        self.assertEqual(mirror.find_by_email("nobody@e.e"), None)
+        self.assertTrue(mirror.is_member("lead@e.e", self.leads))
+        self.assertEqual(len(mirror.emails(self.customers)), 20)
+        self.assertEqual(self.fake.requests, [])
+
+    def test_writes_go_through(self):
+        mirror = ContactMirror(self.api)
+        mirror.refresh()
+        self.api.contacts.upsert(self.leads, [{"email": "new@e.e", "first_name": "New"}])
+        self.api.contacts.move(self.customers, self.leads, ["u1@e.e"])
+        self.api.contacts.delete("u2@e.e")
+        self.api.contacts.delete("u0@e.e", self.leads)
+        self.api.contacts.delete("missing@e.e")
+        self.assertEqual(mirror.find_by_email("new@e.e").first_name, "New")
+        self.assertEqual([l.id for l in mirror.find_by_email("u1@e.e").lists], [self.leads])
+        self.assertEqual(mirror.find_by_email("u2@e.e"), None)
+        self.assertFalse(mirror.is_member("u0@e.e", self.leads))
+
+        # local contact counts match the API's, so nothing needs exporting again
+        self.assertEqual(mirror.refresh(), [])
+        self.assertEqual(mirror.exports, 2)
+
+    def test_streamed_upserts_go_through(self):
+        mirror = ContactMirror(self.api)
+        mirror.refresh()
+        run = self.api.contacts.upsert_stream(self.leads, ({"email": "s{0}@e.e".format(i)} for i in range(25)),
+                                              batch_size=10)
+        self.assertEqual(sum(len(result.contacts) for result in run), 25)
+        self.assertEqual(len(mirror.emails(self.leads)), 27)
+        self.assertEqual(mirror.refresh(), [])
+
+    def test_lookups_and_writes_during_an_export(self):
+        exporting = threading.Event()
+        release = threading.Event()
+        iter_csv = self.api.lists.iter_csv
+
+        def slow_iter_csv(list_id, progress=None):
+            rows = iter_csv(list_id, progress)
+            yield next(rows)
+            if list_id == self.customers and not release.is_set():
+                exporting.set()
+                release.wait(5)
+            for row in rows:
+                yield row
+
+        mirror = ContactMirror(self.api, max_age=0.0)
+        mirror.refresh()
+        exports = mirror.exports
+        self.api.lists.iter_csv = slow_iter_csv
+        refresh = threading.Thread(target=mirror.refresh, args=(True,))
+        refresh.start()
+        try:
+            self.assertTrue(exporting.wait(5))
+            started = time.time()
+            # stale, but another thread is refreshing: answered from the mirror without waiting for the export
+            self.assertEqual(mirror.find_by_email("u3@e.e").first_name, "U3")
+            self.api.contacts.upsert(self.customers, [{"email": "during@e.e", "first_name": "D"}])
+            self.assertTrue(mirror.is_member("during@e.e", self.customers))
+            self.assertTrue(time.time() - started < 1.0)
+        finally:
+            release.set()
+            refresh.join()
+        self.assertEqual(mirror.exports, exports + 2)
+        self.assertEqual(mirror.find_by_email("during@e.e").first_name, "D")
+
+    def test_upserted_skips_contacts_without_email(self):
+        mirror = ContactMirror(self.api)
+        mirror.refresh()
+        mirror.upserted(self.leads, [{"first_name": "Nobody"}, {"email": "ok@e.e"}],
+                        to_records({"status": "success", "code": 200}))
+        self.assertTrue(mirror.is_member("ok@e.e", self.leads))
+        self.assertEqual(len(mirror.emails(self.leads)), 3)
+
+    def test_async_client_is_refused(self):
+        api = AsyncExpressPigeon("key", transport=AsyncInProcessTransport(self.fake))
+        self.assertRaises(ExpressPigeonException, ContactMirror, api)
+        self.assertEqual(api.mirror, None)
+
+    def test_incremental_refresh_and_staleness(self):
+        mirror = ContactMirror(self.api, max_age=None, attach=False)
+        mirror.refresh()
+        self.api.contacts.upsert(self.leads, [{"email": "other@e.e"}])
+        self.assertEqual(mirror.find_by_email("other@e.e"), None)
+        self.assertEqual(mirror.refresh(), [self.leads])
+        self.assertEqual(mirror.find_by_email("other@e.e").email, "other@e.e")
+
+        self.api.lists.delete(self.leads)
+        mirror.refresh()
+        self.assertEqual(mirror.find_by_email("lead@e.e"), None)
+        self.assertEqual(mirror.refresh(force=True), [self.customers])
+
+        stale = ContactMirror(self.api, max_age=0.0, attach=False)
+        stale.refresh()
+        self.api.contacts.upsert(self.customers, [{"email": "late@e.e"}])
+        self.assertEqual(stale.find_by_email("late@e.e").email, "late@e.e")
+
+    def test_mirror_file_survives_restart(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "mirror.db")
+            mirror = ContactMirror(self.api, path)
+            mirror.refresh()
+            mirror.close()
+            self.assertEqual(self.api.mirror, None)
+            reopened = ContactMirror(self.api, path)
+            self.assertEqual(reopened.refresh(), [])
+            self.assertTrue(reopened.is_member("u3@e.e", self.customers))
+            reopened.close()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,128 @@
+import asyncio
+import email
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.multipart import MultipartBody
+from tests import LocalApiServer
+
+CSV = "{0}{1}emails.csv".format(os.path.split(os.path.abspath(__file__))[0], os.path.sep)
+BULK = "{0}{1}bulk.zip".format(os.path.split(os.path.abspath(__file__))[0], os.path.sep)
+
+
+def upload_app(method, path, headers, body):
+    return 200, {"Content-Type": "application/json"}, json.dumps(
+        {"code": 200, "status": "success", "message": "file uploaded successfully", "upload_id": "u1",
+         "size": int(headers["Content-Length"])})
+
+
+class MultipartBodyTest(unittest.TestCase):
+    def test_wire_format(self):
+        body = MultipartBody("b0undary").add_field("template_id", 1).add_file("file", CSV).close()
+        with open(CSV, "rb") as f:
+            content = f.read()
+        expected = (b'--b0undary\r\nContent-Disposition: form-data; name="template_id"\r\n\r\n1\r\n'
+                    b'--b0undary\r\nContent-Disposition: form-data; name="file"; filename="emails.csv"\r\n'
+                    b'Content-Type: application/octet-stream\r\n\r\n' + content + b'\r\n--b0undary--\r\n')
+        self.assertEqual(b"".join(body), expected)
+        self.assertEqual(len(body), len(expected))
+        self.assertEqual(body.content_type, "multipart/form-data; boundary=b0undary")
+
+
+def form_parts(request):
+    method, path, headers, body = request
+    message = b"Content-Type: " + headers["Content-type"].encode() + b"\r\n\r\n" + body
+    return email.message_from_bytes(message).get_payload()
+
+
+class MessagesMultipartTest(unittest.TestCase):
+    def test_attachment_form(self):
+        with LocalApiServer(upload_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            api.messages.send_message_attachment(1, [BULK, CSV], "bob@e.e", "r@e.e", "me", "Hi",
+                                                 merge_fields={"name": "Bob"})
+        parts = form_parts(server.requests[0])
+        fields = dict((p.get_param("name", header="content-disposition"), p) for p in parts[2:])
+        self.assertEqual([p.get_filename() for p in parts[:2]], ["bulk.zip", "emails.csv"])
+        with open(BULK, "rb") as f:
+            self.assertEqual(parts[0].get_payload(decode=True), f.read())
+        self.assertEqual(fields["template_id"].get_payload(), "1")
+        self.assertEqual(fields["from"].get_payload(), "me")
+        self.assertEqual(fields["to"].get_payload(), "bob@e.e")
+        self.assertEqual(fields["view_online"].get_payload(), "False")
+        self.assertEqual(fields["click_tracking"].get_payload(), "True")
+        self.assertEqual(json.loads(fields["merge_fields"].get_payload()), {"name": "Bob"})
+
+    def test_bulk_form(self):
+        with LocalApiServer(upload_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            api.messages.send_message_bulk(BULK)
+            self.assertEqual(server.requests[0][1], "/messages/bulk")
+        part = form_parts(server.requests[0])[0]
+        self.assertEqual(part.get_param("name", header="content-disposition"), "file")
+        self.assertEqual(part.get_filename(), "bulk.zip")
+
+
+class StreamingUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.big = os.path.join(self.directory, "big.csv")
+        with open(self.big, "wb") as f:
+            line = b"someone@example.net,Some,One\n"
+            for i in range(20 * 1024 * 1024 // len(line)):
+                f.write(line)
+        self.size = os.path.getsize(self.big)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def upload(self, keep_alive):
+        with LocalApiServer(upload_app, discard_bodies=True) as server:
+            api = ExpressPigeon("key", keep_alive=keep_alive)
+            api.ROOT = server.url
+            tracemalloc.start()
+            try:
+                res = api.lists.upload(1, self.big)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(res.upload_id, "u1")
+            self.assertTrue(res.size > self.size)
+            self.assertTrue(server.requests[0][1] == "/lists/1/upload")
+            return peak
+
+    def test_pooled_upload_memory_is_flat(self):
+        self.assertTrue(self.upload(True) < 2 * 1024 * 1024)
+
+    def test_urllib_upload_memory_is_flat(self):
+        self.assertTrue(self.upload(False) < 2 * 1024 * 1024)
+
+    def test_large_attachment_memory_is_flat(self):
+        with LocalApiServer(upload_app, discard_bodies=True) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            tracemalloc.start()
+            try:
+                api.messages.send_message_attachment(1, [self.big], "bob@e.e", "r@e.e", "me", "Hi")
+                api.messages.send_message_bulk(self.big)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertTrue(peak < 2 * 1024 * 1024)
+
+    def test_async_upload(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                return await api.lists.upload(1, self.big)
+
+        with LocalApiServer(upload_app, discard_bodies=True) as server:
+            res = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+            self.assertEqual(res.upload_id, "u1")
+            self.assertTrue(res.size > self.size)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon, ExpressPigeonException
+from tests import LocalApiServer
+
+try:
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from urlparse import urlsplit, parse_qs
+
+TOTAL = 2500
+
+
+def paged_app(method, path, headers, body):
+    parts = urlsplit(path)
+    query = parse_qs(parts.query)
+    if "start_date" in query and query["start_date"][0] == "bad":
+        return 400, {"Content-Type": "application/json"}, json.dumps(
+            {"code": 400, "status": "error", "message": "invalid 'start_date' or 'end_date'"})
+    start = int(query["from_id"][0]) if "from_id" in query else 0
+    rows = [{"id": i, "email": "u{0}@e.e".format(i)} for i in range(start + 1, min(start + 1000, TOTAL) + 1)]
+    return 200, {"Content-Type": "application/json"}, json.dumps(rows)
+
+
+class PagingTest(unittest.TestCase):
+    def test_iter_all_walks_every_page(self):
+        with LocalApiServer(paged_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            ids = [c.id for c in api.campaigns.iter_all()]
+            self.assertEqual(ids, list(range(1, TOTAL + 1)))
+            self.assertEqual([r[1] for r in server.requests],
+                             ["/campaigns", "/campaigns?from_id=1000", "/campaigns?from_id=2000"])
+
+    def test_iter_reports_without_prefetch_from_id(self):
+        with LocalApiServer(paged_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            ids = [r.id for r in api.messages.iter_reports(from_id="1500", prefetch=False)]
+            self.assertEqual(ids, list(range(1501, TOTAL + 1)))
+
+    def test_iteration_is_lazy(self):
+        with LocalApiServer(paged_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            reports = api.messages.iter_reports(prefetch=False)
+            self.assertEqual(next(reports).id, 1)
+            self.assertEqual(len(server.requests), 1)
+
+    def test_error_page_raises(self):
+        with LocalApiServer(paged_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            self.assertRaises(ExpressPigeonException, list, api.messages.iter_reports("bad", "bad"))
+
+    def test_async_iter_all(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                return [c.id async for c in api.campaigns.iter_all()]
+
+        with LocalApiServer(paged_app) as server:
+            ids = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+            self.assertEqual(ids, list(range(1, TOTAL + 1)))
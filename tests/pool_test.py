@@ -0,0 +1,107 @@
+import json
+import socket
+import threading
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.pool import ConnectionPool, PoolTimeout, RemoteDisconnected
+from tests import LocalApiServer
+
+
+def json_app(method, path, headers, body):
+    return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success", "path": path})
+
+
+class PoolTest(unittest.TestCase):
+    def test_connections_are_reused_across_calls(self):
+        with LocalApiServer(json_app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            for i in range(5):
+                res = api.lists.find_all()
+                self.assertEqual(res.status, "success")
+                self.assertEqual(res.path, "/lists")
+            self.assertEqual(server.connections, 1)
+            self.assertEqual(server.requests[0][2]["X-auth-key"], "key")
+
+    def test_without_keep_alive_each_call_connects(self):
+        with LocalApiServer(json_app) as server:
+            api = ExpressPigeon("key", keep_alive=False)
+            api.ROOT = server.url
+            for i in range(3):
+                self.assertEqual(api.lists.find_all().status, "success")
+            self.assertEqual(server.connections, 3)
+
+    def test_error_body_is_decoded(self):
+        def app(method, path, headers, body):
+            return 404, {"Content-Type": "application/json"}, '{"code": 404, "status": "error", "message": "nope"}'
+
+        with LocalApiServer(app) as server:
+            api = ExpressPigeon("key")
+            api.ROOT = server.url
+            res = api.lists.delete(-1)
+            self.assertEqual(res.code, 404)
+            self.assertEqual(res.message, "nope")
+
+    def test_pool_is_bounded(self):
+        with LocalApiServer(json_app) as server:
+            pool = ConnectionPool("http", "127.0.0.1", server.server_address[1], maxsize=2, block_timeout=0.05)
+            first, _ = pool.get_connection()
+            second, _ = pool.get_connection()
+            self.assertRaises(PoolTimeout, pool.get_connection)
+            pool.put_connection(first, reusable=False)
+            pool.put_connection(second, reusable=False)
+            third, reused = pool.get_connection()
+            self.assertFalse(reused)
+            pool.put_connection(third)
+
+    def test_idle_connections_are_evicted(self):
+        with LocalApiServer(json_app) as server:
+            pool = ConnectionPool("http", "127.0.0.1", server.server_address[1], idle_timeout=0)
+            pool.urlopen("GET", "/lists")
+            self.assertEqual(pool.idle_count(), 1)
+            threading.Event().wait(0.01)
+            conn, reused = pool.get_connection()
+            self.assertFalse(reused)
+            pool.put_connection(conn)
+            self.assertEqual(pool.connections_created, 2)
+
+    def test_connection_closed_by_server_is_not_reused(self):
+        with LocalApiServer(json_app) as server:
+            pool = ConnectionPool("http", "127.0.0.1", server.server_address[1])
+            pool.urlopen("GET", "/lists")
+            conn, _ = pool.get_connection()
+            conn.sock.shutdown(1)
+            pool.put_connection(conn)
+            threading.Event().wait(0.05)
+            self.assertEqual(pool.urlopen("GET", "/lists").status, 200)
+
+    def test_request_the_server_may_have_seen_is_not_replayed(self):
+        def slow_app(method, path, headers, body):
+            if method == "POST":
+                threading.Event().wait(0.5)
+            return json_app(method, path, headers, body)
+
+        with LocalApiServer(slow_app) as server:
+            api = ExpressPigeon("key", timeout=0.2)
+            api.ROOT = server.url
+            api.lists.find_all()
+            self.assertRaises(socket.timeout, api.messages.send_message, 1, "a@e.e", "r@e.e", "Shop", "Hi")
+            threading.Event().wait(0.5)
+            self.assertEqual([method for method, _, _, _ in server.requests], ["GET", "POST"])
+
+    def test_streamed_body_is_not_replayed(self):
+        def dropping_app(method, path, headers, body):
+            if method == "POST":
+                raise ValueError("connection dropped")
+            return json_app(method, path, headers, body)
+
+        with LocalApiServer(dropping_app) as server:
+            server.handle_error = lambda request, client_address: None
+            pool = ConnectionPool("http", "127.0.0.1", server.server_address[1])
+            pool.urlopen("GET", "/lists")
+            self.assertRaises(RemoteDisconnected, pool.urlopen, "POST", "/messages/bulk", body=b"zip")
+            self.assertEqual(len(server.requests), 3)
+            pool.urlopen("GET", "/lists")
+            self.assertRaises((socket.error, RemoteDisconnected), pool.urlopen, "POST", "/messages/bulk",
+                              body=iter([b"z", b"ip"]))
+            self.assertEqual(len(server.requests), 5)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.fakeserver import FakeApi, FakeServer
+from expresspigeon.retry import RetryPolicy
+from expresspigeon.transport import InProcessTransport
+from tests import LocalApiServer
+
+
+class RecordingApi(FakeApi):
+    def __init__(self):
+        FakeApi.__init__(self)
+        self.requests = []
+
+    def __call__(self, method, path, headers, body):
+        self.requests.append((method, path, headers, body))
+        return FakeApi.__call__(self, method, path, headers, body)
+
+
+class PreparedMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = RecordingApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+
+    def test_sends_what_send_message_sends(self):
+        self.api.messages.send_message(1, "a@e.e", "r@e.e", "Shop", "Hi", merge_fields={"n": 1, "name": "Al"})
+        prepared = self.api.messages.prepare(1, "r@e.e", "Shop", "Hi", merge_fields={"n": 0, "name": "Al"})
+        res = prepared.send("a@e.e", {"n": 1})
+        self.assertEqual(res.message, "email queued")
+        self.assertEqual(self.fake.messages[res.id]["email"], "a@e.e")
+
+        (method, path, headers, body), (p_method, p_path, p_headers, p_body) = self.fake.requests
+        self.assertEqual((p_method, p_path, p_headers), (method, path, headers))
+        self.assertEqual(json.loads(p_body.decode("utf-8")), json.loads(body.decode("utf-8")))
+
+        prepared = self.api.messages.prepare(1, "r@e.e", "Shop", "Hi")
+        self.assertEqual(json.loads(prepared.body("b@e.e").decode("utf-8"))["merge_fields"], None)
+        self.assertEqual(prepared.send("", {"n": 2}).code, 400)
+
+    def test_every_send_has_its_own_request(self):
+        with LocalApiServer(lambda method, path, headers, body: (200, {"Content-Type": "application/json"},
+                                                                 json.dumps({"code": 200, "id": 9}))) as server:
+            api = ExpressPigeon("key", retry=RetryPolicy(backoff=0.001))
+            api.ROOT = server.url
+            prepared = api.messages.prepare(1, "r@e.e", "Shop", "Hi")
+            prepared.send("a@e.e")
+            prepared.send("b@e.e", idempotency_key="k2")
+        keys = [headers["Idempotency-key"] for _, _, headers, _ in server.requests]
+        self.assertEqual(keys[1], "k2")
+        self.assertTrue(keys[0] and keys[0] != keys[1])
+        self.assertFalse(prepared.request.has_header("Idempotency-key"))
+        self.assertEqual(prepared.request.data, b"")
+
+    def test_async_client(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                prepared = api.messages.prepare(1, "r@e.e", "Shop", "Hi")
+                return await asyncio.gather(*[prepared.send("u{0}@e.e".format(i), {"n": i}) for i in range(5)])
+
+        with FakeServer(self.fake) as server:
+            results = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+        self.assertEqual(sorted(self.fake.messages[r.id]["email"] for r in results),
+                         ["u{0}@e.e".format(i) for i in range(5)])
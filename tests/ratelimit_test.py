@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.ratelimit import FileBucketStore, RateLimited, RateLimiter, rate_family, reserve
+from tests import LocalApiServer
+
+
+class RateLimitTest(unittest.TestCase):
+    def test_families(self):
+        self.assertEqual(rate_family("messages", "post"), "messages")
+        self.assertEqual(rate_family("messages?from_id=3", "get"), "reports")
+        self.assertEqual(rate_family("contacts?email=a@e.e", "get"), "contacts")
+        self.assertEqual(rate_family("campaigns/7/opened", "get"), "reports")
+        self.assertEqual(rate_family("flows/7/report", "post"), "reports")
+        self.assertEqual(rate_family("lists", "get"), "lists")
+
+    def test_bucket(self):
+        state, wait = reserve(None, 100.0, 2.0, 2)
+        self.assertEqual(wait, 0.0)
+        state, wait = reserve(state, 100.0, 2.0, 2)
+        self.assertEqual(wait, 0.0)
+        state, wait = reserve(state, 100.0, 2.0, 2)
+        self.assertAlmostEqual(wait, 0.5)
+        state, wait = reserve(state, 100.5, 2.0, 2)
+        self.assertEqual(wait, 0.0)
+
+    def test_throttled_calls_are_retried_then_raised(self):
+        calls = []
+
+        def app(method, path, headers, body):
+            calls.append(path)
+            if len(calls) < 3 or path == "/contacts":
+                return 429, {"Content-Type": "application/json", "Retry-After": "0.01"}, \
+                    json.dumps({"code": 429, "message": "too many requests"})
+            return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success", "id": 1})
+
+        with LocalApiServer(app) as server:
+            limiter = RateLimiter(max_retries=2)
+            api = ExpressPigeon("key", rate_limiter=limiter)
+            api.ROOT = server.url
+            self.assertEqual(api.messages.send_message(1, "a@e.e", "b@e.e", "B", "s").id, 1)
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(limiter.throttles, 2)
+
+            try:
+                api.contacts.upsert(1, [{"email": "a@e.e"}])
+                self.fail("expected RateLimited")
+            except RateLimited as e:
+                self.assertEqual(e.family, "contacts")
+                self.assertEqual(str(e), "too many requests")
+                self.assertEqual(e.response.code, 429)
+
+    def test_file_store_is_shared(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "buckets")
+            first = RateLimiter({"messages": (1.0, 1)}, store=FileBucketStore(path), max_wait=0)
+            second = RateLimiter({"messages": (1.0, 1)}, store=FileBucketStore(path), max_wait=0)
+            self.assertEqual(first.reserve("messages"), 0.0)
+            self.assertRaises(RateLimited, second.reserve, "messages")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_family_without_bucket_waits_for_retry_after(self):
+        def app(method, path, headers, body):
+            return 429, {"Content-Type": "application/json", "Retry-After": "0.1"}, \
+                json.dumps({"code": 429, "message": "too many requests"})
+
+        async def scenario(root, limiter):
+            async with AsyncExpressPigeon("key", rate_limiter=limiter) as api:
+                api.ROOT = root
+                await api.flows.get_all()
+
+        with LocalApiServer(app) as server:
+            limiter = RateLimiter(max_retries=2)
+            api = ExpressPigeon("key", rate_limiter=limiter)
+            api.ROOT = server.url
+            started = time.time()
+            self.assertRaises(RateLimited, api.lists.find_all)
+            self.assertEqual(len(server.requests), 3)
+            self.assertTrue(time.time() - started >= 0.2)
+
+            started = time.time()
+            self.assertRaises(RateLimited, asyncio.new_event_loop().run_until_complete, scenario(server.url, limiter))
+            self.assertEqual(len(server.requests), 6)
+            self.assertTrue(time.time() - started >= 0.2)
@@ -0,0 +1,21 @@
+import json
+import unittest
+from expresspigeon.records import object_hook
+
+
+class RecordsTest(unittest.TestCase):
+    def test_record_types_are_shared_per_key_signature(self):
+        rows = json.loads('[{"id": 1, "email": "a@e.e"}, {"id": 2, "email": "b@e.e"}, {"email": "c@e.e", "id": 3}]',
+                          object_hook=object_hook)
+        self.assertTrue(type(rows[0]) is type(rows[1]))
+        self.assertFalse(type(rows[0]) is type(rows[2]))
+        self.assertEqual(rows[1].email, "b@e.e")
+        self.assertEqual(rows[2]._asdict(), {"email": "c@e.e", "id": 3})
+        self.assertEqual(type(rows[0]).__name__, "EpResponse")
+        self.assertEqual(type(rows[0]).__slots__, ())
+
+    def test_keys_that_are_not_identifiers_stay_dicts(self):
+        contact = json.loads('{"email": "a@e.e", "custom_fields": {"my custom field": "x", "class": 1}}',
+                             object_hook=object_hook)
+        self.assertEqual(contact.email, "a@e.e")
+        self.assertEqual(contact.custom_fields, {"my custom field": "x", "class": 1})
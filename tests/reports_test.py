@@ -0,0 +1,62 @@
+import asyncio
+import math
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fakeserver import FakeApi, FakeServer
+from expresspigeon.reports import parse_timestamp
+from expresspigeon.transport import InProcessTransport
+
+
+class FullReportTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+        list_id = self.api.lists.create("Customers", "Shop", "shop@example.net").list.id
+        self.api.contacts.upsert(list_id, [{"email": "u{0:03d}@e.e".format(i)} for i in range(100)])
+        self.campaign_ids = [self.api.campaigns.send(list_id, 1, "C", "Shop", "shop@example.net", "Hi", False)
+                             .campaign_id for _ in range(3)]
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("1970-01-01T00:00:01.500+0000"), 1.5)
+        self.assertEqual(parse_timestamp("1970-01-01T01:00:00.000+0100"), 0.0)
+        self.assertEqual(parse_timestamp("1970-01-01T00:00:00Z"), 0.0)
+        self.assertTrue(math.isnan(parse_timestamp(None)))
+
+    def test_columns_joined_by_email(self):
+        reports = self.api.campaigns.full_report(self.campaign_ids, concurrency=4)
+        self.assertEqual(sorted(reports), self.campaign_ids)
+        report = reports[self.campaign_ids[0]]
+        self.assertEqual(report.summary.delivered, 100)
+        self.assertEqual(len(report), 100)
+        self.assertEqual(report.count("opened"), 34)
+        self.assertEqual(report.count("non_opens"), 66)
+        self.assertEqual(report.count("clicked"), 15)
+        self.assertEqual(report.emails_for("bounced"), ["u049@e.e", "u099@e.e"])
+
+        events = report.get("u007@e.e")
+        self.assertEqual(events["clicked"], [(parse_timestamp("2013-09-20T11:30:04.000+0000"),
+                                              "http://example.net/2")])
+        self.assertEqual(sorted(events), ["all_subscribers", "clicked", "delivered", "non_opens"])
+        self.assertTrue(math.isnan(report.events["non_opens"].times[0]))
+        self.assertFalse("nobody@e.e" in report)
+
+    def test_emails_are_interned_across_campaigns(self):
+        reports = self.api.campaigns.full_report(self.campaign_ids)
+        first, second = reports[self.campaign_ids[0]], reports[self.campaign_ids[1]]
+        email = first.emails[0]
+        self.assertTrue(second.emails[second.index[email]] is email)
+
+    def test_errors_raise(self):
+        self.assertRaises(ExpressPigeonException, self.api.campaigns.full_report, [self.campaign_ids[0], 999])
+
+    def test_async_full_report(self):
+        async def scenario(root):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                return await api.campaigns.full_report(self.campaign_ids, concurrency=5)
+
+        with FakeServer(self.fake) as server:
+            reports = asyncio.new_event_loop().run_until_complete(scenario(server.url))
+        self.assertEqual(reports[self.campaign_ids[2]].count("delivered"), 100)
+        self.assertEqual(reports[self.campaign_ids[2]].summary.opened, 33)
@@ -0,0 +1,68 @@
+import json
+import socket
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.retry import RetryPolicy
+from tests import LocalApiServer
+
+
+def flaky(failures):
+    calls = []
+
+    def app(method, path, headers, body):
+        calls.append(path)
+        if len(calls) <= failures:
+            return 503, {"Content-Type": "application/json"}, json.dumps({"code": 503, "message": "unavailable"})
+        return 200, {"Content-Type": "application/json"}, json.dumps({"code": 200, "status": "success", "id": 9})
+    return app
+
+
+class RetryTest(unittest.TestCase):
+    def client(self, server, **kwargs):
+        api = ExpressPigeon("key", retry=RetryPolicy(backoff=0.001, **kwargs))
+        api.ROOT = server.url
+        return api
+
+    def test_get_is_retried(self):
+        with LocalApiServer(flaky(2)) as server:
+            api = self.client(server)
+            self.assertEqual(api.messages.report(1).id, 9)
+            self.assertEqual(len(server.requests), 3)
+            stats = api.retry.stats()
+            self.assertEqual((stats["calls"], stats["retries"], stats["gave_up"]), (1, 2, 0))
+            self.assertEqual(stats["reasons"], {503: 2})
+            self.assertTrue(stats["added_latency"] > 0)
+
+    def test_gives_up_with_the_error_response(self):
+        with LocalApiServer(flaky(10)) as server:
+            api = self.client(server, max_attempts=3)
+            self.assertEqual(api.lists.delete(1).code, 503)
+            self.assertEqual(len(server.requests), 3)
+            self.assertEqual(api.retry.gave_up, 1)
+
+    def test_sends_carry_one_idempotency_key(self):
+        with LocalApiServer(flaky(1)) as server:
+            api = self.client(server)
+            self.assertEqual(api.messages.send_message(1, "a@e.e", "b@e.e", "B", "s").id, 9)
+            keys = [headers.get("Idempotency-key") for method, path, headers, body in server.requests]
+            self.assertEqual(len(keys), 2)
+            self.assertTrue(keys[0])
+            self.assertEqual(keys[0], keys[1])
+
+    def test_other_posts_are_not_retried(self):
+        with LocalApiServer(flaky(1)) as server:
+            api = self.client(server)
+            self.assertEqual(api.contacts.upsert(1, [{"email": "a@e.e"}]).code, 503)
+            self.assertEqual(len(server.requests), 1)
+            self.assertFalse("Idempotency-key" in server.requests[0][2])
+
+    def test_refused_connection_is_retried(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        api = ExpressPigeon("key", retry=RetryPolicy(max_attempts=2, backoff=0.001))
+        api.ROOT = "http://127.0.0.1:{0}/".format(port)
+        self.assertRaises(socket.error, api.contacts.upsert, 1, [])
+        self.assertEqual(api.retry.reasons, {"ConnectionRefusedError": 1})
+        self.assertEqual(api.retry.gave_up, 1)
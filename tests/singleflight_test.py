@@ -0,0 +1,53 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.aio import AsyncExpressPigeon
+from tests import LocalApiServer
+
+
+def held_until(predicate):
+    """ App answering only once predicate() holds, so that the calls under test overlap. """
+    def app(method, path, headers, body):
+        deadline = time.time() + 5
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.005)
+        return 200, {"Content-Type": "application/json"}, json.dumps([{"id": 1, "email": "a@e.e"}])
+    return app
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_threads_share_one_call(self):
+        api = ExpressPigeon("key", coalesce=True)
+        with LocalApiServer(held_until(lambda: api.single_flight.collapsed == 7)) as server:
+            api.ROOT = server.url
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(api.contacts.find_by_email("a@e.e")))
+                       for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(server.requests), 1)
+            self.assertEqual([r[0].email for r in results], ["a@e.e"] * 8)
+            self.assertEqual(api.single_flight.stats(), {"calls": 1, "collapsed": 7, "in_flight": 0})
+
+            api.contacts.find_by_email("a@e.e")
+            self.assertEqual(len(server.requests), 2)
+
+    def test_async_calls_share_one_call(self):
+        api = AsyncExpressPigeon("key", coalesce=True)
+
+        async def run(server):
+            api.ROOT = server.url
+            results = await asyncio.gather(*[api.dictionaries.lookup(3) for i in range(5)])
+            await api.close()
+            return results
+
+        with LocalApiServer(held_until(lambda: api.single_flight.collapsed == 4)) as server:
+            results = asyncio.new_event_loop().run_until_complete(run(server))
+            self.assertEqual(len(server.requests), 1)
+            self.assertEqual(len(results), 5)
+            self.assertEqual(api.single_flight.calls, 1)
@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from expresspigeon import ExpressPigeon
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.sync import Checkpoint
+from expresspigeon.transport import InProcessTransport
+
+
+class ReportSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "reports.checkpoint")
+        self.fake = FakeApi()
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_polls_fetch_only_new_rows(self):
+        self.fake.seed_messages(2500)
+        sync = self.api.messages.sync_reports(self.path)
+        pages = []
+        self.assertEqual(sync.poll(pages.append), 2500)
+        self.assertEqual([len(p) for p in pages], [1000, 1000, 500])
+        self.assertEqual(sync.from_id, 2500)
+        self.assertEqual(sync.watermark, pages[-1][-1].created_at)
+
+        self.assertEqual(sync.poll(pages.append), 0)
+        self.assertEqual(sync.requests, 4)
+        self.fake.seed_messages(3)
+        self.assertEqual([r.id for r in sync], [2501, 2502, 2503])
+        self.assertEqual(sync.requests, 5)
+        self.assertEqual(json.load(open(self.path))["synced"], 2503)
+        self.assertEqual(os.listdir(self.directory), ["reports.checkpoint"])
+
+    def test_restart_resumes_after_last_complete_page(self):
+        self.fake.seed_messages(1500)
+        sync = self.api.messages.sync_reports(self.path)
+        seen = []
+        for row in sync:
+            seen.append(row.id)
+            if len(seen) == 1200:
+                break
+        self.assertEqual(Checkpoint(self.path).load()["from_id"], 1000)
+
+        restarted = self.api.messages.sync_reports(self.path)
+        self.assertEqual([r.id for r in restarted][0], 1001)
+        self.assertEqual(restarted.from_id, 1500)
+
+    def test_failed_callback_keeps_page(self):
+        self.fake.seed_messages(10)
+        sync = self.api.messages.sync_reports(self.path)
+
+        def fail(rows):
+            raise ValueError("boom")
+
+        self.assertRaises(ValueError, sync.poll, fail)
+        self.assertEqual(Checkpoint(self.path).load(), {})
+        self.assertEqual(sync.poll(lambda rows: None), 10)
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.aio import AsyncInProcessTransport, AsyncPooledTransport
+from expresspigeon.fakeserver import FakeApi
+from expresspigeon.transport import InProcessTransport, PooledTransport, UrllibTransport
+from tests import LocalApiServer
+
+HERE = os.path.split(os.path.abspath(__file__))[0]
+
+
+def app(method, path, headers, body):
+    return 200, {"Content-Type": "application/json"}, json.dumps({"method": method, "path": path})
+
+
+class TransportTest(unittest.TestCase):
+    def test_default_transports(self):
+        self.assertTrue(isinstance(ExpressPigeon("key").transport, PooledTransport))
+        api = ExpressPigeon("key", keep_alive=False)
+        self.assertTrue(isinstance(api.transport, UrllibTransport))
+        self.assertEqual(api.pool, None)
+
+    def test_socket_transports(self):
+        with LocalApiServer(app) as server:
+            for transport in (UrllibTransport(timeout=5), PooledTransport(maxsize=2)):
+                api = ExpressPigeon("key", transport=transport)
+                api.ROOT = server.url
+                self.assertEqual(api.messages.report(7).path, "/messages/7")
+                self.assertEqual(api.lists.delete(3).method, "DELETE")
+                api.close()
+
+    def test_in_process(self):
+        fake = FakeApi()
+        api = ExpressPigeon("key", transport=InProcessTransport(fake))
+        list_id = api.lists.create("Customers", "Shop", "shop@example.net").list.id
+        api.contacts.upsert(list_id, [{"email": "john@doe.net", "first_name": "John"}])
+        upload = api.lists.upload(list_id, os.path.join(HERE, "emails.csv"))
+        self.assertEqual(api.lists.upload_status(upload.upload_id).report.imported, 2)
+        rows = list(api.lists.iter_csv(list_id))
+        self.assertEqual(sorted(r[0] for r in rows[1:]), ["alice@e.e", "ann@a.a", "john@doe.net"])
+
+        fake.seed_messages(1500)
+        self.assertEqual(len(list(api.messages.iter_reports())), 1500)
+        self.assertEqual(api.messages.report(999999).code, 404)
+
+    def test_in_process_auth(self):
+        api = ExpressPigeon("wrong", transport=InProcessTransport(FakeApi(auth_key="key")))
+        self.assertEqual(api.lists.find_all().code, 401)
+
+    def test_async_transports(self):
+        async def scenario(api, list_id):
+            async with api:
+                sent = await api.messages.send_message(1, "bob@e.e", "shop@example.net", "Shop", "Hi")
+                rows = [row async for row in api.lists.iter_csv(list_id)]
+                return sent, rows
+
+        self.assertTrue(isinstance(AsyncExpressPigeon("key").transport, AsyncPooledTransport))
+        fake = FakeApi()
+        blocking = ExpressPigeon("key", transport=InProcessTransport(fake))
+        list_id = blocking.lists.create("Customers", "Shop", "shop@example.net").list.id
+        blocking.contacts.upsert(list_id, [{"email": "john@doe.net"}])
+        api = AsyncExpressPigeon("key", transport=AsyncInProcessTransport(fake))
+        sent, rows = asyncio.new_event_loop().run_until_complete(scenario(api, list_id))
+        self.assertEqual(fake.messages[sent.id]["email"], "bob@e.e")
+        self.assertEqual([row[0] for row in rows[1:]], ["john@doe.net"])
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import threading
+import unittest
+from expresspigeon import AsyncExpressPigeon, ExpressPigeon
+from expresspigeon.exceptions import ExpressPigeonException
+from expresspigeon.fakeserver import FakeApi, FakeServer
+from expresspigeon.transport import InProcessTransport
+from expresspigeon.uploads import UploadFuture, UploadPoller, intervals
+
+CSV = os.path.join(os.path.split(os.path.abspath(__file__))[0], "emails.csv")
+
+
+class UploadAsyncTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeApi(upload_polls=3)
+        self.api = ExpressPigeon("key", transport=InProcessTransport(self.fake))
+        self.poller = UploadPoller(first=0.01, factor=2.0, maximum=0.02)
+
+    def test_intervals_grow_to_maximum(self):
+        delays = intervals(0.25, 2.0, 1.5)
+        self.assertEqual([next(delays) for _ in range(5)], [0.25, 0.5, 1.0, 1.5, 1.5])
+
+    def test_many_uploads_share_one_thread(self):
+        list_ids = [self.api.lists.create("L{0}".format(i), "Shop", "shop@example.net").list.id for i in range(10)]
+        threads = threading.active_count()
+        futures = [self.api.lists.upload_async(list_id, CSV, poller=self.poller) for list_id in list_ids]
+        self.assertTrue(threading.active_count() <= threads + 1 + self.poller.senders)
+        for future in futures:
+            self.assertEqual(future.result(timeout=5).report.imported, 2)
+            self.assertEqual(future.polls, 4)
+        self.assertEqual(self.poller.polls, 40)
+        self.assertEqual(self.poller.pending, 0)
+
+    def test_returns_before_the_file_is_sent(self):
+        list_id = self.api.lists.create("L", "Shop", "shop@example.net").list.id
+        sending = threading.Event()
+        release = threading.Event()
+
+        def blocked(method, path, headers, body):
+            if path.endswith("/upload"):
+                sending.set()
+                release.wait(5)
+            return self.fake(method, path, headers, body)
+
+        api = ExpressPigeon("key", transport=InProcessTransport(blocked))
+        future = api.lists.upload_async(list_id, CSV, poller=self.poller)
+        self.assertTrue(sending.wait(5))
+        self.assertFalse(future.done())
+        self.assertEqual(future.upload_id, None)
+        release.set()
+        self.assertEqual(future.result(timeout=5).report.imported, 2)
+        self.assertTrue(future.upload_id is not None)
+
+    def test_failures(self):
+        future = self.api.lists.upload_async(999, CSV, poller=self.poller)
+        self.assertTrue(isinstance(future.exception(timeout=1), ExpressPigeonException))
+
+        list_id = self.api.lists.create("L", "Shop", "shop@example.net").list.id
+        self.fake.upload_polls = 100
+        future = self.api.lists.upload_async(list_id, CSV, timeout=0.05, poller=self.poller)
+        self.assertTrue("not finished in time" in str(future.exception(timeout=5)))
+
+        future = self.api.lists.upload_async(list_id, CSV, poller=self.poller)
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+
+    def test_cancelled_during_a_check(self):
+        self.fake.upload_polls = 0
+        list_id = self.api.lists.create("L", "Shop", "shop@example.net").list.id
+        upload_id = self.api.lists.upload(list_id, CSV).upload_id
+        cancelled = UploadFuture(upload_id)
+        checked = threading.Event()
+
+        def status():
+            cancelled.cancel()
+            checked.set()
+            return self.api.lists.upload_status(upload_id)
+
+        self.poller.watch(cancelled, status)
+        self.assertTrue(checked.wait(5))
+        following = self.api.lists.upload_async(list_id, CSV, poller=self.poller)
+        self.assertEqual(following.result(timeout=5).report.imported, 2)
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(self.poller.pending, 0)
+
+    def test_async_client(self):
+        async def scenario(root, list_id):
+            async with AsyncExpressPigeon("key") as api:
+                api.ROOT = root
+                return await api.lists.upload_async(list_id, CSV)
+
+        list_id = self.api.lists.create("L", "Shop", "shop@example.net").list.id
+        self.fake.upload_polls = 1
+        with FakeServer(self.fake) as server:
+            status = asyncio.new_event_loop().run_until_complete(scenario(server.url, list_id))
+        self.assertTrue(status.report.completed)
+        self.assertEqual(status.report.imported, 2)